@@ -0,0 +1,274 @@
+"""Click-to-connected benchmark of the dashboard connect button.
+
+Calls the main_conn_disc_button_label handler on a GTK main loop, with the stand-in API and the fake
+protonvpn CLI (see tools/), and waits until the dashboard labels are painted with the new connection.
+Each run is split into stages using the trace spans (PVPN_GUI_TRACE):
+    handler_dispatch        main_conn_disc_button_label handler
+    thread_start            from the handler's return to the connect thread starting
+    subprocess              protonvpn connect
+    output_parsing          get_server_protocol_from_cli
+    update_labels_status    get_labels_status, without the IP lookup
+    ip_lookup               GET /vpn/location
+    label_paint_wait        from the labels being ready to the main loop painting them
+    label_paint             paint_labels_status
+and a JSON report with every run and the median of each stage is written.
+
+Requires an initialized profile and a display (e.g. xvfb-run). The server list and the connection metadata
+of the profile are replaced by the stand-ins while running, and restored afterwards.
+
+Usage:
+    xvfb-run python3 benchmarks/bench_connect_latency.py --runs 10 --output connect_latency.json
+    xvfb-run python3 benchmarks/bench_connect_latency.py --api-latency 0.2 --connect-delay 1
+    xvfb-run python3 benchmarks/bench_connect_latency.py --save      # record new baselines
+    xvfb-run python3 benchmarks/bench_connect_latency.py --compare   # fail if a stage is slower than baseline * tolerance
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import statistics
+import subprocess
+import urllib.request
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+FAKE_API_SERVER = os.path.join(ROOT_DIR, "tools", "fake_api_server.py")
+FAKE_CLI = os.path.join(ROOT_DIR, "tools", "fake_protonvpn")
+GLADE_FILE = os.path.join(ROOT_DIR, "protonvpn_linux_gui", "resources", "main.glade")
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+STAGES = [
+    "handler_dispatch",
+    "thread_start",
+    "subprocess",
+    "output_parsing",
+    "update_labels_status",
+    "ip_lookup",
+    "label_paint_wait",
+    "label_paint",
+]
+# Threads started by the handler, depending on the quick connect setting and the selected server
+CONNECT_TARGETS = ["quick_connect", "custom_quick_connect", "connect_to_selected_server"]
+
+def get_free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_api_server(port, logicals, latency):
+    process = subprocess.Popen(
+        [sys.executable, FAKE_API_SERVER, "--port", str(port), "--logicals", str(logicals), "--latency", str(latency)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    for _ in range(100):
+        try:
+            urllib.request.urlopen("http://127.0.0.1:{0}/vpn/location".format(port), timeout=1).close() # nosec
+            return process
+        except OSError:
+            time.sleep(0.1)
+
+    process.kill()
+    raise RuntimeError("The stand-in API server did not start.")
+
+def find_span(events, name, after=0):
+    for event in events:
+        if event["name"] == name and event["ph"] == "X" and event["ts"] >= after:
+            return event
+
+    return None
+
+def get_end(event):
+    return event["ts"] + event["dur"]
+
+def get_stages(events):
+    """Function that splits the spans of a run into stages.
+    Returns:
+    ----
+    - A dict with the duration of each stage and the total, in milliseconds.
+    """
+    handler = find_span(events, "main_conn_disc_button_label")
+    worker = next(event for event in events if event["name"] in CONNECT_TARGETS and event["ts"] >= handler["ts"])
+    connect = find_span(events, "protonvpn connect", worker["ts"])
+    parsing = find_span(events, "get_server_protocol_from_cli", get_end(connect))
+    labels_status = find_span(events, "get_labels_status", get_end(connect))
+    ip_lookup = find_span(events, "GET /vpn/location", labels_status["ts"])
+    paint = find_span(events, "paint_labels_status", get_end(labels_status))
+
+    ip_lookup_duration = ip_lookup["dur"] if ip_lookup and get_end(ip_lookup) <= get_end(labels_status) else 0
+
+    stages = {
+        "handler_dispatch": handler["dur"],
+        "thread_start": max(0, worker["ts"] - get_end(handler)),
+        "subprocess": connect["dur"],
+        "output_parsing": parsing["dur"],
+        "update_labels_status": labels_status["dur"] - ip_lookup_duration,
+        "ip_lookup": ip_lookup_duration,
+        "label_paint_wait": paint["ts"] - get_end(labels_status),
+        "label_paint": paint["dur"],
+        "total": get_end(paint) - handler["ts"],
+    }
+
+    return {stage: duration / 1000 for stage, duration in stages.items()}
+
+def run_once(Gtk, GLib, handler, button, get_events, timeout):
+    """Function that clicks the connect button and runs the main loop until the connection is painted.
+    """
+    subprocess.run([FAKE_CLI, "disconnect"], stdout=subprocess.DEVNULL, env=dict(os.environ, PVPN_FAKE_DISCONNECT_DELAY="0"))
+    state = {"start": None, "timed_out": False}
+
+    def click():
+        state["start"] = time.perf_counter()
+        handler["main_conn_disc_button_label"](button)
+        return False
+
+    def check_painted():
+        events = get_events(state["start"])
+        connect = find_span(events, "protonvpn connect")
+        # The connect thread can record its span after the labels were painted
+        worker_done = any(event["name"] in CONNECT_TARGETS for event in events)
+        if connect and worker_done and find_span(events, "paint_labels_status", get_end(connect)):
+            Gtk.main_quit()
+            return False
+
+        if time.perf_counter() - state["start"] > timeout:
+            state["timed_out"] = True
+            Gtk.main_quit()
+            return False
+
+        return True
+
+    GLib.idle_add(click)
+    GLib.timeout_add(5, check_painted)
+    Gtk.main()
+
+    if state["timed_out"]:
+        raise RuntimeError("The dashboard was not painted within {0} seconds.".format(timeout))
+
+    return get_stages(get_events(state["start"]))
+
+def summarize(runs):
+    summary = {}
+    for stage in STAGES + ["total"]:
+        durations = [run[stage] for run in runs]
+        summary[stage] = {
+            "median_ms": statistics.median(durations),
+            "min_ms": min(durations),
+            "max_ms": max(durations),
+        }
+
+    return summary
+
+def run_benchmark(args):
+    # Tracing, the API and the CLI are configured from the environment when the package is imported
+    trace_dir = tempfile.mkdtemp()
+    port = get_free_port()
+    os.environ["PVPN_GUI_TRACE"] = os.path.join(trace_dir, "trace.json")
+    os.environ["PVPN_GUI_API_URL"] = "http://127.0.0.1:{0}".format(port)
+    os.environ["PVPN_GUI_CLI"] = FAKE_CLI
+    os.environ["PVPN_FAKE_CONNECT_DELAY"] = str(args.connect_delay)
+
+    import gi
+    gi.require_version('Gtk', '3.0')
+    from gi.repository import Gtk, GLib
+
+    if not Gtk.init_check(sys.argv)[0]:
+        sys.exit("[!] No display found, run the benchmark with xvfb-run.")
+
+    from protonvpn_cli.constants import CONFIG_FILE, SERVER_INFO_FILE
+    from protonvpn_linux_gui.gui import Handler
+    from protonvpn_linux_gui.gui_tracer import trace_handler, get_events
+    from protonvpn_linux_gui.utils import pull_server_data
+
+    # The stand-ins write the server list and the connection metadata of the profile
+    backups = {}
+    for path in (CONFIG_FILE, SERVER_INFO_FILE):
+        if os.path.isfile(path):
+            backups[path] = os.path.join(trace_dir, os.path.basename(path))
+            shutil.copy2(path, backups[path])
+
+    api_server = start_api_server(port, args.logicals, args.api_latency)
+    try:
+        pull_server_data(force=True)
+
+        interface = Gtk.Builder()
+        interface.add_from_file(GLADE_FILE)
+        handler = trace_handler(Handler(interface))
+        button = interface.get_object("main_conn_disc_button")
+
+        runs = []
+        for index in range(args.warmup + args.runs):
+            stages = run_once(Gtk, GLib, handler, button, get_events, args.timeout)
+            if index >= args.warmup:
+                runs.append(stages)
+    finally:
+        subprocess.run([FAKE_CLI, "disconnect"], stdout=subprocess.DEVNULL, env=dict(os.environ, PVPN_FAKE_DISCONNECT_DELAY="0"))
+        api_server.terminate()
+        for path, backup in backups.items():
+            shutil.copy2(backup, path)
+        shutil.rmtree(trace_dir, ignore_errors=True)
+
+    return {
+        "config": {
+            "runs": args.runs,
+            "warmup": args.warmup,
+            "logicals": args.logicals,
+            "api_latency": args.api_latency,
+            "connect_delay": args.connect_delay,
+        },
+        "summary": summarize(runs),
+        "runs": runs,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1, help="Runs that are not measured.")
+    parser.add_argument("--logicals", type=int, default=1000, help="Size of the stand-in server list.")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="Seconds added to every stand-in API response.")
+    parser.add_argument("--connect-delay", type=float, default=0.5, help="Seconds spent connecting by the fake CLI.")
+    parser.add_argument("--timeout", type=float, default=30, help="Seconds to wait for a run.")
+    parser.add_argument("--output", help="Write the JSON report to a file instead of stdout.")
+    parser.add_argument("--save", action="store_true", help="Store the stage medians as new baselines.")
+    parser.add_argument("--compare", action="store_true", help="Compare the stage medians against stored baselines.")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="Allowed slowdown factor when comparing.")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    medians = {stage: result["median_ms"] for stage, result in report["summary"].items()}
+
+    stored = {}
+    if os.path.isfile(BASELINES_FILE):
+        with open(BASELINES_FILE) as f:
+            stored = json.load(f)
+    baselines = stored.get("connect_latency", {})
+
+    # The stand-in delays are fixed, so only the stages of the GUI itself are compared
+    regressions = [
+        stage for stage in STAGES
+        if stage not in ("subprocess", "ip_lookup") and baselines.get(stage)
+        and medians[stage] > baselines[stage] * args.tolerance
+    ]
+    report["regressions"] = regressions
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+    if args.save:
+        stored["connect_latency"] = medians
+        with open(BASELINES_FILE, "w") as f:
+            json.dump(stored, f, indent=4, sort_keys=True)
+
+    if args.compare and regressions:
+        sys.exit("[!] Regressions in: {0}".format(", ".join(regressions)))
+
+if __name__ == "__main__":
+    main()
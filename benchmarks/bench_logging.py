@@ -0,0 +1,71 @@
+"""Benchmark of the per-call logging cost on the calling (e.g. GTK main) thread.
+
+Compares the previous setup (synchronous RotatingFileHandler, eager .format()) with
+the queue based pipeline from gui_logger (DeferredQueueHandler + QueueListener, lazy %-style).
+
+Usage:
+    python3 benchmarks/bench_logging.py
+"""
+import os
+import sys
+import queue
+import timeit
+import logging
+import tempfile
+
+from logging.handlers import RotatingFileHandler, QueueListener
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from protonvpn_linux_gui.gui_logger import DeferredQueueHandler, RateLimitFilter # noqa
+
+CALLS = 20000
+FORMAT = "%(asctime)s — %(name)s — %(levelname)s — %(funcName)s:%(lineno)d — %(message)s"
+PARAMS = {"interface": object(), "messagedialog_label": object(), "servers": list(range(50)), "conn_info": False}
+
+def sync_logger(path):
+    log = logging.getLogger("bench-sync")
+    log.setLevel(logging.DEBUG)
+    handler = RotatingFileHandler(path, maxBytes=3145728, backupCount=1)
+    handler.setFormatter(logging.Formatter(FORMAT))
+    log.addHandler(handler)
+    return log, handler, None
+
+def queue_logger(path):
+    log = logging.getLogger("bench-queue")
+    log.setLevel(logging.DEBUG)
+    handler = RotatingFileHandler(path, maxBytes=3145728, backupCount=1)
+    handler.setFormatter(logging.Formatter(FORMAT))
+    log_queue = queue.Queue(-1)
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter())
+    log.addHandler(queue_handler)
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    return log, handler, listener
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+
+    log, handler, _ = sync_logger(os.path.join(tmp_dir, "sync.log"))
+    sync_time = timeit.timeit(lambda: log.debug(">>> Running \"load_on_start\". Params: {0}.".format(PARAMS)), number=CALLS)
+    handler.close()
+
+    log, handler, listener = queue_logger(os.path.join(tmp_dir, "queue.log"))
+    queue_time = timeit.timeit(lambda: log.debug(">>> Running \"load_on_start\". Params: %s.", PARAMS), number=CALLS)
+    listener.stop()
+    handler.close()
+
+    log.setLevel(logging.INFO)
+    disabled_time = timeit.timeit(lambda: log.debug(">>> Running \"load_on_start\". Params: %s.", PARAMS), number=CALLS)
+
+    log.setLevel(logging.DEBUG)
+    limited_time = timeit.timeit(lambda: log.debug("Tick", extra={"rate_limit": 60}), number=CALLS)
+
+    print("{0:<45} {1:>8.2f} us/call".format("sync handler, eager .format()", sync_time / CALLS * 1e6))
+    print("{0:<45} {1:>8.2f} us/call".format("queue handler, lazy %-style", queue_time / CALLS * 1e6))
+    print("{0:<45} {1:>8.2f} us/call".format("queue handler, level disabled", disabled_time / CALLS * 1e6))
+    print("{0:<45} {1:>8.2f} us/call".format("queue handler, rate limited call site", limited_time / CALLS * 1e6))
+
+if __name__ == "__main__":
+    main()
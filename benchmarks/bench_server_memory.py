@@ -0,0 +1,64 @@
+"""Memory benchmark of the server list representation.
+
+Writes synthetic server info files of 1k, 5k and 20k logicals (the /vpn/logicals responses of the stand-in API,
+see tools/fake_api_server.py) and measures, with tracemalloc, the memory retained by the
+parsed server list: plain dicts (protonvpn_cli.utils.get_servers) against ServerRecords (server_records).
+
+Usage:
+    python3 benchmarks/bench_server_memory.py
+"""
+import os
+import sys
+import gc
+import json
+import tempfile
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "tools"))
+
+from fake_api_server import synthetic_logicals # noqa
+from protonvpn_linux_gui.server_records import load_server_records # noqa
+
+SIZES = [1000, 5000, 20000]
+
+def load_dicts(path):
+    with open(path, "r") as f:
+        return json.load(f)["LogicalServers"]
+
+def measure(loader, path):
+    """Function that returns the memory retained by the loaded servers, and the peak while loading, in bytes.
+    """
+    gc.collect()
+    tracemalloc.start()
+    servers = loader(path)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert servers
+    return current, peak
+
+def main():
+    print("{0:<10} {1:>16} {2:>16} {3:>10} {4:>16} {5:>16}".format(
+        "logicals", "dicts (MB)", "records (MB)", "ratio", "dicts peak (MB)", "records peak (MB)"
+    ))
+
+    for size in SIZES:
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump(synthetic_logicals(size), f)
+            path = f.name
+
+        try:
+            dicts, dicts_peak = measure(load_dicts, path)
+            records, records_peak = measure(load_server_records, path)
+        finally:
+            os.remove(path)
+
+        print("{0:<10} {1:>16.2f} {2:>16.2f} {3:>9.1f}x {4:>16.2f} {5:>16.2f}".format(
+            size, dicts / 1e6, records / 1e6, dicts / records, dicts_peak / 1e6, records_peak / 1e6
+        ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Headless benchmark of the server list view-model.
+
+Runs the row building pipeline against synthetic server lists of 1k, 5k and 20k logicals.
+
+Usage:
+    python3 benchmarks/bench_server_pipeline.py             # print timings
+    python3 benchmarks/bench_server_pipeline.py --save      # record new baselines
+    python3 benchmarks/bench_server_pipeline.py --compare   # fail if slower than baseline * tolerance
+"""
+import os
+import sys
+import json
+import random
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from protonvpn_cli.country_codes import country_codes # noqa
+from protonvpn_linux_gui.view_model import build_server_rows, build_autoconnect_rows # noqa
+
+SIZES = [1000, 5000, 20000]
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+def synthetic_servers(amount, seed=0):
+    """Function that generates a list of server dicts shaped like the ones returned by get_servers().
+    """
+    rand = random.Random(seed)
+    country_list = sorted(country_codes)
+    servers = []
+
+    for index in range(amount):
+        cc = rand.choice(country_list)
+        servers.append({
+            "Name": "{0}#{1}".format(cc, index),
+            "ExitCountry": cc,
+            "EntryCountry": cc,
+            "Tier": rand.choice([0, 1, 2]),
+            "Features": rand.choice([0, 0, 0, 1, 2, 4]),
+            "Load": rand.randint(0, 100),
+            "Score": rand.random(),
+            "Status": 1,
+        })
+
+    return servers
+
+def run_benchmarks(repeat=5):
+    results = {}
+    for size in SIZES:
+        servers = synthetic_servers(size)
+        benchmarks = {
+            "build_server_rows": lambda: build_server_rows(servers),
+            "build_server_rows_secure_core": lambda: build_server_rows(servers, only_secure_core=True),
+            "build_autoconnect_rows": lambda: build_autoconnect_rows(servers),
+        }
+        for name, func in benchmarks.items():
+            timing = min(timeit.repeat(func, number=1, repeat=repeat))
+            results["{0}[{1}]".format(name, size)] = timing
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--save", action="store_true", help="Store results as new baselines.")
+    parser.add_argument("--compare", action="store_true", help="Compare results against stored baselines.")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="Allowed slowdown factor when comparing.")
+    args = parser.parse_args()
+
+    results = run_benchmarks()
+    baselines = {}
+    if os.path.isfile(BASELINES_FILE):
+        with open(BASELINES_FILE) as f:
+            baselines = json.load(f).get("server_pipeline", {})
+
+    regressions = []
+    for name, timing in sorted(results.items()):
+        baseline = baselines.get(name)
+        ratio = "" if not baseline else "  ({0:.2f}x baseline)".format(timing / baseline)
+        print("{0:<45} {1:>10.2f} ms{2}".format(name, timing * 1000, ratio))
+        if baseline and timing > baseline * args.tolerance:
+            regressions.append(name)
+
+    if args.save:
+        stored = {}
+        if os.path.isfile(BASELINES_FILE):
+            with open(BASELINES_FILE) as f:
+                stored = json.load(f)
+        stored["server_pipeline"] = results
+        with open(BASELINES_FILE, "w") as f:
+            json.dump(stored, f, indent=4, sort_keys=True)
+        print("Baselines written to {0}".format(BASELINES_FILE))
+
+    if args.compare and regressions:
+        print("[!] Regressions: {0}".format(", ".join(regressions)))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
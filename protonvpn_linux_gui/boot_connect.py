@@ -0,0 +1,156 @@
+"""Boot-time autoconnect, run by the autoconnect systemd unit.
+
+Instead of waiting for the network with a fixed PVPN_WAIT and then letting the CLI pull the whole server list,
+a server is chosen from the server data cached by the last session and connected to in-process (the CLI's
+connect command always pulls the server list first at boot, and exits when the API can't be reached).
+The CLI is only used when there is no usable cache. The connection is retried with exponential backoff and
+jitter until it succeeds or the time budget runs out.
+
+Usage:
+    python3 -m protonvpn_linux_gui.boot_connect connect (-f | -r | --p2p | --sc | --tor | --cc CODE)
+"""
+import sys
+import json
+import time
+import random
+import subprocess
+
+from protonvpn_cli.constants import SERVER_INFO_FILE
+from protonvpn_cli.utils import get_config_value, is_connected
+from protonvpn_cli.connection import openvpn_connect
+
+from .constants import BOOT_CONNECT_MAX_WAIT, BOOT_CONNECT_BACKOFF_BASE, BOOT_CONNECT_BACKOFF_CAP, CLI_COMMAND
+from .gui_logger import gui_logger
+
+# ProtonVPN Features: 1: SECURE-CORE, 2: TOR, 4: P2P
+FEATURE_FLAGS = {
+    "--sc": 1,
+    "--tor": 2,
+    "--p2p": 4,
+}
+
+def get_uptime():
+    """Function that returns the seconds since boot, or False if it can not be read.
+    """
+    try:
+        with open("/proc/uptime") as f:
+            return float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return False
+
+def load_cached_servers():
+    """Function that loads the servers from the server data cached by the last session, without making an API call.
+    """
+    try:
+        with open(SERVER_INFO_FILE) as f:
+            servers = json.load(f)["LogicalServers"]
+        user_tier = int(get_config_value("USER", "tier"))
+    except (OSError, ValueError, KeyError, TypeError):
+        gui_logger.debug("[!] No usable cached server data found.")
+        return False
+
+    return [server for server in servers if server["Tier"] <= user_tier and server["Status"] == 1]
+
+def choose_server(servers, mode, country_code=False):
+    """Function that chooses a server name for the given autoconnect mode, or False if none match.
+    Secure-Core and Tor servers are excluded from fastest and country connections, as the CLI does.
+    """
+    if mode in FEATURE_FLAGS:
+        server_pool = [server for server in servers if server["Features"] == FEATURE_FLAGS[mode]]
+    else:
+        server_pool = [server for server in servers if server["Features"] not in (1, 2)]
+        if mode == "--cc":
+            server_pool = [server for server in server_pool if server["ExitCountry"] == country_code.upper()]
+
+    if not server_pool:
+        return False
+
+    if mode in ("-r", "--random"):
+        return random.choice(server_pool)["Name"]
+
+    return min(server_pool, key=lambda server: server["Score"])["Name"]
+
+def connect_in_process(servername, protocol):
+    """Function that connects to a server of the cached server data, without pulling the server list.
+    Returns False if the attempt failed.
+    """
+    try:
+        openvpn_connect(servername, protocol)
+    except SystemExit:
+        # The CLI exits on connection timeouts, authentication failures and unreachable API (IP lookup)
+        return False
+
+    return True
+
+def connect_with_cli(cli_command):
+    """Function that connects with the CLI, which pulls the server list first.
+    Returns False if the attempt failed.
+    """
+    result = subprocess.run(cli_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
+    if result.returncode != 0:
+        gui_logger.debug("[!] %s failed: %s", cli_command, result.stdout.decode().strip())
+        return False
+
+    return True
+
+def backoff_delays(base=BOOT_CONNECT_BACKOFF_BASE, cap=BOOT_CONNECT_BACKOFF_CAP):
+    """Generator of exponential backoff delays with full jitter.
+    """
+    attempt = 0
+    while True:
+        yield random.uniform(0, min(cap, base * 2 ** attempt))
+        attempt += 1
+
+def connect(command, max_wait=BOOT_CONNECT_MAX_WAIT):
+    """Function that connects using the given CLI connect arguments, retrying with backoff.
+    Returns True if a VPN connection was established.
+    """
+    start_uptime = get_uptime()
+    start = time.monotonic()
+    mode = command[0] if command else "-f"
+    country_code = command[1] if mode == "--cc" and len(command) > 1 else False
+
+    servers = load_cached_servers()
+    servername = choose_server(servers, mode, country_code) if servers else False
+    protocol = get_config_value("USER", "default_protocol")
+    cli_command = [CLI_COMMAND, "connect"] + command
+
+    if servername:
+        gui_logger.debug(">>> Boot connect started %ss after boot, to cached server %s via %s.", start_uptime, servername, protocol)
+    else:
+        gui_logger.debug(">>> Boot connect started %ss after boot, command: %s", start_uptime, cli_command)
+
+    delays = backoff_delays()
+    attempt = 1
+    while True:
+        succeeded = connect_in_process(servername, protocol) if servername else connect_with_cli(cli_command)
+
+        if succeeded and is_connected():
+            end_uptime = get_uptime()
+            gui_logger.debug(
+                ">>> Boot connect succeeded after %s attempt(s), %.1fs in boot connect, boot-to-tunnel %ss.",
+                attempt, time.monotonic() - start, end_uptime
+            )
+            print("Connected, boot-to-tunnel latency: {0}s".format(end_uptime))
+            return True
+
+        delay = next(delays)
+        if time.monotonic() - start + delay > max_wait:
+            gui_logger.debug("[!] Boot connect gave up after %s attempt(s).", attempt)
+            print("[!] Unable to connect within {0}s.".format(max_wait))
+            return False
+
+        gui_logger.debug("[!] Boot connect attempt %s failed, retrying in %.1fs.", attempt, delay)
+        time.sleep(delay)
+        attempt += 1
+
+def main():
+    args = sys.argv[1:]
+    # The command is stored as "connect <args>", as it would be passed to the CLI
+    if args and args[0] in ("c", "connect"):
+        args = args[1:]
+
+    sys.exit(0 if connect(args) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Batched, atomic writes of INI configuration files (pvpn-cli.cfg, pvpn-gui.cfg).
+
+protonvpn-cli's set_config_value re-reads and rewrites the whole file for every key. A ConfigTransaction
+reads the file once, collects the changes, and commits them with a single write to a temporary file,
+which is fsynced and renamed over the original. A crash leaves either the old or the new file, never a partial one.
+"""
+import os
+import configparser
+import contextlib
+
+from protonvpn_cli.constants import CONFIG_FILE
+
+from .gui_logger import gui_logger
+
+class ConfigTransaction:
+    """Pending changes to a config file. Nothing is written until commit().
+    """
+    def __init__(self, path=CONFIG_FILE, replace=False):
+        self.path = path
+        self.config = configparser.ConfigParser()
+        self.changed = replace
+
+        # A replaced file starts empty, e.g. when a profile is initialized
+        if not replace:
+            self.config.read(path)
+
+    def get(self, group, key):
+        return self.config[group][key]
+
+    def set(self, group, key, value):
+        if not self.config.has_section(group):
+            self.config.add_section(group)
+
+        value = str(value)
+        if self.config[group].get(key) != value:
+            self.config[group][key] = value
+            self.changed = True
+
+    def set_group(self, group, values):
+        for key, value in values.items():
+            self.set(group, key, value)
+
+    def commit(self):
+        """Atomically replace the config file, keeping the owner and permissions of the previous file.
+        Returns:
+        ----
+        - True if the file was written, False if there was nothing to write.
+        """
+        if not self.changed:
+            return False
+
+        directory = os.path.dirname(self.path)
+        tmp_path = "{0}.tmp".format(self.path)
+
+        with open(tmp_path, "w") as f:
+            self.config.write(f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # The GUI runs as root, the files are owned by the user
+        try:
+            stat = os.stat(self.path)
+            os.chown(tmp_path, stat.st_uid, stat.st_gid)
+            os.chmod(tmp_path, stat.st_mode & 0o777)
+        except OSError:
+            pass
+
+        os.replace(tmp_path, self.path)
+
+        # Persist the rename itself
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+        self.changed = False
+        gui_logger.debug("Committed config transaction to %s", self.path)
+
+        return True
+
+@contextlib.contextmanager
+def config_transaction(path=CONFIG_FILE, replace=False):
+    """Context manager that yields a ConfigTransaction, committed when the block exits without an exception.
+    """
+    transaction = ConfigTransaction(path, replace)
+    yield transaction
+    transaction.commit()
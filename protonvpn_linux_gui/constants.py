@@ -3,7 +3,15 @@ from protonvpn_cli.constants import VERSION as cli_version, USER
 
 VERSION = "2.0.7"
 
-GITHUB_URL_RELEASE = "https://github.com/calexandru2018/protonvpn-linux-gui/releases/latest"
+# The API, the CLI executable and the release page can be replaced by stand-ins (see tools/), e.g. for offline testing
+API_URL_ENV_VAR = "PVPN_GUI_API_URL"
+CLI_ENV_VAR = "PVPN_GUI_CLI"
+RELEASE_URL_ENV_VAR = "PVPN_GUI_RELEASE_URL"
+DEFAULT_API_URL = "https://api.protonvpn.ch"
+API_URL = os.environ.get(API_URL_ENV_VAR, DEFAULT_API_URL).rstrip("/")
+CLI_COMMAND = os.environ.get(CLI_ENV_VAR, "protonvpn")
+
+GITHUB_URL_RELEASE = os.environ.get(RELEASE_URL_ENV_VAR, "https://github.com/calexandru2018/protonvpn-linux-gui/releases/latest")
 
 # GUI configurations
 GUI_CONFIG_DIR = os.path.join(os.path.expanduser("~{0}".format(USER)), ".pvpn-gui")
@@ -14,6 +22,64 @@ LARGE_FLAGS_BASE_PATH = os.path.join(CURRDIR, "resources/img/flags/large/")
 SMALL_FLAGS_BASE_PATH = os.path.join(CURRDIR, "resources/img/flags/small/")
 FEATURES_BASE_PATH = os.path.join(CURRDIR, "resources/img/utils/")
 
+# Log level can be set with PVPN_GUI_LOG_LEVEL (e.g. INFO), call sites that run periodically
+# are rate limited to one record per LOG_RATE_LIMIT seconds
+LOG_LEVEL_ENV_VAR = "PVPN_GUI_LOG_LEVEL"
+LOG_RATE_LIMIT = 60
+
+# Opt-in Chrome trace-event export, PVPN_GUI_TRACE=/path/to/trace.json ("{pid}" is replaced by the process id)
+TRACE_ENV_VAR = "PVPN_GUI_TRACE"
+TRACE_MAX_EVENTS = 200000
+
+# Opt-in metrics exporter, PVPN_GUI_METRICS=/path/to/file.prom (textfile collector), unix:/path/to/socket or [host:]port.
+# Histogram buckets (seconds) of protonvpn-cli commands and API requests
+METRICS_ENV_VAR = "PVPN_GUI_METRICS"
+METRICS_TEXTFILE_INTERVAL = 15
+METRICS_DEFAULT_HOST = "127.0.0.1"
+METRICS_CONNECT_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 45, 60, 120)
+METRICS_API_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 6)
+
+# Main loop watchdog, a stall is reported when the GTK main loop does not respond within the threshold (seconds).
+# It wakes up every heartbeat, so it is disabled (0) unless a threshold is set with PVPN_GUI_STALL_THRESHOLD, e.g. 1.
+WATCHDOG_THRESHOLD_ENV_VAR = "PVPN_GUI_STALL_THRESHOLD"
+WATCHDOG_STALL_THRESHOLD = 0
+WATCHDOG_HEARTBEAT = 0.5
+
+# Split tunneling lists are loaded into the settings TextView this many lines per main loop iteration
+SPLIT_TUNNEL_CHUNK_LINES = 1000
+# Domain split tunneling, domains are resolved concurrently and re-resolved when their DNS TTL (seconds) expires.
+# The default TTL is used when the resolver does not report one, failed lookups are retried after SPLIT_TUNNEL_RETRY.
+SPLIT_TUNNEL_STATE_FILE = os.path.join(GUI_CONFIG_DIR, "split_tunnel_state.json")
+# The GUI and the tray lock the state while changing it, and only the process holding the refresh lock re-resolves domains
+SPLIT_TUNNEL_STATE_LOCK_FILE = os.path.join(GUI_CONFIG_DIR, "split_tunnel_state.lock")
+SPLIT_TUNNEL_REFRESH_LOCK_FILE = os.path.join(GUI_CONFIG_DIR, "split_tunnel_refresh.lock")
+SPLIT_TUNNEL_RESOLVER_CONCURRENCY = 16
+SPLIT_TUNNEL_RESOLVER_TIMEOUT = 5
+SPLIT_TUNNEL_DEFAULT_TTL = 300
+SPLIT_TUNNEL_MIN_TTL = 30
+SPLIT_TUNNEL_RETRY = 60
+
+# Snapshot of the last server list and IP information, rendered on start up until fresh data arrives
+SNAPSHOT_FILE = os.path.join(GUI_CONFIG_DIR, "catalog.snapshot")
+
+# Server load history, one record per server per pull, kept for LOAD_HISTORY_RETENTION seconds
+LOAD_HISTORY_FILE = os.path.join(GUI_CONFIG_DIR, "load_history.dat")
+LOAD_HISTORY_NAMES_FILE = os.path.join(GUI_CONFIG_DIR, "load_history_names.json")
+LOAD_HISTORY_RETENTION = 14 * 24 * 3600
+
+# Speed test through the tunnel, against PVPN_GUI_SPEED_TEST_URL (GET /__down?bytes=N and POST /__up, like speed.cloudflare.com
+# or tools/fake_api_server.py). Parallel streams are measured for SPEED_TEST_DURATION seconds, after SPEED_TEST_WARMUP seconds.
+# The last SPEED_TEST_HISTORY results of every server are kept.
+SPEED_TEST_ENV_VAR = "PVPN_GUI_SPEED_TEST_URL"
+SPEED_TEST_URL = os.environ.get(SPEED_TEST_ENV_VAR, "https://speed.cloudflare.com").rstrip("/")
+SPEED_TEST_STREAMS = 4
+SPEED_TEST_WARMUP = 2
+SPEED_TEST_DURATION = 8
+SPEED_TEST_PING_SAMPLES = 10
+SPEED_TEST_TIMEOUT = 10
+SPEED_TEST_RESULTS_FILE = os.path.join(GUI_CONFIG_DIR, "speed_tests.json")
+SPEED_TEST_HISTORY = 10
+
 # Tray configuration naming
 TRAY_CFG_SERVERLOAD = "display_serverload"
 TRAY_CFG_SERVENAME = "display_server"
@@ -26,8 +92,25 @@ TRAY_CFG_DICT = {
     "tray_serverload_combobox": TRAY_CFG_SERVERLOAD
 }
 
+# Tray refresh intervals (seconds): while connecting or while the menu is open, while connected, and while idle
+TRAY_TICK_FAST = 1
+TRAY_TICK_CONNECTED = 5
+TRAY_TICK_IDLE = 30
+TRAY_CONNECTING_TIMEOUT = 60
+# Tray actions (connect/disconnect) are terminated after TRAY_ACTION_TIMEOUT seconds,
+# and killed if they are still running PROCESS_KILL_GRACE seconds later
+TRAY_ACTION_TIMEOUT = 120
+PROCESS_KILL_GRACE = 5
+
 SERVICE_NAME = "custompvpn-autoconnect" 
 PATH_AUTOCONNECT_SERVICE = "/etc/systemd/system/{}.service".format(SERVICE_NAME)
+# Boot connect retries with exponential backoff (seconds) instead of a fixed PVPN_WAIT
+BOOT_CONNECT_MAX_WAIT = 300
+BOOT_CONNECT_BACKOFF_BASE = 1
+BOOT_CONNECT_BACKOFF_CAP = 30
+# An attempt started just before the budget runs out can take as long as the CLI's connection timeout (45s),
+# the unit's start timeout leaves room for it, instead of systemd's default of 90s
+BOOT_CONNECT_ATTEMPT_MARGIN = 60
 TEMPLATE ="""
 [Unit]
 Description=Custom ProtonVPN-CLI auto-connect
@@ -37,13 +120,13 @@ Wants=network-online.target
 Type=forking
 ExecStart=PATH
 ExecStop=STOP
-Environment=PVPN_WAIT=300
+TimeoutStartSec={timeout}
 Environment=PVPN_DEBUG=1
 Environment=SUDO_USER=user
 
 [Install]
 WantedBy=multi-user.target
-"""
+""".format(timeout=BOOT_CONNECT_MAX_WAIT + BOOT_CONNECT_ATTEMPT_MARGIN)
 HELP_TEXT = """
 <b>How is this GUI related to protonvpn-cli-ng ?</b>
 This GUI works on top of the original cli v{cli_version}. The CLI in this case acts as a dependency for the GUI. 
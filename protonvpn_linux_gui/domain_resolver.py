@@ -0,0 +1,231 @@
+"""Concurrent resolution of split tunneling domains, and the scheduler that keeps their routes up to date.
+
+Resolvers are objects with a coroutine resolve(hostname) that returns a tuple of (IPv4 addresses, TTL),
+StubResolver answers from a dict so that resolution can be tested without a DNS server.
+"""
+import os
+import time
+import socket
+import fcntl
+import asyncio
+import threading
+
+try:
+    import dns.resolver
+    import dns.exception
+except ImportError:
+    dns = None
+
+from protonvpn_cli.constants import SPLIT_TUNNEL_FILE
+from protonvpn_cli.utils import get_config_value, is_connected, change_file_owner
+
+from .constants import (
+    SPLIT_TUNNEL_RESOLVER_CONCURRENCY,
+    SPLIT_TUNNEL_RESOLVER_TIMEOUT,
+    SPLIT_TUNNEL_DEFAULT_TTL,
+    SPLIT_TUNNEL_MIN_TTL,
+    SPLIT_TUNNEL_RETRY,
+    SPLIT_TUNNEL_REFRESH_LOCK_FILE
+)
+from .gui_logger import gui_logger
+from .gui_tracer import trace_span
+from .split_tunneling import (
+    build_routes,
+    diff_routes,
+    load_state,
+    save_state,
+    state_lock,
+    open_lock_file,
+    domain_entry,
+    write_networks,
+    update_ovpn_template,
+    apply_route_changes
+)
+
+RESOLVE_ERRORS = (OSError, LookupError, asyncio.TimeoutError)
+if dns is not None:
+    RESOLVE_ERRORS += (dns.exception.DNSException,)
+
+class SystemResolver:
+    """Resolver that uses dnspython if it is installed, to get the TTL of the records,
+    otherwise getaddrinfo with the default TTL.
+    """
+    def __init__(self, default_ttl=SPLIT_TUNNEL_DEFAULT_TTL):
+        self.default_ttl = default_ttl
+
+    async def resolve(self, hostname):
+        loop = asyncio.get_event_loop()
+
+        if dns is not None:
+            # dnspython < 2.0 only has query()
+            query = getattr(dns.resolver, "resolve", None) or dns.resolver.query
+            answer = await loop.run_in_executor(None, query, hostname, "A")
+            return [record.address for record in answer], answer.rrset.ttl
+
+        infos = await loop.getaddrinfo(hostname, None, family=socket.AF_INET, type=socket.SOCK_STREAM)
+        return [info[4][0] for info in infos], self.default_ttl
+
+class StubResolver:
+    """Resolver that answers from a dict of hostname: (addresses, ttl), unknown hostnames fail to resolve.
+    """
+    def __init__(self, records, delay=0):
+        self.records = records
+        self.delay = delay
+
+    async def resolve(self, hostname):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+        if hostname not in self.records:
+            raise LookupError("{0} not found".format(hostname))
+
+        addresses, ttl = self.records[hostname]
+        return list(addresses), ttl
+
+async def resolve_all(domains, resolver, concurrency, timeout):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def resolve_one(domain):
+        async with semaphore:
+            try:
+                addresses, ttl = await asyncio.wait_for(resolver.resolve(domain), timeout)
+            except RESOLVE_ERRORS as e:
+                gui_logger.debug("[!] Unable to resolve \"%s\": %s", domain, e)
+                return domain, (None, SPLIT_TUNNEL_RETRY)
+
+        return domain, (sorted(set(addresses)), max(SPLIT_TUNNEL_MIN_TTL, ttl))
+
+    return dict(await asyncio.gather(*[resolve_one(domain) for domain in domains]))
+
+def resolve_domains(domains, resolver=None, concurrency=SPLIT_TUNNEL_RESOLVER_CONCURRENCY, timeout=SPLIT_TUNNEL_RESOLVER_TIMEOUT):
+    """Function that resolves domains concurrently, with at most concurrency lookups in flight.
+    Returns:
+    ----
+    - A dict of domain: (addresses, ttl), addresses is None if the domain could not be resolved.
+    """
+    if not domains:
+        return {}
+
+    loop = asyncio.new_event_loop()
+    try:
+        with trace_span("resolve domains", "dns", domains=len(domains)):
+            return loop.run_until_complete(resolve_all(domains, resolver or SystemResolver(), concurrency, timeout))
+    finally:
+        loop.close()
+
+class DomainRefreshScheduler(threading.Thread):
+    """Background thread that re-resolves split tunneling domains when their TTL expires.
+
+    Routes are only rewritten (and applied to an active connection) if the resolved addresses changed.
+    The GUI and the tray both run a scheduler, only the one holding the refresh lock re-resolves domains,
+    the other one takes over when that process exits.
+    """
+    def __init__(self, resolver=None):
+        super().__init__(name="split-tunnel-domains", daemon=True)
+        self.resolver = resolver
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.refresh_lock = None
+
+    def update(self, networks, domain_names):
+        """Save the entries from the settings, resolving all domains.
+        Returns:
+        ----
+        - A tuple with the routes and the domains that could not be resolved.
+        """
+        with self.lock, state_lock():
+            state = load_state()
+            old_networks, old_domains = state if state else ([], {})
+
+            resolved = resolve_domains(domain_names, self.resolver)
+            domains = {
+                name: domain_entry(addresses, ttl, old_domains.get(name))
+                for name, (addresses, ttl) in resolved.items()
+            }
+            # Split tunneling may not be enabled in the CLI config yet, update_split_tunneling updates the template
+            routes, _ = self.commit(build_routes(old_networks, old_domains), networks, domains)
+
+        self.wakeup.set()
+        return routes, sorted(name for name, (addresses, ttl) in resolved.items() if addresses is None)
+
+    def commit(self, old_routes, networks, domains):
+        """Save the state, and write and apply the routes if they changed.
+        Returns:
+        ----
+        - A tuple with the routes and whether they changed.
+        """
+        routes = build_routes(networks, domains)
+        save_state(networks, domains)
+
+        added, removed = diff_routes(old_routes, routes)
+        if added or removed or not os.path.isfile(SPLIT_TUNNEL_FILE):
+            write_networks(SPLIT_TUNNEL_FILE, routes)
+            change_file_owner(SPLIT_TUNNEL_FILE)
+
+            if (added or removed) and is_connected():
+                # The tray runs unprivileged, its routes take effect on the next connection, from the updated template
+                if os.geteuid() == 0:
+                    apply_route_changes(added, removed)
+                else:
+                    gui_logger.debug("[!] Not running as root, split tunneling routes will be applied on the next connection.")
+
+        return routes, bool(added or removed)
+
+    def refresh_expired(self):
+        """Re-resolve the domains whose TTL expired.
+        Returns:
+        ----
+        - The seconds until the next domain expires, or None if there are no domains to refresh.
+        """
+        with self.lock, state_lock():
+            state = load_state()
+            if not state or not state[1] or get_config_value("USER", "split_tunnel") != "1":
+                return None
+
+            networks, domains = state
+            now = time.time()
+            expired = [name for name, entry in domains.items() if entry["expires"] <= now]
+
+            if expired:
+                old_routes = build_routes(networks, domains)
+                for name, (addresses, ttl) in resolve_domains(expired, self.resolver).items():
+                    domains[name] = domain_entry(addresses, ttl, domains[name])
+                _, changed = self.commit(old_routes, networks, domains)
+                if changed:
+                    update_ovpn_template()
+
+            return max(0, min(entry["expires"] for entry in domains.values()) - time.time())
+
+    def acquire_refresh_lock(self):
+        """Take the refresh lock, held until the process exits.
+        Returns:
+        ----
+        - True if this process re-resolves the domains.
+        """
+        if self.refresh_lock is None:
+            lock_file = open_lock_file(SPLIT_TUNNEL_REFRESH_LOCK_FILE)
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                return False
+
+            gui_logger.debug(">>> Refreshing split tunneling domains from this process.")
+            self.refresh_lock = lock_file
+
+        return True
+
+    def run(self):
+        while True:
+            delay = None
+            try:
+                if self.acquire_refresh_lock():
+                    delay = self.refresh_expired()
+            except (OSError, KeyError, ValueError) as e:
+                gui_logger.debug("[!] Unable to refresh split tunneling domains: %s", e)
+
+            # The state can also be changed by the other process, so it is checked again at least every SPLIT_TUNNEL_RETRY
+            self.wakeup.wait(SPLIT_TUNNEL_RETRY if delay is None else min(delay, SPLIT_TUNNEL_RETRY))
+            self.wakeup.clear()
+
+domain_refresh_scheduler = DomainRefreshScheduler()
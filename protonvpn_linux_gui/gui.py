@@ -11,6 +11,13 @@ from protonvpn_cli.utils import check_root, get_config_value, change_file_owner,
 
 # Import GUI logger
 from .gui_logger import gui_logger
+from .gui_tracer import trace_handler, trace_span
+from .main_loop_watchdog import start_watchdog
+from .domain_resolver import domain_refresh_scheduler
+from .metrics import start_metrics_exporter
+from .server_tree import get_server_tree
+from .server_catalog import server_catalog
+from .server_query import parse_query
 
 # Custom helper functions
 from .utils import (
@@ -23,7 +30,9 @@ from .utils import (
     find_cli,
     get_gui_config,
     set_gui_config,
-    tab_style_manager
+    tab_style_manager,
+    get_displayed_server_tree_store,
+    show_server_tree_store
 )
 
 # Import functions that are called with threads
@@ -44,15 +53,15 @@ from .thread_functions import(
     purge_configurations,
     kill_duplicate_gui_process,
     load_content_on_start,
+    speed_test,
     update_connect_preference,
     tray_configurations,
     update_split_tunneling_status,
-    reload_secure_core_servers,
     initialize_gui_config
 )
 
 # Import version
-from .constants import VERSION, HELP_TEXT, GUI_CONFIG_DIR, GUI_CONFIG_FILE
+from .constants import VERSION, HELP_TEXT, GUI_CONFIG_DIR, GUI_CONFIG_FILE, SPEED_TEST_WARMUP, SPEED_TEST_DURATION
 
 # PyGObject import
 import gi
@@ -123,19 +132,26 @@ class Handler:
 
     # Dashboard BUTTON HANDLERS
     def server_filter_input_key_release(self, entry, event):
-        """Event handler, to filter servers after each key release
+        """Event handler, to filter servers after each key release.
+        The text is parsed as a query (e.g. "cc:de feature:p2p load<30 tier:plus"), which is evaluated once against the server index.
         """
-        user_filter_by = entry.get_text()
-        server_tree_store = self.interface.get_object("ServerTreeStore")
+        server_tree_store = get_displayed_server_tree_store(self.interface)
         tree_view_object = self.interface.get_object("TreeViewServerList")
 
+        with trace_span("filter server list", "handler"):
+            query_result = server_catalog.index.search(parse_query(entry.get_text()))
+
+        # Server rows are only in the model once their country is materialized
+        if query_result is not None:
+            get_server_tree(server_tree_store).materialize_countries(query_result.countries)
+
         # Creates a new filter from a ListStore/TreeStore
         n_filter = server_tree_store.filter_new()
 
         # set_visible_func:
         # first_param: filter function
         # seconde_param: input to filter by
-        n_filter.set_visible_func(self.column_filter, data=user_filter_by)
+        n_filter.set_visible_func(self.column_filter, data=query_result)
         
         # Apply the filter model to a TreeView
         tree_view_object.set_model(n_filter)
@@ -144,15 +160,42 @@ class Handler:
         n_filter.refilter()
 
     def column_filter(self, model, iterator, data=None):
-        """Filter by columns and returns the corresponding rows
+        """Filter rows by the result of the filter query, countries are shown if any of their servers match.
         """
-        treeview = self.interface.get_object("TreeViewServerList")
-        
-        for col in range(0, treeview.get_n_columns()):
-            value = model.get_value(iterator, col)
-            if isinstance(value, str):
-                if data.lower() in value.lower():
-                    return True
+        if data is None:
+            return True
+
+        # Placeholders keep the expander of countries that are not materialized yet
+        if get_server_tree(model).is_placeholder(iterator):
+            return True
+
+        if model.iter_parent(iterator) is None:
+            return model.get_value(iterator, 1) in data.countries
+
+        return model.get_value(iterator, 1) in data.servers
+
+    def TreeViewServerList_test_expand_row(self, treeview, tree_iter, path):
+        """Materializes the server rows of a country before it is expanded.
+        """
+        model = treeview.get_model()
+        if isinstance(model, Gtk.TreeModelFilter):
+            tree_iter = model.convert_iter_to_child_iter(tree_iter)
+            model = model.get_model()
+
+        get_server_tree(model).materialize(tree_iter)
+
+        # False allows the row to be expanded
+        return False
+
+    def TreeViewServerList_row_collapsed(self, treeview, tree_iter, path):
+        """Releases the server rows of a collapsed country.
+        """
+        model = treeview.get_model()
+        if isinstance(model, Gtk.TreeModelFilter):
+            tree_iter = model.convert_iter_to_child_iter(tree_iter)
+            model = model.get_model()
+
+        get_server_tree(model).release(tree_iter)
 
     def profile_quick_connect_button_clicked(self, button):
         """Button/Event handler to connect to the fastest server
@@ -227,6 +270,34 @@ class Handler:
 
         self.messagedialog_window.show()
         
+    def speed_test_button_clicked(self, button):
+        """Button/Event handler to test the download, upload and ping of the current connection.
+        """
+        self.messagedialog_sub_label.hide()
+
+        try:
+            servername = get_config_value("metadata", "connected_server") if is_connected() else False
+        except KeyError:
+            servername = False
+
+        if not servername:
+            self.messagedialog_label.set_markup("You need to be connected to a server to test its speed.")
+            self.messagedialog_spinner.hide()
+            self.messagedialog_window.show()
+            gui_logger.debug("[!] Attempted to test the speed without a connected server.")
+            return
+
+        self.messagedialog_label.set_markup("Testing the speed of <b>{0}</b>, this takes about {1} seconds...".format(servername, 2 * (SPEED_TEST_WARMUP + SPEED_TEST_DURATION)))
+        self.messagedialog_spinner.show()
+
+        gui_logger.debug(">>> Starting \"speed_test\" thread.")
+
+        thread = Thread(target=speed_test, args=[self.interface, self.messagedialog_label, self.messagedialog_spinner, servername])
+        thread.daemon = True
+        thread.start()
+
+        self.messagedialog_window.show()
+
     def about_menu_button_clicked(self, button):
         """Button /Event handler to open About dialog
         """
@@ -646,18 +717,16 @@ class Handler:
             self.secure_core_label_style.add_class("disabled_label")
         
         if (state and display_secure_core == "False") or (not state and display_secure_core != "False"):
-            self.messagedialog_sub_label.hide()        
-            self.messagedialog_label.set_markup("Loading {} servers...".format("secure-core" if update_to == "True" else "non secure-core"))
-            self.messagedialog_spinner.show()
-            thread = Thread(target=reload_secure_core_servers, args=[
-                                                    self.interface,
-                                                    self.messagedialog_label, 
-                                                    self.messagedialog_spinner,
-                                                    update_to])
+            # Both server lists are prebuilt, switching only swaps the TreeView model
+            show_server_tree_store(self.interface, update_to == "True")
+
+            server_filter_input = self.interface.get_object("server_filter_input")
+            if server_filter_input.get_text():
+                self.server_filter_input_key_release(server_filter_input, None)
+
+            thread = Thread(target=set_gui_config, args=["connections", "display_secure_core", update_to])
             thread.daemon = True
             thread.start()
-
-            self.messagedialog_window.show()
     
     def manage_profiles_button_clicked(self, button):
         self.messagedialog_sub_label.hide()        
@@ -775,7 +844,7 @@ def initialize_gui():
         messagedialog_window.connect("destroy", Gtk.main_quit)
 
     else:
-        interface.connect_signals(Handler(interface))
+        interface.connect_signals(trace_handler(Handler(interface)))
 
         check_root()
 
@@ -844,4 +913,8 @@ def initialize_gui():
             thread.start()
         # load_configurations(interface)
         window.show()
+        start_watchdog("GUI")
+        # Keeps the routes of split tunneling domains up to date with their DNS TTLs
+        domain_refresh_scheduler.start()
+        start_metrics_exporter()
     Gtk.main()
@@ -1,28 +1,97 @@
-import logging
 import os
+import time
+import queue
+import atexit
+import logging
+
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from .constants import GUI_CONFIG_DIR, LOG_LEVEL_ENV_VAR
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler that only interpolates the message on the calling thread.
+
+    The default QueueHandler.prepare() runs the full formatter (timestamps, etc.) before queueing,
+    here that is left to the file handler in the listener thread.
+    """
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+class RateLimitFilter(logging.Filter):
+    """Filter that drops records from the same call site if they are logged more often than allowed.
+
+    Only records logged with extra={"rate_limit": seconds} are limited, e.g. from callbacks that run every second.
+    """
+    def __init__(self):
+        super().__init__()
+        self.last_emitted = {}
+        self.suppressed = {}
+
+    def filter(self, record):
+        interval = getattr(record, "rate_limit", None)
+        if not interval:
+            return True
 
-from logging.handlers import RotatingFileHandler
-from .constants import GUI_CONFIG_DIR
+        call_site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        if now - self.last_emitted.get(call_site, -interval) < interval:
+            self.suppressed[call_site] = self.suppressed.get(call_site, 0) + 1
+            return False
+
+        self.last_emitted[call_site] = now
+        suppressed = self.suppressed.pop(call_site, 0)
+        if suppressed:
+            record.msg = "{0} ({1} similar messages suppressed)".format(record.msg, suppressed)
+
+        return True
+
+def set_log_level(level):
+    """Function that changes the log level at runtime. Accepts level names (e.g. "INFO") or numbers.
+    """
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            return False
+
+    logging.getLogger("protonvpn-linux-gui").setLevel(level)
+    return True
 
 def get_logger():
     """Create the logger.
+
+    Records are put on a queue and written to disk by a QueueListener thread,
+    so that callers (including the GTK main thread) never block on file I/O.
     """
     if not os.path.isdir(GUI_CONFIG_DIR):
         os.mkdir(GUI_CONFIG_DIR)
-        
+
     formatter = logging.Formatter("%(asctime)s — %(name)s — %(levelname)s — %(funcName)s:%(lineno)d — %(message)s")
     log = logging.getLogger("protonvpn-linux-gui")
-    log.setLevel(logging.DEBUG)
+    if not set_log_level(os.environ.get(LOG_LEVEL_ENV_VAR, "DEBUG")):
+        set_log_level(logging.DEBUG)
 
     #logging.basicConfig(filename=LOG_FILE, level=logging.DEBUG)
     try:
         LOGFILE = os.path.join(GUI_CONFIG_DIR, "protonvpn-gui.log")
         file_handler = RotatingFileHandler(LOGFILE, maxBytes=3145728, backupCount=1)
         file_handler.setFormatter(formatter)
-        log.addHandler(file_handler)
+
+        log_queue = queue.Queue(-1)
+        queue_handler = DeferredQueueHandler(log_queue)
+        queue_handler.addFilter(RateLimitFilter())
+        log.addHandler(queue_handler)
+
+        listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
     except NameError:
         pass
-    
+
     return log
 
 gui_logger = get_logger()
@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import atexit
+import threading
+import functools
+import collections
+
+from .constants import TRACE_ENV_VAR, TRACE_MAX_EVENTS
+
+# Tracing is opt-in, when PVPN_GUI_TRACE is not set the decorators return the original functions
+# and trace_span returns a shared no-op context manager, so there is no per-call cost.
+TRACE_FILE = os.environ.get(TRACE_ENV_VAR, "").replace("{pid}", str(os.getpid()))
+trace_enabled = bool(TRACE_FILE)
+
+_events = collections.deque(maxlen=TRACE_MAX_EVENTS)
+_thread_names = {}
+_lock = threading.Lock()
+_start = time.perf_counter()
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+_noop_span = _NoopSpan()
+
+class _Span:
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        record_span(self.name, self.category, self.start, time.perf_counter(), self.args)
+        return False
+
+def _timestamp(perf_time):
+    """Function that converts a perf_counter value into trace microseconds.
+    """
+    return (perf_time - _start) * 1000000
+
+def record_span(name, category, start, end, args=None):
+    """Function that stores a complete ("X") trace event.
+    """
+    thread = threading.current_thread()
+    event = {
+        "name": name,
+        "cat": category,
+        "ph": "X",
+        "ts": _timestamp(start),
+        "dur": (end - start) * 1000000,
+        "pid": os.getpid(),
+        "tid": thread.ident,
+    }
+    if args:
+        event["args"] = args
+
+    with _lock:
+        _thread_names[thread.ident] = thread.name
+        _events.append(event)
+
+def get_process_uptime():
+    """Function that returns the seconds since the process was started, including interpreter start up and imports.
+    Falls back to the seconds since this module was imported.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # The process name can contain spaces, the start time is the 22nd field
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.perf_counter() - _start
+
+def trace_span(name, category="span", **args):
+    """Context manager that records the enclosed block as a span.
+    """
+    if not trace_enabled:
+        return _noop_span
+
+    return _Span(name, category, args)
+
+def traced(category):
+    """Decorator that records every call of the decorated function as a span.
+    """
+    def decorator(func):
+        if not trace_enabled:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record_span(func.__name__, category, start, time.perf_counter())
+
+        return wrapper
+
+    return decorator
+
+def traced_callback(callback, category="idle"):
+    """Function that wraps a main loop callback (idle_add/timeout_add), so that both
+    the run time and the time it waited in the main loop queue are recorded.
+    """
+    if not trace_enabled:
+        return callback
+
+    # Only the first run waited in the queue, repeating timeouts are run on their interval
+    state = {"queued": time.perf_counter()}
+
+    @functools.wraps(callback)
+    def wrapper(*args):
+        start = time.perf_counter()
+        try:
+            return callback(*args)
+        finally:
+            queued = state.pop("queued", None)
+            span_args = {"queued_ms": (start - queued) * 1000} if queued is not None else None
+            record_span(callback.__name__, category, start, time.perf_counter(), span_args)
+
+    return wrapper
+
+def trace_handler(handler):
+    """Function that returns the signal handler object to pass to Gtk.Builder.connect_signals.
+    When tracing is enabled, a dict with all public handler methods wrapped as "handler" spans is returned instead.
+    """
+    if not trace_enabled:
+        return handler
+
+    return {
+        name: traced("handler")(getattr(handler, name))
+        for name in dir(handler)
+        if not name.startswith("_") and callable(getattr(handler, name))
+    }
+
+def get_events(since=None):
+    """Function that returns the recorded events, optionally only the ones that started after since (a perf_counter value).
+    """
+    with _lock:
+        events = list(_events)
+
+    if since is None:
+        return events
+
+    return [event for event in events if event["ts"] >= _timestamp(since)]
+
+def write_trace():
+    """Function that writes all recorded events to TRACE_FILE in Chrome trace-event JSON format.
+    """
+    if not trace_enabled:
+        return
+
+    with _lock:
+        events = list(_events)
+        thread_names = dict(_thread_names)
+
+    metadata = [
+        {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+        for tid, name in thread_names.items()
+    ]
+
+    with open(TRACE_FILE, "w") as f:
+        json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+
+if trace_enabled:
+    atexit.register(write_trace)
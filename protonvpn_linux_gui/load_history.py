@@ -0,0 +1,259 @@
+"""Persistent history of server loads.
+
+Every server pull appends one fixed-width record per server to LOAD_HISTORY_FILE:
+the pull timestamp (uint32), the server id (uint16) and the load (uint8).
+Server ids index the name dictionary in LOAD_HISTORY_NAMES_FILE.
+Records older than the retention are dropped by compaction, which also renumbers the ids.
+"""
+import os
+import json
+import mmap
+import time
+import struct
+import threading
+
+from protonvpn_cli.utils import change_file_owner
+
+from .constants import LOAD_HISTORY_FILE, LOAD_HISTORY_NAMES_FILE, LOAD_HISTORY_RETENTION
+from .gui_logger import gui_logger
+
+RECORD = struct.Struct("<IHB")
+
+class LoadHistory:
+    """Append-only load time series, with trend queries per server or group of servers.
+    """
+    def __init__(self, path=LOAD_HISTORY_FILE, names_path=LOAD_HISTORY_NAMES_FILE, retention=LOAD_HISTORY_RETENTION):
+        self.path = path
+        self.names_path = names_path
+        self.retention = retention
+        self.lock = threading.Lock()
+        self.names = None
+        self.name_ids = None
+        self.last_timestamp = None
+
+    def load_names(self):
+        if self.names is not None:
+            return
+
+        try:
+            with open(self.names_path) as f:
+                self.names = json.load(f)
+        except (OSError, ValueError):
+            self.names = []
+
+        self.name_ids = {name: server_id for server_id, name in enumerate(self.names)}
+
+    def save_names(self, names, path=None):
+        path = path or self.names_path
+        tmp_path = "{0}.tmp".format(path)
+        with open(tmp_path, "w") as f:
+            json.dump(names, f)
+        os.replace(tmp_path, path)
+        change_file_owner(path)
+
+    def get_server_id(self, name):
+        if name not in self.name_ids:
+            self.name_ids[name] = len(self.names)
+            self.names.append(name)
+
+        return self.name_ids[name]
+
+    def record(self, servers, timestamp=None):
+        """Append the current load of every server. A pull is only recorded once, keyed by its timestamp.
+        Returns:
+        ----
+        - The number of records written.
+        """
+        timestamp = int(timestamp or time.time())
+
+        with self.lock:
+            self.load_names()
+            if self.last_timestamp is None:
+                self.last_timestamp = self.last_record_timestamp()
+            if timestamp == self.last_timestamp:
+                return 0
+
+            names_count = len(self.names)
+            data = b"".join(
+                RECORD.pack(timestamp, self.get_server_id(server["Name"]), max(0, min(255, int(server["Load"]))))
+                for server in servers
+            )
+            if len(self.names) != names_count:
+                self.save_names(self.names)
+
+            created = not os.path.isfile(self.path)
+            with open(self.path, "ab") as f:
+                f.write(data)
+            if created:
+                change_file_owner(self.path)
+
+            self.last_timestamp = timestamp
+
+            if self.needs_compaction():
+                self.compact()
+
+        return len(data) // RECORD.size
+
+    def iter_records(self, since=0):
+        """Generator of (timestamp, server_id, load) records, oldest first.
+        """
+        try:
+            f = open(self.path, "rb")
+        except OSError:
+            return
+
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            size -= size % RECORD.size
+            if size == 0:
+                return
+
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mapped:
+                for record in RECORD.iter_unpack(mapped):
+                    if record[0] >= since:
+                        yield record
+
+    def first_timestamp(self):
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read(RECORD.size)
+        except OSError:
+            return False
+
+        if len(data) < RECORD.size:
+            return False
+
+        return RECORD.unpack(data)[0]
+
+    def last_record_timestamp(self):
+        try:
+            with open(self.path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                f.seek(size - size % RECORD.size - RECORD.size)
+                return RECORD.unpack(f.read(RECORD.size))[0]
+        except (OSError, ValueError, struct.error):
+            return False
+
+    def needs_compaction(self):
+        first_timestamp = self.first_timestamp()
+        # Compact at most about once per day
+        return first_timestamp and first_timestamp < time.time() - self.retention - 86400
+
+    def compact(self):
+        """Drop the records older than the retention, and the names that are no longer referenced.
+        """
+        self.load_names()
+        cutoff = time.time() - self.retention
+
+        new_names = []
+        new_ids = {}
+        tmp_path = "{0}.tmp".format(self.path)
+
+        with open(tmp_path, "wb") as f:
+            for timestamp, server_id, load in self.iter_records(since=cutoff):
+                if server_id not in new_ids:
+                    new_ids[server_id] = len(new_names)
+                    new_names.append(self.names[server_id])
+                f.write(RECORD.pack(timestamp, new_ids[server_id], load))
+
+        self.save_names(new_names)
+        os.replace(tmp_path, self.path)
+        change_file_owner(self.path)
+
+        self.names = new_names
+        self.name_ids = {name: server_id for server_id, name in enumerate(new_names)}
+        gui_logger.debug(">>> Compacted load history, %s servers kept.", len(new_names))
+
+    def get_trend(self, names, since=None):
+        """Function that summarizes the load history of a group of servers (e.g. a country), or of a single server.
+        Returns:
+        ----
+        - A dict with the number of samples, average, min and max load, and the average load per hour of the day
+        (local time, None for hours without samples), or False if there is no history.
+        """
+        with self.lock:
+            self.load_names()
+            server_ids = set(self.name_ids[name] for name in names if name in self.name_ids)
+
+        if not server_ids:
+            return False
+
+        since = since if since is not None else time.time() - self.retention
+        hourly_sum = [0] * 24
+        hourly_count = [0] * 24
+        load_min = None
+        load_max = None
+        hours = {}
+
+        for timestamp, server_id, load in self.iter_records(since):
+            if server_id not in server_ids:
+                continue
+
+            if timestamp not in hours:
+                hours[timestamp] = time.localtime(timestamp).tm_hour
+            hour = hours[timestamp]
+
+            hourly_sum[hour] += load
+            hourly_count[hour] += 1
+            load_min = load if load_min is None else min(load_min, load)
+            load_max = load if load_max is None else max(load_max, load)
+
+        samples = sum(hourly_count)
+        if not samples:
+            return False
+
+        return {
+            "samples": samples,
+            "average": sum(hourly_sum) / samples,
+            "min": load_min,
+            "max": load_max,
+            "hourly": [
+                hourly_sum[hour] / hourly_count[hour] if hourly_count[hour] else None
+                for hour in range(24)
+            ],
+        }
+
+    def server_trend(self, servername, since=None):
+        return self.get_trend([servername], since)
+
+    def country_trend(self, servers, country_code, since=None):
+        """Function that returns the load trend of all servers of a country, from a server list (e.g. the catalog).
+        """
+        return self.get_trend([server["Name"] for server in servers if server["ExitCountry"] == country_code], since)
+
+    def is_usually_quiet(self, names, hour=None, threshold=30):
+        """Function that checks if the average load of servers at an hour of the day (default: now) is below threshold.
+        """
+        trend = self.get_trend(names)
+        hour = time.localtime().tm_hour if hour is None else hour
+
+        if not trend or trend["hourly"][hour] is None:
+            return False
+
+        return trend["hourly"][hour] < threshold
+
+    def rank_servers(self, servers, since=None):
+        """Function that sorts servers by their average historical load, so that servers whose load is
+        consistently low come first. Servers without history are ranked by their current load.
+        """
+        since = since if since is not None else time.time() - self.retention
+
+        with self.lock:
+            self.load_names()
+            name_ids = dict(self.name_ids)
+
+        load_sum = {}
+        load_count = {}
+        for timestamp, server_id, load in self.iter_records(since):
+            load_sum[server_id] = load_sum.get(server_id, 0) + load
+            load_count[server_id] = load_count.get(server_id, 0) + 1
+
+        def average_load(server):
+            server_id = name_ids.get(server["Name"])
+            if server_id in load_count:
+                return load_sum[server_id] / load_count[server_id]
+            return server["Load"]
+
+        return sorted(servers, key=average_load)
+
+load_history = LoadHistory()
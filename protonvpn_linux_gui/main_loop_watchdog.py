@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+import threading
+import traceback
+
+from .constants import WATCHDOG_HEARTBEAT, WATCHDOG_STALL_THRESHOLD, WATCHDOG_THRESHOLD_ENV_VAR
+from .gui_logger import gui_logger
+
+# PyGObject import
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import GObject as gobject
+
+# Stall counters, shared so that they can be displayed/exported elsewhere
+stall_stats = {
+    "count": 0,
+    "longest": 0.0,
+    "total": 0.0,
+}
+
+def get_threshold():
+    """Function that returns the stall threshold set in the environment, or the default if it is not a number.
+    """
+    value = os.environ.get(WATCHDOG_THRESHOLD_ENV_VAR, WATCHDOG_STALL_THRESHOLD)
+    try:
+        return float(value)
+    except ValueError:
+        gui_logger.debug("[!] Invalid %s \"%s\", using %s.", WATCHDOG_THRESHOLD_ENV_VAR, value, WATCHDOG_STALL_THRESHOLD)
+        return WATCHDOG_STALL_THRESHOLD
+
+class MainLoopWatchdog:
+    """Watchdog that pings the GTK main loop from a background thread.
+
+    Every heartbeat a high priority idle callback is scheduled. If the main loop does not run it within
+    the threshold, a callback is blocking the loop, so the stack of the main thread is logged.
+    """
+    def __init__(self, threshold=None, heartbeat=WATCHDOG_HEARTBEAT, name="GUI"):
+        if threshold is None:
+            threshold = get_threshold()
+
+        self.threshold = threshold
+        self.heartbeat = heartbeat
+        self.name = name
+        self.main_thread_id = threading.main_thread().ident
+        self.ping_sent = None
+        self.stall_reported = False
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+        self.thread = threading.Thread(target=self.run, name="MainLoopWatchdog")
+        self.thread.daemon = True
+
+    def start(self):
+        gui_logger.debug(">>> Starting main loop watchdog for %s (threshold %ss).", self.name, self.threshold)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def pong(self):
+        """Runs in the main loop, marks the last ping as answered.
+        """
+        with self.lock:
+            ping_sent = self.ping_sent
+            stall_reported = self.stall_reported
+            self.ping_sent = None
+            self.stall_reported = False
+
+        if stall_reported:
+            stall_duration = time.monotonic() - ping_sent
+            stall_stats["total"] += stall_duration
+            stall_stats["longest"] = max(stall_stats["longest"], stall_duration)
+            gui_logger.debug("[!] %s main loop stall ended after %.2fs.", self.name, stall_duration)
+
+        return False
+
+    def run(self):
+        while not self.stop_event.wait(self.heartbeat):
+            with self.lock:
+                ping_sent = self.ping_sent
+                if ping_sent is None:
+                    self.ping_sent = time.monotonic()
+                    gobject.idle_add(self.pong, priority=gobject.PRIORITY_HIGH)
+                    continue
+
+                stalled_for = time.monotonic() - ping_sent
+                if self.stall_reported or stalled_for < self.threshold:
+                    continue
+                self.stall_reported = True
+
+            stall_stats["count"] += 1
+            self.report_stall(stalled_for)
+
+    def report_stall(self, stalled_for):
+        """Logs the stack of the main thread while it is blocked.
+        """
+        frame = sys._current_frames().get(self.main_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame else "Main thread stack unavailable.\n"
+
+        gui_logger.debug(
+            "[!] %s main loop blocked for %.2fs (stall #%s). Main thread stack:\n%s",
+            self.name, stalled_for, stall_stats["count"], stack
+        )
+
+def start_watchdog(name="GUI"):
+    """Function that starts the main loop watchdog, only if a threshold above 0 is set (see WATCHDOG_STALL_THRESHOLD).
+    """
+    watchdog = MainLoopWatchdog(name=name)
+    if watchdog.threshold <= 0:
+        return False
+
+    return watchdog.start()
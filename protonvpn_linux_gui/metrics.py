@@ -0,0 +1,300 @@
+"""Opt-in Prometheus metrics exporter.
+
+PVPN_GUI_METRICS selects where the metrics are exposed, in the Prometheus text format:
+- a file path (e.g. /var/lib/node_exporter/textfile/pvpn.prom), rewritten every METRICS_TEXTFILE_INTERVAL seconds
+  for the node exporter textfile collector,
+- "unix:/path/to/socket", an HTTP endpoint on a Unix socket,
+- "[host:]port", an HTTP endpoint, bound to localhost unless a host is given.
+
+When it is not set, the recording functions return right away and no thread is started.
+"""
+import os
+import time
+import threading
+import socketserver
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from protonvpn_cli.utils import get_config_value, is_connected
+
+from .constants import (
+    METRICS_ENV_VAR,
+    METRICS_TEXTFILE_INTERVAL,
+    METRICS_DEFAULT_HOST,
+    METRICS_CONNECT_BUCKETS,
+    METRICS_API_BUCKETS
+)
+from .gui_logger import gui_logger
+from .main_loop_watchdog import stall_stats
+from .server_catalog import server_catalog
+
+METRICS_TARGET = os.environ.get(METRICS_ENV_VAR, "")
+metrics_enabled = bool(METRICS_TARGET)
+
+# Name: (type, help, histogram buckets)
+METRIC_DEFINITIONS = {
+    "pvpn_gui_vpn_connected": ("gauge", "1 if the VPN is connected.", None),
+    "pvpn_gui_connected_server_info": ("gauge", "Server the VPN is connected to.", None),
+    "pvpn_gui_connected_server_load": ("gauge", "Load (percent) of the connected server.", None),
+    "pvpn_gui_transmit_bytes": ("gauge", "Bytes sent through the VPN interface during the session.", None),
+    "pvpn_gui_receive_bytes": ("gauge", "Bytes received through the VPN interface during the session.", None),
+    "pvpn_gui_transmit_bytes_per_second": ("gauge", "Send rate of the VPN interface since the previous scrape.", None),
+    "pvpn_gui_receive_bytes_per_second": ("gauge", "Receive rate of the VPN interface since the previous scrape.", None),
+    "pvpn_gui_command_duration_seconds": ("histogram", "Duration of protonvpn-cli connect/disconnect commands.", METRICS_CONNECT_BUCKETS),
+    "pvpn_gui_command_errors_total": ("counter", "protonvpn-cli commands that exited with an error.", None),
+    "pvpn_gui_api_request_duration_seconds": ("histogram", "Duration of API requests.", METRICS_API_BUCKETS),
+    "pvpn_gui_api_errors_total": ("counter", "API requests that failed, by kind (connection or http).", None),
+    "pvpn_gui_main_loop_stalls_total": ("counter", "Main loop stalls reported by the watchdog.", None),
+    "pvpn_gui_main_loop_stall_longest_seconds": ("gauge", "Longest main loop stall.", None),
+    "pvpn_gui_main_loop_stall_seconds_total": ("counter", "Total time the main loop was stalled.", None),
+    "pvpn_gui_first_paint_seconds": ("gauge", "Time from process start to the first server list paint.", None),
+}
+
+def format_labels(labels):
+    if not labels:
+        return ""
+
+    return "{{{0}}}".format(",".join(
+        '{0}="{1}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    ))
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """Metric values keyed by name and label set, rendered in the Prometheus text format.
+
+    Collectors are called before every render, to sample the values that are not pushed by the GUI.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.collectors = []
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values.setdefault(name, {})[key] = value
+
+    def set_info(self, name, **labels):
+        """Replace all series of an info gauge by a single one, so that a previous label set (e.g. server) is dropped.
+        """
+        with self.lock:
+            self.values[name] = {tuple(sorted(labels.items())): 1} if labels else {}
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram(METRIC_DEFINITIONS[name][2])
+            series[key].observe(value)
+
+    def register_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        for collector in self.collectors:
+            try:
+                collector(self)
+            except Exception as e:
+                gui_logger.debug("[!] Metrics collector %s failed: %s", collector.__name__, e)
+
+        lines = []
+        with self.lock:
+            for name in sorted(self.values):
+                metric_type, help_text, buckets = METRIC_DEFINITIONS[name]
+                lines.append("# HELP {0} {1}".format(name, help_text))
+                lines.append("# TYPE {0} {1}".format(name, metric_type))
+
+                for key, value in sorted(self.values[name].items()):
+                    if metric_type != "histogram":
+                        lines.append("{0}{1} {2}".format(name, format_labels(key), value))
+                        continue
+
+                    for bound, count in zip(value.buckets, value.counts):
+                        lines.append("{0}_bucket{1} {2}".format(name, format_labels(key + (("le", bound),)), count))
+                    lines.append("{0}_bucket{1} {2}".format(name, format_labels(key + (("le", "+Inf"),)), value.count))
+                    lines.append("{0}_sum{1} {2}".format(name, format_labels(key), value.sum))
+                    lines.append("{0}_count{1} {2}".format(name, format_labels(key), value.count))
+
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+# Previous byte counters of the VPN interface, to compute the rates
+interface_sample = {}
+
+def inc_counter(name, value=1, **labels):
+    if metrics_enabled:
+        metrics.inc(name, value, **labels)
+
+def set_gauge(name, value, **labels):
+    if metrics_enabled:
+        metrics.set(name, value, **labels)
+
+def observe(name, value, **labels):
+    if metrics_enabled:
+        metrics.observe(name, value, **labels)
+
+def record_command(command, result, start):
+    """Function that records the duration and outcome of a protonvpn-cli command, started at start (time.monotonic()).
+    """
+    if not metrics_enabled:
+        return
+
+    metrics.observe("pvpn_gui_command_duration_seconds", time.monotonic() - start, command=command)
+    if result.returncode != 0:
+        metrics.inc("pvpn_gui_command_errors_total", command=command)
+
+def collect_transferred_data(registry):
+    """Collector that samples the byte counters of the VPN interface, and the rates since the previous sample.
+    """
+    base_path = "/sys/class/net/{0}/statistics/{1}"
+    adapter_name = next((name for name in ("proton0", "tun0") if os.path.isfile(base_path.format(name, "rx_bytes"))), None)
+
+    if adapter_name is None:
+        interface_sample.clear()
+        for name in ("transmit_bytes", "receive_bytes", "transmit_bytes_per_second", "receive_bytes_per_second"):
+            registry.set("pvpn_gui_" + name, 0)
+        return
+
+    with open(base_path.format(adapter_name, "tx_bytes")) as f:
+        tx_bytes = int(f.read())
+    with open(base_path.format(adapter_name, "rx_bytes")) as f:
+        rx_bytes = int(f.read())
+
+    now = time.monotonic()
+    previous = interface_sample
+    if "time" in previous and now > previous["time"] and tx_bytes >= previous["tx"] and rx_bytes >= previous["rx"]:
+        registry.set("pvpn_gui_transmit_bytes_per_second", (tx_bytes - previous["tx"]) / (now - previous["time"]))
+        registry.set("pvpn_gui_receive_bytes_per_second", (rx_bytes - previous["rx"]) / (now - previous["time"]))
+
+    interface_sample.update(time=now, tx=tx_bytes, rx=rx_bytes)
+    registry.set("pvpn_gui_transmit_bytes", tx_bytes)
+    registry.set("pvpn_gui_receive_bytes", rx_bytes)
+
+def collect_connection_state(registry):
+    """Collector that samples the connection state, so that a tunnel that dropped on its own is reported
+    without waiting for the dashboard to refresh.
+    """
+    is_vpn_connected = is_connected()
+    try:
+        connected_server = get_config_value("metadata", "connected_server")
+    except KeyError:
+        connected_server = False
+
+    registry.set("pvpn_gui_vpn_connected", 1 if is_vpn_connected else 0)
+    registry.set_info("pvpn_gui_connected_server_load")
+
+    if not is_vpn_connected or not connected_server:
+        registry.set_info("pvpn_gui_connected_server_info")
+        return
+
+    registry.set_info("pvpn_gui_connected_server_info", server=connected_server)
+
+    # Load of the last server refresh, the server list is not read again on every scrape
+    load = next((server["Load"] for server in server_catalog.servers if server["Name"] == connected_server), None)
+    if load is not None:
+        registry.set("pvpn_gui_connected_server_load", load, server=connected_server)
+
+def collect_main_loop_stats(registry):
+    registry.set("pvpn_gui_main_loop_stalls_total", stall_stats["count"])
+    registry.set("pvpn_gui_main_loop_stall_longest_seconds", stall_stats["longest"])
+    registry.set("pvpn_gui_main_loop_stall_seconds_total", stall_stats["total"])
+
+metrics.register_collector(collect_transferred_data)
+metrics.register_collector(collect_connection_state)
+metrics.register_collector(collect_main_loop_stats)
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        gui_logger.debug(">>> Metrics request: %s", format % args)
+
+class MetricsHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class MetricsUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        socketserver.UnixStreamServer.server_bind(self)
+
+def write_textfile(path):
+    """Function that atomically rewrites the textfile, so that the collector never reads a partial file.
+    """
+    tmp_path = "{0}.tmp".format(path)
+    with open(tmp_path, "w") as f:
+        f.write(metrics.render())
+    os.replace(tmp_path, path)
+
+def run_textfile_exporter(path):
+    while True:
+        try:
+            write_textfile(path)
+        except OSError as e:
+            gui_logger.debug("[!] Unable to write metrics to %s: %s", path, e)
+        time.sleep(METRICS_TEXTFILE_INTERVAL)
+
+def start_metrics_exporter(target=METRICS_TARGET):
+    """Function that starts the exporter selected by PVPN_GUI_METRICS in a daemon thread.
+    Returns:
+    ----
+    - False if metrics are disabled or the exporter could not be started.
+    """
+    if not target:
+        return False
+
+    try:
+        if target.startswith("unix:"):
+            server = MetricsUnixServer(target[len("unix:"):], MetricsRequestHandler)
+            thread = threading.Thread(target=server.serve_forever, name="MetricsExporter")
+        elif "/" in target:
+            thread = threading.Thread(target=run_textfile_exporter, args=(target,), name="MetricsExporter")
+        else:
+            host, _, port = target.rpartition(":")
+            server = MetricsHTTPServer((host or METRICS_DEFAULT_HOST, int(port)), MetricsRequestHandler)
+            thread = threading.Thread(target=server.serve_forever, name="MetricsExporter")
+    except (OSError, ValueError) as e:
+        gui_logger.debug("[!] Unable to start metrics exporter on \"%s\": %s", target, e)
+        return False
+
+    thread.daemon = True
+    thread.start()
+    gui_logger.debug(">>> Metrics exporter started on \"%s\".", target)
+
+    return thread
@@ -0,0 +1,184 @@
+"""Asynchronous child processes driven by the GLib main loop.
+
+Output is drained through IO watches (so that a chatty child never blocks on a full pipe),
+children are reaped with child watch sources, and a process that runs past its timeout
+is terminated, then killed.
+"""
+import os
+import signal
+
+from .constants import PROCESS_KILL_GRACE
+from .gui_logger import gui_logger
+
+# PyGObject import
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import GLib
+
+class SupervisedProcess:
+    """A child process started by the ProcessSupervisor.
+
+    on_output(process, line) is called for every line written to stdout or stderr,
+    on_exit(process) once the process exited and both pipes are drained.
+    """
+    def __init__(self, name, argv, timeout=None, on_output=None, on_exit=None):
+        self.name = name
+        self.argv = argv
+        self.timeout = timeout
+        self.on_output = on_output
+        self.on_exit = on_exit
+        self.pid = None
+        self.returncode = None
+        self.timed_out = False
+        self.output = []
+        self.open_streams = 0
+        self.partial = {}
+        self.timeout_source = None
+
+    def start(self):
+        flags = GLib.SpawnFlags.DO_NOT_REAP_CHILD | GLib.SpawnFlags.SEARCH_PATH
+        ok, self.pid, stdin_fd, stdout_fd, stderr_fd = GLib.spawn_async_with_pipes(None, self.argv, None, flags, None)
+        os.close(stdin_fd)
+
+        for fd in (stdout_fd, stderr_fd):
+            self.open_streams += 1
+            self.partial[fd] = b""
+            GLib.io_add_watch(
+                GLib.IOChannel.unix_new(fd),
+                GLib.PRIORITY_DEFAULT,
+                GLib.IOCondition.IN | GLib.IOCondition.HUP | GLib.IOCondition.ERR,
+                self.read_output,
+                fd
+            )
+
+        GLib.child_watch_add(GLib.PRIORITY_DEFAULT, self.pid, self.child_exited)
+
+        if self.timeout:
+            self.timeout_source = GLib.timeout_add_seconds(self.timeout, self.terminate)
+
+        gui_logger.debug(">>> Started \"%s\" (pid %s): %s", self.name, self.pid, self.argv)
+
+    @property
+    def finished(self):
+        return self.returncode is not None and self.open_streams == 0
+
+    def read_output(self, channel, condition, fd):
+        data = b""
+        if condition & GLib.IOCondition.IN:
+            try:
+                data = os.read(fd, 4096)
+            except OSError:
+                data = b""
+
+        if data:
+            lines = (self.partial[fd] + data).split(b"\n")
+            self.partial[fd] = lines.pop()
+            for line in lines:
+                self.emit_line(line)
+            return True
+
+        # EOF or error, flush what is left and stop watching
+        if self.partial[fd]:
+            self.emit_line(self.partial[fd])
+        os.close(fd)
+        self.open_streams -= 1
+        self.check_finished()
+
+        return False
+
+    def emit_line(self, line):
+        line = line.decode(errors="replace").rstrip()
+        self.output.append(line)
+        if self.on_output:
+            self.on_output(self, line)
+
+    def child_exited(self, pid, status):
+        GLib.spawn_close_pid(pid)
+
+        if os.WIFEXITED(status):
+            self.returncode = os.WEXITSTATUS(status)
+        elif os.WIFSIGNALED(status):
+            self.returncode = -os.WTERMSIG(status)
+        else:
+            self.returncode = status
+
+        if self.timeout_source is not None:
+            GLib.source_remove(self.timeout_source)
+            self.timeout_source = None
+
+        self.check_finished()
+
+    def check_finished(self):
+        if not self.finished:
+            return
+
+        gui_logger.debug(
+            ">>> \"%s\" (pid %s) exited with %s%s.",
+            self.name, self.pid, self.returncode, " after timing out" if self.timed_out else ""
+        )
+        if self.on_exit:
+            self.on_exit(self)
+
+    def terminate(self):
+        """Terminate the process, and kill it if it is still running after the grace period.
+        """
+        self.timeout_source = None
+        if self.returncode is not None:
+            return False
+
+        self.timed_out = True
+        gui_logger.debug("[!] \"%s\" (pid %s) timed out after %ss, terminating.", self.name, self.pid, self.timeout)
+        self.send_signal(signal.SIGTERM)
+        self.timeout_source = GLib.timeout_add_seconds(PROCESS_KILL_GRACE, self.kill)
+
+        return False
+
+    def kill(self):
+        self.timeout_source = None
+        if self.returncode is None:
+            self.send_signal(signal.SIGKILL)
+
+        return False
+
+    def send_signal(self, sig):
+        try:
+            os.kill(self.pid, sig)
+        except OSError as e:
+            gui_logger.debug("[!] Unable to signal \"%s\" (pid %s): %s", self.name, self.pid, e)
+
+class ProcessSupervisor:
+    """Runs named child processes, at most one per name, so that repeated actions (e.g. double clicks)
+    do not start the same command twice.
+    """
+    def __init__(self):
+        self.running = {}
+
+    def is_running(self, name):
+        return name in self.running
+
+    def run(self, name, argv, timeout=None, on_output=None, on_exit=None):
+        """Start argv as a supervised process.
+        Returns:
+        ----
+        - The SupervisedProcess, or False if a process with the same name is still running or it could not be started.
+        """
+        if name in self.running:
+            gui_logger.debug("[!] \"%s\" is already running.", name)
+            return False
+
+        def process_exited(process):
+            self.running.pop(name, None)
+            if on_exit:
+                on_exit(process)
+
+        process = SupervisedProcess(name, argv, timeout, on_output, process_exited)
+        try:
+            process.start()
+        except GLib.Error as e:
+            gui_logger.debug("[!] Unable to start \"%s\": %s", name, e)
+            return False
+
+        self.running[name] = process
+        return process
+
+process_supervisor = ProcessSupervisor()
@@ -0,0 +1,61 @@
+"""Country index of the server list.
+
+The catalog is rebuilt once per server refresh and shared by the server list, the autoconnect
+and quick connect comboboxes, and everything that maps between country codes and names.
+"""
+import threading
+import collections
+
+from protonvpn_cli.country_codes import country_codes
+
+from .view_model import build_autoconnect_rows
+from .server_query import ServerIndex
+
+# Reverse index of country_codes, country names are unique
+COUNTRY_NAME_CODES = {name: code for code, name in country_codes.items()}
+
+def get_country_name(code):
+    """Function that returns the country name of a country code, or False if it is unknown.
+    """
+    return country_codes.get(code, False)
+
+def get_country_code(name):
+    """Function that returns the country code of a country name, or False if it is unknown.
+    """
+    return COUNTRY_NAME_CODES.get(name, False)
+
+class ServerCatalog:
+    """Countries of the current server list, with the autoconnect/quick connect options derived from them,
+    and the index that answers server list filter queries.
+
+    version is incremented on every update, so that models built from the catalog know when to rebuild.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = 0
+        self.servers = []
+        self.countries = collections.OrderedDict()
+        self.autoconnect_options = collections.OrderedDict()
+        self.index = ServerIndex([])
+
+    def update(self, servers):
+        """Rebuild the catalog from a new server list.
+        """
+        autoconnect_options = collections.OrderedDict(build_autoconnect_rows(servers))
+        countries = collections.OrderedDict(
+            (code, name) for code, name in autoconnect_options.items() if code in country_codes
+        )
+        index = ServerIndex(servers)
+
+        with self.lock:
+            self.servers = servers
+            self.countries = countries
+            self.autoconnect_options = autoconnect_options
+            self.index = index
+            self.version += 1
+
+    @property
+    def is_loaded(self):
+        return self.version > 0
+
+server_catalog = ServerCatalog()
@@ -0,0 +1,156 @@
+"""Query language of the server list filter.
+
+A query is a list of whitespace separated terms, all of which must match:
+- cc:DE or cc:de,ch, exit country codes,
+- feature:p2p, feature:tor, feature:sc (secure-core) or feature:normal,
+- tier:free, tier:basic or tier:plus,
+- load<30, load<=30, load>50, load>=50 or load=0,
+- any other text, matched against the server and country names (as the plain filter did).
+
+Terms are parsed once per query and evaluated against the columns and inverted indexes of a ServerIndex,
+which is built once per server refresh.
+"""
+import re
+import bisect
+import collections
+
+from protonvpn_cli.country_codes import country_codes
+
+QUERY_FIELD_PATTERN = re.compile(r"^(cc|feature|tier):(.+)$", re.IGNORECASE)
+QUERY_LOAD_PATTERN = re.compile(r"^load(<=|>=|<|>|=)(\d+)%?$", re.IGNORECASE)
+
+# Feature bits of the API "Features" field
+QUERY_FEATURES = {"sc": 1, "secure-core": 1, "tor": 2, "p2p": 4}
+QUERY_FEATURES_MASK = 1 | 2 | 4
+QUERY_TIERS = {"free": 0, "basic": 1, "plus": 2, "visionary": 2}
+
+ServerQuery = collections.namedtuple("ServerQuery", ["countries", "features", "tiers", "loads", "texts"])
+QueryResult = collections.namedtuple("QueryResult", ["servers", "countries"])
+
+def parse_query(text):
+    """Function that parses a filter text.
+    Returns:
+    ----
+    - A ServerQuery, where countries, features and tiers are lists of accepted value sets (one per term),
+    loads a list of (operator, value) and texts a list of lowercase substrings.
+    """
+    query = ServerQuery([], [], [], [], [])
+
+    for term in text.split():
+        field_match = QUERY_FIELD_PATTERN.match(term)
+        load_match = QUERY_LOAD_PATTERN.match(term)
+
+        if load_match:
+            query.loads.append((load_match.group(1), int(load_match.group(2))))
+            continue
+
+        if field_match:
+            field = field_match.group(1).lower()
+            values = [value for value in field_match.group(2).lower().split(",") if value]
+
+            if field == "cc":
+                query.countries.append(set(value.upper() for value in values))
+                continue
+            if field == "feature" and all(value in QUERY_FEATURES or value == "normal" for value in values):
+                query.features.append(set(values))
+                continue
+            if field == "tier" and all(value in QUERY_TIERS for value in values):
+                query.tiers.append(set(QUERY_TIERS[value] for value in values))
+                continue
+
+        # Unknown fields and invalid values are matched as text
+        query.texts.append(term.lower())
+
+    return query
+
+def is_empty_query(query):
+    return not any(query)
+
+class ServerIndex:
+    """Columns and inverted indexes of a server list. Servers are identified by their position in the list.
+    """
+    def __init__(self, servers):
+        self.names = []
+        self.search_names = []
+        self.country_names = []
+        self.by_country = {}
+        self.by_feature = {}
+        self.by_tier = {}
+
+        for server_id, server in enumerate(servers):
+            country = country_codes.get(server["ExitCountry"], server["ExitCountry"])
+            self.names.append(server["Name"])
+            self.country_names.append(country)
+            # Text terms match the server name or its country name
+            self.search_names.append("{0}\n{1}".format(server["Name"], country).lower())
+
+            self.by_country.setdefault(server["ExitCountry"].upper(), set()).add(server_id)
+            self.by_tier.setdefault(server["Tier"], set()).add(server_id)
+
+            features = server["Features"] or 0
+            if not features & QUERY_FEATURES_MASK:
+                self.by_feature.setdefault("normal", set()).add(server_id)
+            for feature, bit in QUERY_FEATURES.items():
+                if features & bit:
+                    self.by_feature.setdefault(feature, set()).add(server_id)
+
+        # Server ids sorted by load, load terms are answered with a bisection
+        self.load_order = sorted(range(len(servers)), key=lambda server_id: servers[server_id]["Load"])
+        self.sorted_loads = [servers[server_id]["Load"] for server_id in self.load_order]
+
+    def lookup(self, index, value_sets):
+        """Intersection of the terms of a field, each term being the union of its values.
+        """
+        candidates = None
+        for values in value_sets:
+            term_ids = set()
+            for value in values:
+                term_ids |= index.get(value, set())
+            candidates = term_ids if candidates is None else candidates & term_ids
+
+        return candidates
+
+    def load_range(self, operator, value):
+        if operator == "<":
+            return self.load_order[:bisect.bisect_left(self.sorted_loads, value)]
+        if operator == "<=":
+            return self.load_order[:bisect.bisect_right(self.sorted_loads, value)]
+        if operator == ">":
+            return self.load_order[bisect.bisect_right(self.sorted_loads, value):]
+        if operator == ">=":
+            return self.load_order[bisect.bisect_left(self.sorted_loads, value):]
+
+        return self.load_order[bisect.bisect_left(self.sorted_loads, value):bisect.bisect_right(self.sorted_loads, value)]
+
+    def search(self, query):
+        """Function that evaluates a parsed query.
+        Returns:
+        ----
+        - A QueryResult with the sets of matching server names and country names,
+        or None if the query is empty (everything matches).
+        """
+        if is_empty_query(query):
+            return None
+
+        candidates = None
+        for index, value_sets in ((self.by_country, query.countries), (self.by_feature, query.features), (self.by_tier, query.tiers)):
+            term_ids = self.lookup(index, value_sets)
+            if term_ids is not None:
+                candidates = term_ids if candidates is None else candidates & term_ids
+
+        for operator, value in query.loads:
+            term_ids = set(self.load_range(operator, value))
+            candidates = term_ids if candidates is None else candidates & term_ids
+
+        # Text terms are not indexed, they are only checked against the remaining candidates
+        if query.texts:
+            server_ids = candidates if candidates is not None else range(len(self.names))
+            candidates = set(
+                server_id for server_id in server_ids
+                if all(text in self.search_names[server_id] for text in query.texts)
+            )
+
+        return QueryResult(
+            set(self.names[server_id] for server_id in candidates),
+            set(self.country_names[server_id] for server_id in candidates)
+        )
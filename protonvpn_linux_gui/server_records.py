@@ -0,0 +1,103 @@
+"""Compact in-memory representation of the server list.
+
+The server info file holds, for every logical server, its physical servers (IPs, domains, labels) and
+location details the GUI never displays. Logical servers are decoded into ServerRecords, with __slots__
+for the displayed fields and interned country codes, and the physical servers are dropped while the file is parsed.
+Other fields are only read from the file again when they are accessed.
+"""
+import sys
+import json
+
+from protonvpn_cli.constants import SERVER_INFO_FILE
+from protonvpn_cli.utils import get_config_value
+
+# Fields kept in memory, the others are read from the server info file on first access
+RECORD_FIELDS = ("Name", "ExitCountry", "EntryCountry", "Tier", "Features", "Load", "Score", "Status")
+
+class ServerRecord:
+    """A logical server. Records are read like the server dicts (record["Load"], record.get("Score")),
+    so that they can be passed to the view-model and to protonvpn-cli helpers such as get_server_value.
+    """
+    __slots__ = RECORD_FIELDS + ("details",)
+
+    def __init__(self, server):
+        self.Name = server["Name"]
+        self.ExitCountry = sys.intern(server["ExitCountry"])
+        self.EntryCountry = sys.intern(server.get("EntryCountry") or server["ExitCountry"])
+        self.Tier = server["Tier"]
+        self.Features = server["Features"]
+        self.Load = server["Load"]
+        self.Score = server.get("Score")
+        self.Status = server.get("Status", 1)
+        self.details = None
+
+    def __getitem__(self, key):
+        if key in RECORD_FIELDS:
+            return getattr(self, key)
+
+        if self.details is None:
+            self.details = load_server_details(self.Name)
+
+        return self.details[key]
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+
+        return True
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return "ServerRecord({0!r})".format(self.Name)
+
+def decode_server(obj):
+    """json object_hook that turns logical servers into ServerRecords, and drops their physical servers.
+    """
+    # Physical servers (entry/exit IPs and domains) are never displayed
+    if "EntryIP" in obj:
+        return None
+
+    if "ExitCountry" in obj and "Tier" in obj:
+        return ServerRecord(obj)
+
+    return obj
+
+def load_server_records(path=SERVER_INFO_FILE):
+    """Function that loads all logical servers of the server info file as ServerRecords.
+    """
+    with open(path, "r") as f:
+        return json.load(f, object_hook=decode_server)["LogicalServers"]
+
+def load_server_details(servername, path=SERVER_INFO_FILE):
+    """Function that reads the complete entry of a logical server from the server info file.
+    Returns:
+    ----
+    - The server dict, or an empty dict if the server (or the file) no longer exists.
+    """
+    try:
+        with open(path, "r") as f:
+            servers = json.load(f)["LogicalServers"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+    for server in servers:
+        if server["Name"] == servername:
+            return server
+
+    return {}
+
+def get_servers():
+    """Function that returns the servers of the user's tier, as ServerRecords.
+    Same selection as protonvpn_cli.utils.get_servers, which returns the complete dicts.
+    """
+    servers = load_server_records()
+    user_tier = int(get_config_value("USER", "tier"))
+
+    return [server for server in servers if server.Tier <= user_tier and server.Status == 1]
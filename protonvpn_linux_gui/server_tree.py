@@ -0,0 +1,246 @@
+from .constants import SMALL_FLAGS_BASE_PATH, FEATURES_BASE_PATH
+from .gui_tracer import trace_span
+from .server_catalog import get_country_code
+
+# PyGObject import
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import GdkPixbuf
+
+# Child row of a country whose server rows have not been materialized yet
+PLACEHOLDER_ROW = [None, "", None, None, ""]
+
+# Pixbufs are loaded once and shared by all rows
+pixbuf_cache = {}
+
+def get_flag_path(country):
+    if get_country_code(country):
+        return SMALL_FLAGS_BASE_PATH+"{}.png".format(country)
+
+    return SMALL_FLAGS_BASE_PATH+"Unknown.png"
+
+def get_flag_pixbuf(country):
+    key = "flag_" + country
+    if key not in pixbuf_cache:
+        pixbuf_cache[key] = GdkPixbuf.Pixbuf.new_from_file_at_size(get_flag_path(country), 15,15)
+
+    return pixbuf_cache[key]
+
+def create_features_img():
+    if "features" in pixbuf_cache:
+        return pixbuf_cache["features"]
+
+    # Create empty image
+    empty_path = FEATURES_BASE_PATH+"normal.png"
+    empty_pix = GdkPixbuf.Pixbuf.new_from_file_at_size(empty_path, 15,15)
+    # Create P2P image
+    p2p_path = FEATURES_BASE_PATH+"p2p-arrows.png"
+    p2p_pix = GdkPixbuf.Pixbuf.new_from_file_at_size(p2p_path, 15,15)
+    # Create TOR image
+    tor_path = FEATURES_BASE_PATH+"tor-onion.png"
+    tor_pix = GdkPixbuf.Pixbuf.new_from_file_at_size(tor_path, 15,15)
+    # Create Plus image
+    plus_server_path = FEATURES_BASE_PATH+"plus-server.png"
+    plus_pix = GdkPixbuf.Pixbuf.new_from_file_at_size(plus_server_path, 15,15)
+
+    images_dict = {
+        "empty_pix": empty_pix,
+        "p2p_pix": p2p_pix,
+        "tor_pix": tor_pix,
+        "plus_pix": plus_pix,
+    }
+    pixbuf_cache["features"] = images_dict
+    return images_dict
+
+def get_country_values(country_row):
+    country, plus_feature, feature, avrg_load = country_row
+    images_dict = create_features_img()
+
+    return [
+        get_flag_pixbuf(country),
+        country,
+        images_dict[plus_feature + "_pix"],
+        images_dict[feature + "_pix"],
+        avrg_load
+    ]
+
+def get_server_values(server_row):
+    servername, plus_feature, feature, load = server_row
+    images_dict = create_features_img()
+
+    return [
+        images_dict["empty_pix"],
+        servername,
+        images_dict[plus_feature + "_pix"],
+        images_dict[feature + "_pix"],
+        load
+    ]
+
+class LazyServerTree:
+    """Server list TreeStore that only holds the country rows up front.
+
+    Every country gets a placeholder child, so that it can be expanded. Its server rows are
+    materialized when the country is expanded, and released again when it is collapsed.
+
+    Refreshes are reconciled with the rows already in the store, keyed by country and server name,
+    so that expanded countries, the selection and the scroll position are kept.
+    """
+    def __init__(self, tree_store):
+        self.tree_store = tree_store
+        self.country_rows = {}
+        self.server_rows = {}
+
+    def populate(self, rows):
+        """Replace the content of the TreeStore with rows, as built by view_model.build_server_rows.
+        """
+        with trace_span("populate server list", "gtk", countries=len(rows)):
+            self.tree_store.clear()
+            self.country_rows = {}
+            self.server_rows = {}
+
+            for country_row, server_rows in rows:
+                self.country_rows[country_row[0]] = country_row
+                self.server_rows[country_row[0]] = server_rows
+
+                country_iter = self.tree_store.append(None, get_country_values(country_row))
+                if server_rows:
+                    self.tree_store.append(country_iter, PLACEHOLDER_ROW)
+
+    def reconcile(self, rows):
+        """Update the TreeStore in place to match rows. Only changed cells are written,
+        and only added or removed countries and servers are inserted or removed.
+        """
+        if self.tree_store.get_iter_first() is None:
+            self.populate(rows)
+            return
+
+        new_countries = {country_row[0]: country_row for country_row, server_rows in rows}
+
+        with trace_span("reconcile server list", "gtk", countries=len(rows)):
+            country_iters = {}
+            tree_iter = self.tree_store.get_iter_first()
+            while tree_iter is not None:
+                country = self.tree_store.get_value(tree_iter, 1)
+                if country in new_countries:
+                    country_iters[country] = tree_iter
+                    tree_iter = self.tree_store.iter_next(tree_iter)
+                elif not self.tree_store.remove(tree_iter):
+                    tree_iter = None
+
+            # Countries are sorted by name, so kept countries are already in place
+            for position, (country_row, server_rows) in enumerate(rows):
+                country = country_row[0]
+
+                if country in country_iters:
+                    self.update_cells(country_iters[country], self.country_rows[country], country_row)
+                    self.reconcile_servers(country_iters[country], country, server_rows)
+                else:
+                    country_iter = self.tree_store.insert(None, position, get_country_values(country_row))
+                    if server_rows:
+                        self.tree_store.append(country_iter, PLACEHOLDER_ROW)
+
+                self.country_rows[country] = country_row
+                self.server_rows[country] = server_rows
+
+            for country in set(self.country_rows) - set(new_countries):
+                del self.country_rows[country]
+                del self.server_rows[country]
+
+    def reconcile_servers(self, country_iter, country, server_rows):
+        child_iter = self.tree_store.iter_children(country_iter)
+
+        if not self.is_materialized(country_iter):
+            if server_rows and child_iter is None:
+                self.tree_store.append(country_iter, PLACEHOLDER_ROW)
+            elif not server_rows and child_iter is not None:
+                self.tree_store.remove(child_iter)
+            return
+
+        old_rows = {server_row[0]: server_row for server_row in self.server_rows[country]}
+        new_rows = {server_row[0]: server_row for server_row in server_rows}
+
+        current_order = []
+        while child_iter is not None:
+            servername = self.tree_store.get_value(child_iter, 1)
+            if servername in new_rows:
+                self.update_cells(child_iter, old_rows[servername], new_rows[servername])
+                current_order.append(servername)
+                child_iter = self.tree_store.iter_next(child_iter)
+            elif not self.tree_store.remove(child_iter):
+                child_iter = None
+
+        for server_row in server_rows:
+            if server_row[0] not in old_rows:
+                self.tree_store.append(country_iter, get_server_values(server_row))
+                current_order.append(server_row[0])
+
+        # Servers are sorted by load, rows are moved instead of recreated so that they stay selected
+        new_order = [server_row[0] for server_row in server_rows]
+        if current_order != new_order:
+            positions = {servername: position for position, servername in enumerate(current_order)}
+            self.tree_store.reorder(country_iter, [positions[servername] for servername in new_order])
+
+    def update_cells(self, tree_iter, old_row, new_row):
+        """Write the cells that changed between two rows, (name, plus_feature, feature, load) tuples.
+        """
+        images_dict = create_features_img()
+
+        if old_row[1] != new_row[1]:
+            self.tree_store.set_value(tree_iter, 2, images_dict[new_row[1] + "_pix"])
+        if old_row[2] != new_row[2]:
+            self.tree_store.set_value(tree_iter, 3, images_dict[new_row[2] + "_pix"])
+        if old_row[3] != new_row[3]:
+            self.tree_store.set_value(tree_iter, 4, new_row[3])
+
+    def is_placeholder(self, tree_iter):
+        return self.tree_store.get_value(tree_iter, 1) == ""
+
+    def is_materialized(self, country_iter):
+        child_iter = self.tree_store.iter_children(country_iter)
+        return child_iter is not None and not self.is_placeholder(child_iter)
+
+    def materialize(self, country_iter):
+        """Replace the placeholder of a country with its server rows.
+        """
+        if self.is_materialized(country_iter):
+            return
+
+        child_iter = self.tree_store.iter_children(country_iter)
+        if child_iter is None:
+            return
+
+        country = self.tree_store.get_value(country_iter, 1)
+        for server_row in self.server_rows.get(country, []):
+            self.tree_store.append(country_iter, get_server_values(server_row))
+
+        self.tree_store.remove(child_iter)
+
+    def release(self, country_iter):
+        """Replace the server rows of a country with a placeholder.
+        """
+        if not self.is_materialized(country_iter):
+            return
+
+        self.tree_store.append(country_iter, PLACEHOLDER_ROW)
+        child_iter = self.tree_store.iter_children(country_iter)
+        while not self.is_placeholder(child_iter):
+            if not self.tree_store.remove(child_iter):
+                break
+
+    def materialize_countries(self, countries):
+        """Materialize a set of countries (e.g. the countries of a filter result), so that their servers can be shown by the filter.
+        """
+        country_iter = self.tree_store.get_iter_first()
+        while country_iter is not None:
+            if self.tree_store.get_value(country_iter, 1) in countries:
+                self.materialize(country_iter)
+            country_iter = self.tree_store.iter_next(country_iter)
+
+# LazyServerTree of every TreeStore, they are shared between the GUI handlers and the workers
+server_trees = {}
+
+def get_server_tree(tree_store):
+    if tree_store not in server_trees:
+        server_trees[tree_store] = LazyServerTree(tree_store)
+
+    return server_trees[tree_store]
@@ -0,0 +1,79 @@
+"""Cached view-model of the Settings window.
+
+The values displayed by the settings are read with a single parse of pvpn-cli.cfg and pvpn-gui.cfg,
+and only read again when one of the files changed (by the GUI, the CLI or the tray).
+"""
+import os
+import threading
+import configparser
+
+from protonvpn_cli.constants import CONFIG_FILE
+
+from .constants import GUI_CONFIG_FILE, TRAY_CFG_DICT
+from .gui_logger import gui_logger
+
+def get_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+def read_config(path):
+    config = configparser.ConfigParser()
+    config.read(path)
+    return config
+
+def get_value(config, group, key, default):
+    try:
+        return config[group][key]
+    except KeyError:
+        return default
+
+def build_settings(cli_config, gui_config):
+    """Function that builds the settings values from both config files, without touching any widgets.
+    Returns:
+    ----
+    - A dict with the username and tier, the tray combobox indexes (by combobox id), the autoconnect and
+    quick connect commands, the default protocol, and the dns leak protection, kill switch and split tunneling states.
+    """
+    tray = {}
+    for combobox_id, key in TRAY_CFG_DICT.items():
+        try:
+            tray[combobox_id] = int(get_value(gui_config, "tray_tab", key, 0))
+        except ValueError:
+            tray[combobox_id] = 0
+
+    return {
+        "username": get_value(cli_config, "USER", "username", ""),
+        "tier": int(get_value(cli_config, "USER", "tier", 0)),
+        "tray": tray,
+        "autoconnect": get_value(gui_config, "conn_tab", "autoconnect", "dis"),
+        "quick_connect": get_value(gui_config, "conn_tab", "quick_connect", "dis"),
+        "default_protocol": get_value(cli_config, "USER", "default_protocol", "tcp"),
+        "dns_leak_protection": get_value(cli_config, "USER", "dns_leak_protection", "1") == "1",
+        "killswitch": get_value(cli_config, "USER", "killswitch", "0") != "0",
+        "split_tunnel": get_value(cli_config, "USER", "split_tunnel", "0") != "0",
+    }
+
+class SettingsViewModel:
+    """Settings values, rebuilt only when pvpn-cli.cfg or pvpn-gui.cfg were modified.
+    """
+    def __init__(self, cli_config_path=CONFIG_FILE, gui_config_path=GUI_CONFIG_FILE):
+        self.cli_config_path = cli_config_path
+        self.gui_config_path = gui_config_path
+        self.lock = threading.Lock()
+        self.mtimes = None
+        self.settings = None
+
+    def get_settings(self):
+        mtimes = (get_mtime(self.cli_config_path), get_mtime(self.gui_config_path))
+
+        with self.lock:
+            if self.settings is None or mtimes != self.mtimes:
+                self.settings = build_settings(read_config(self.cli_config_path), read_config(self.gui_config_path))
+                self.mtimes = mtimes
+                gui_logger.debug(">>> Settings view-model rebuilt.")
+
+            return self.settings
+
+settings_view_model = SettingsViewModel()
@@ -0,0 +1,90 @@
+"""On-disk snapshot of the last good server catalog and IP information, used to render the dashboard on start up
+before the API has answered.
+
+The file is a fixed header (magic, format version, CRC32 and length of the payload) followed by
+a zlib compressed JSON payload. Servers are stored as rows of SNAPSHOT_SERVER_KEYS values.
+Snapshots with a different version, a bad checksum or a truncated payload are ignored.
+"""
+import os
+import json
+import time
+import zlib
+import struct
+
+from protonvpn_cli.utils import change_file_owner
+
+from .constants import SNAPSHOT_FILE
+from .gui_logger import gui_logger
+from .server_records import ServerRecord
+
+SNAPSHOT_MAGIC = b"PVPNSNAP"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<8sHII")
+# The server keys used by the dashboard, the server list and the catalog
+SNAPSHOT_SERVER_KEYS = ("Name", "ExitCountry", "Features", "Tier", "Load", "Score", "Status")
+
+def save_snapshot(servers, ip_info, path=SNAPSHOT_FILE):
+    """Function that atomically saves the servers and IP information (ip, isp, country) to the snapshot.
+    """
+    payload = json.dumps({
+        "created": time.time(),
+        "servers": [[server.get(key) for key in SNAPSHOT_SERVER_KEYS] for server in servers],
+        "ip_info": list(ip_info) if ip_info else False,
+    }, separators=(",", ":")).encode()
+    payload = zlib.compress(payload, 1)
+
+    tmp_path = "{0}.tmp".format(path)
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, zlib.crc32(payload), len(payload)))
+        f.write(payload)
+    os.replace(tmp_path, path)
+    change_file_owner(path)
+
+def load_snapshot(path=SNAPSHOT_FILE):
+    """Function that loads the snapshot.
+    Returns:
+    ----
+    - A dict with the creation time, servers and ip_info, or False if there is no valid snapshot.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return False
+
+    if len(data) < SNAPSHOT_HEADER.size:
+        return False
+
+    magic, version, checksum, length = SNAPSHOT_HEADER.unpack_from(data)
+    payload = data[SNAPSHOT_HEADER.size:]
+
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        gui_logger.debug("[!] Ignoring snapshot with unknown format (version %s).", version)
+        return False
+
+    if len(payload) != length or zlib.crc32(payload) != checksum:
+        gui_logger.debug("[!] Ignoring corrupted snapshot.")
+        return False
+
+    try:
+        snapshot = json.loads(zlib.decompress(payload).decode())
+    except (zlib.error, ValueError):
+        gui_logger.debug("[!] Unable to decode snapshot.")
+        return False
+
+    snapshot["servers"] = [ServerRecord(dict(zip(SNAPSHOT_SERVER_KEYS, row))) for row in snapshot["servers"]]
+    snapshot["ip_info"] = tuple(snapshot["ip_info"]) if snapshot["ip_info"] else False
+
+    return snapshot
+
+def get_snapshot_age(snapshot):
+    """Function that returns the age of a snapshot in a human readable format.
+    """
+    minutes = int(max(0, time.time() - snapshot["created"]) // 60)
+
+    if minutes < 60:
+        return "{0} min".format(minutes)
+    if minutes < 48 * 60:
+        return "{0} h".format(minutes // 60)
+
+    return "{0} days".format(minutes // (24 * 60))
@@ -0,0 +1,258 @@
+"""Throughput and latency test of the VPN connection.
+
+Download and upload are measured with parallel HTTP streams against SPEED_TEST_URL, which serves
+GET /__down?bytes=N and accepts POST /__up. Bytes transferred during the warm-up, while the TCP windows
+are still growing, are not counted. RTT is the median of small requests on a kept-alive connection, and jitter
+the mean difference between consecutive RTTs.
+
+Results are stored per server, so that servers can be ranked by their measured speed.
+"""
+import os
+import json
+import time
+import threading
+import statistics
+
+import requests
+
+from protonvpn_cli.utils import change_file_owner
+
+from .constants import (
+    SPEED_TEST_URL,
+    SPEED_TEST_STREAMS,
+    SPEED_TEST_WARMUP,
+    SPEED_TEST_DURATION,
+    SPEED_TEST_PING_SAMPLES,
+    SPEED_TEST_TIMEOUT,
+    SPEED_TEST_RESULTS_FILE,
+    SPEED_TEST_HISTORY
+)
+from .gui_logger import gui_logger
+from .gui_tracer import trace_span
+from .settings_view_model import get_mtime
+
+CHUNK_SIZE = 64 * 1024
+UPLOAD_CHUNK = b"\0" * CHUNK_SIZE
+# Size of every download request, streams request again when a download ends before the measurement does
+DOWNLOAD_REQUEST_BYTES = 250 * 1000 * 1000
+
+class TransferCounter:
+    """Bytes transferred by all streams during the measurement window, which starts after the warm-up.
+    """
+    def __init__(self, warmup, duration):
+        self.measure_start = time.monotonic() + warmup
+        self.measure_end = self.measure_start + duration
+        self.lock = threading.Lock()
+        self.bytes = 0
+
+    def add(self, amount):
+        """Count transferred bytes.
+        Returns:
+        ----
+        - False once the measurement is over, and the stream should stop.
+        """
+        now = time.monotonic()
+        if now < self.measure_start:
+            return True
+        if now >= self.measure_end:
+            return False
+
+        with self.lock:
+            self.bytes += amount
+
+        return True
+
+    def is_done(self):
+        return time.monotonic() >= self.measure_end
+
+def download_stream(url, counter, errors):
+    with requests.Session() as session:
+        while not counter.is_done():
+            try:
+                response = session.get(url + "/__down", params={"bytes": DOWNLOAD_REQUEST_BYTES}, stream=True, timeout=SPEED_TEST_TIMEOUT)
+                try:
+                    response.raise_for_status()
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        if not counter.add(len(chunk)):
+                            break
+                finally:
+                    response.close()
+            except requests.exceptions.RequestException as e:
+                errors.append(e)
+                return
+
+def upload_stream(url, counter, errors):
+    def body():
+        # A chunk is counted once the next one is requested, i.e. once it was handed to the connection
+        while True:
+            yield UPLOAD_CHUNK
+            if not counter.add(CHUNK_SIZE):
+                return
+
+    with requests.Session() as session:
+        while not counter.is_done():
+            try:
+                session.post(url + "/__up", data=body(), timeout=SPEED_TEST_TIMEOUT).raise_for_status()
+            except requests.exceptions.RequestException as e:
+                errors.append(e)
+                return
+
+def measure_throughput(stream, url, streams, warmup, duration):
+    """Function that runs parallel streams and measures their combined throughput after the warm-up.
+    Returns:
+    ----
+    - The throughput in Mbit/s, or False if no data could be transferred.
+    """
+    counter = TransferCounter(warmup, duration)
+    errors = []
+    threads = [threading.Thread(target=stream, args=[url, counter, errors], daemon=True) for _ in range(streams)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(warmup + duration + SPEED_TEST_TIMEOUT)
+
+    if errors:
+        gui_logger.debug("[!] %s of %s %s streams failed: %s", len(errors), streams, stream.__name__, errors[0])
+
+    if not counter.bytes:
+        return False
+
+    return counter.bytes * 8 / duration / 1000000
+
+def measure_latency(url, samples):
+    """Function that measures the round trip time of small requests.
+    Returns:
+    ----
+    - A tuple with the median RTT and the jitter, in milliseconds.
+    """
+    rtts = []
+    with requests.Session() as session:
+        # The first request also opens the connection (TCP and TLS handshakes), it is not counted
+        for index in range(samples + 1):
+            start = time.monotonic()
+            session.get(url + "/__down", params={"bytes": 0}, timeout=SPEED_TEST_TIMEOUT).raise_for_status()
+            if index:
+                rtts.append((time.monotonic() - start) * 1000)
+
+    jitter = statistics.mean(abs(current - previous) for previous, current in zip(rtts, rtts[1:])) if len(rtts) > 1 else 0.0
+
+    return statistics.median(rtts), jitter
+
+def run_speed_test(url=SPEED_TEST_URL, streams=SPEED_TEST_STREAMS, warmup=SPEED_TEST_WARMUP, duration=SPEED_TEST_DURATION):
+    """Function that tests the latency, download and upload of the current connection.
+    Returns:
+    ----
+    - A dict with the timestamp, RTT and jitter (ms), download and upload (Mbit/s), or False if the test failed.
+    """
+    gui_logger.debug(">>> Running speed test against %s with %s streams.", url, streams)
+
+    try:
+        with trace_span("speed test latency", "http"):
+            rtt, jitter = measure_latency(url, SPEED_TEST_PING_SAMPLES)
+    except requests.exceptions.RequestException as e:
+        gui_logger.debug("[!] Unable to reach the speed test endpoint: %s", e)
+        return False
+
+    with trace_span("speed test download", "http", streams=streams):
+        download = measure_throughput(download_stream, url, streams, warmup, duration)
+    with trace_span("speed test upload", "http", streams=streams):
+        upload = measure_throughput(upload_stream, url, streams, warmup, duration)
+
+    if download is False or upload is False:
+        return False
+
+    result = {
+        "timestamp": int(time.time()),
+        "rtt": rtt,
+        "jitter": jitter,
+        "download": download,
+        "upload": upload,
+    }
+    gui_logger.debug(">>> Speed test result: %s", result)
+
+    return result
+
+def format_speed_test(result):
+    return "Down {0:.1f} Mbit/s, Up {1:.1f} Mbit/s, Ping {2:.0f} ms (jitter {3:.0f} ms)".format(
+        result["download"], result["upload"], result["rtt"], result["jitter"]
+    )
+
+class SpeedTestResults:
+    """Speed test results of every server, read again when the file was modified (e.g. by the tray).
+    """
+    def __init__(self, path=SPEED_TEST_RESULTS_FILE, history=SPEED_TEST_HISTORY):
+        self.path = path
+        self.history = history
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.results = None
+
+    def load(self):
+        mtime = get_mtime(self.path)
+        if self.results is not None and mtime == self.mtime:
+            return
+
+        try:
+            with open(self.path) as f:
+                self.results = json.load(f)
+        except (OSError, ValueError):
+            self.results = {}
+
+        self.mtime = mtime
+
+    def record(self, servername, result):
+        with self.lock:
+            self.load()
+            self.results[servername] = (self.results.get(servername, []) + [result])[-self.history:]
+
+            tmp_path = "{0}.tmp".format(self.path)
+            with open(tmp_path, "w") as f:
+                json.dump(self.results, f)
+            os.replace(tmp_path, self.path)
+            change_file_owner(self.path)
+
+            self.mtime = get_mtime(self.path)
+
+    def get_latest(self, servername):
+        """Function that returns the last result of a server, or False if it was never tested.
+        """
+        with self.lock:
+            self.load()
+            results = self.results.get(servername)
+
+        return results[-1] if results else False
+
+    def get_summary(self, servername):
+        """Function that summarizes the stored results of a server.
+        Returns:
+        ----
+        - A dict with the number of tests and the median RTT, jitter, download and upload, or False if it was never tested.
+        """
+        with self.lock:
+            self.load()
+            results = self.results.get(servername)
+
+        if not results:
+            return False
+
+        summary = {"tests": len(results)}
+        for key in ("rtt", "jitter", "download", "upload"):
+            summary[key] = statistics.median(result[key] for result in results)
+
+        return summary
+
+    def rank_servers(self, servers):
+        """Function that sorts servers by their median download speed, fastest first.
+        Servers that were never tested come last, in their original order.
+        """
+        with self.lock:
+            self.load()
+            medians = {
+                servername: statistics.median(result["download"] for result in results)
+                for servername, results in self.results.items() if results
+            }
+
+        return sorted(servers, key=lambda server: (0, -medians[server["Name"]]) if server["Name"] in medians else (1, 0))
+
+speed_test_results = SpeedTestResults()
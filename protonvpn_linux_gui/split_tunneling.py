@@ -0,0 +1,280 @@
+"""Parsing and aggregation of split tunneling entries.
+
+Entries are parsed with ipaddress, deduplicated, and overlapping or adjacent networks
+are collapsed into the smallest set of routes that covers them. Only IPv4 is accepted,
+as the CLI only writes IPv4 routes into the OpenVPN configuration.
+
+Domain entries are kept in a state file next to the GUI config, together with the addresses they last
+resolved to, the split tunneling file read by the CLI only contains the resulting routes.
+"""
+import os
+import re
+import json
+import time
+import fcntl
+import tempfile
+import contextlib
+import ipaddress
+import itertools
+import subprocess
+
+import requests
+
+from protonvpn_cli.utils import change_file_owner, make_ovpn_template
+
+from .constants import SPLIT_TUNNEL_CHUNK_LINES, SPLIT_TUNNEL_STATE_FILE, SPLIT_TUNNEL_STATE_LOCK_FILE
+from .gui_logger import gui_logger
+
+ENTRY_SEPARATOR = re.compile("[^;\n]+")
+DOMAIN_PATTERN = re.compile(r"^(?=.{1,253}$)((?!-)[a-z0-9-]{1,63}(?<!-)\.)+[a-z]{2,63}$", re.IGNORECASE)
+
+class SplitTunnelResult:
+    """Outcome of parsing split tunneling entries.
+    """
+    def __init__(self, networks, domains, entries, invalid):
+        self.networks = networks
+        self.domains = domains
+        self.entries = entries
+        self.invalid = invalid
+
+    @property
+    def merged(self):
+        return self.entries - len(self.networks) - len(self.domains)
+
+    @property
+    def covers_all(self):
+        """Whether the networks together collapse into 0.0.0.0/0, which would route all the traffic outside of the tunnel.
+        """
+        return any(not network.prefixlen for network in self.networks)
+
+def iter_entries(content):
+    """Generator of the stripped, non-empty entries of a text, split by ";" and/or new lines.
+    """
+    for match in ENTRY_SEPARATOR.finditer(content):
+        entry = match.group().strip()
+        if entry:
+            yield entry
+
+def parse_network(entry):
+    """Function that parses an IP or IP/CIDR entry, host bits are ignored (e.g. 10.0.0.1/8 is 10.0.0.0/8).
+    Returns False if the entry is not a valid IPv4 address or network. Like the CLI, a /0 is not accepted,
+    it would route all the traffic outside of the tunnel.
+    """
+    try:
+        network = ipaddress.IPv4Network(entry, strict=False)
+    except ValueError:
+        return False
+
+    if not network.prefixlen:
+        return False
+
+    return network
+
+def parse_domain(entry):
+    """Function that normalizes a domain entry, or returns False if it is not a valid hostname.
+    """
+    domain = entry.rstrip(".").lower()
+    if not DOMAIN_PATTERN.match(domain):
+        return False
+
+    return domain
+
+def parse_entries(entries):
+    """Function that parses and aggregates split tunneling entries, IPs/CIDRs and domains.
+    Parsing stops at the first invalid entry.
+    Returns:
+    ----
+    - A SplitTunnelResult, with networks sorted and collapsed, and domains sorted.
+    """
+    networks = set()
+    domains = set()
+    count = 0
+    for entry in entries:
+        network = parse_network(entry)
+        if network:
+            networks.add(network)
+        else:
+            domain = parse_domain(entry)
+            if not domain:
+                return SplitTunnelResult([], [], count, entry)
+            domains.add(domain)
+
+        count += 1
+
+    return SplitTunnelResult(list(ipaddress.collapse_addresses(networks)), sorted(domains), count, False)
+
+def build_routes(networks, domains):
+    """Function that collapses the static networks and the addresses of the resolved domains into routes.
+    Domains are given as a dict of domain: {"addresses": [...], ...}, as stored in the state file.
+    """
+    routes = set(networks)
+    for entry in domains.values():
+        routes.update(ipaddress.IPv4Network(address) for address in entry["addresses"])
+
+    return list(ipaddress.collapse_addresses(routes))
+
+def diff_routes(old_routes, new_routes):
+    """Function that compares two route lists.
+    Returns:
+    ----
+    - A tuple with the added and removed routes.
+    """
+    old_routes = set(old_routes)
+    new_routes = set(new_routes)
+    return sorted(new_routes - old_routes), sorted(old_routes - new_routes)
+
+def load_state(path=SPLIT_TUNNEL_STATE_FILE):
+    """Function that loads the static networks and domains saved from the settings.
+    Returns:
+    ----
+    - A tuple of (networks, domains), or False if there is no state file.
+    """
+    try:
+        with open(path) as f:
+            state = json.load(f)
+        return [ipaddress.IPv4Network(network) for network in state["networks"]], state["domains"]
+    except (OSError, ValueError, KeyError):
+        return False
+
+def save_state(networks, domains, path=SPLIT_TUNNEL_STATE_FILE):
+    """Function that atomically saves the static networks and domains.
+    """
+    write_atomic(path, json.dumps({"networks": [network.with_prefixlen for network in networks], "domains": domains}))
+    change_file_owner(path)
+
+def open_lock_file(path):
+    """Function that opens a lock file, owned by the user so that both the GUI and the tray can open it.
+    """
+    created = not os.path.isfile(path)
+    lock_file = open(path, "a")
+    if created:
+        change_file_owner(path)
+
+    return lock_file
+
+@contextlib.contextmanager
+def state_lock(path=SPLIT_TUNNEL_STATE_LOCK_FILE):
+    """Context manager that holds an exclusive lock on the state, shared between the GUI and the tray processes.
+    """
+    with open_lock_file(path) as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def write_atomic(path, content):
+    """Function that atomically writes a file: the content is written to a temporary file of this process
+    in the same directory, which then replaces the file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".{0}.".format(os.path.basename(path)))
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def remove_state(path=SPLIT_TUNNEL_STATE_FILE):
+    if os.path.isfile(path):
+        os.remove(path)
+
+def domain_entry(addresses, ttl, previous=None):
+    """Function that creates the state entry of a domain, from the addresses it resolved to and their TTL.
+    If the domain could not be resolved (addresses is None), the previous addresses are kept.
+    """
+    if addresses is None:
+        addresses = previous["addresses"] if previous else []
+
+    return {"addresses": sorted(addresses), "expires": time.time() + ttl}
+
+def get_default_gateway():
+    """Function that returns the (gateway, device) of the default IPv4 route, which is the route OpenVPN
+    calls net_gateway, or False if there is none.
+    """
+    resp = subprocess.run(["ip", "-4", "route", "show", "default"], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
+    fields = resp.stdout.decode().split("\n")[0].split()
+
+    if "via" not in fields or "dev" not in fields:
+        return False
+
+    return fields[fields.index("via") + 1], fields[fields.index("dev") + 1]
+
+def apply_route_changes(added, removed):
+    """Function that applies changed split tunneling routes to an active connection, outside of the tunnel.
+    """
+    default_gateway = get_default_gateway()
+    if not default_gateway:
+        gui_logger.debug("[!] No default gateway found, split tunneling routes were not applied.")
+        return False
+
+    gateway, device = default_gateway
+    commands = [["ip", "route", "del", network.with_prefixlen] for network in removed]
+    commands += [["ip", "route", "replace", network.with_prefixlen, "via", gateway, "dev", device] for network in added]
+
+    for command in commands:
+        resp = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
+        if resp.returncode != 0:
+            gui_logger.debug("[!] Unable to run %s: %s", command, resp.stderr.decode().strip())
+
+    gui_logger.debug(">>> Applied split tunneling routes, %s added, %s removed.", len(added), len(removed))
+    return True
+
+def format_network(network):
+    """Function that formats a network the way the CLI expects it, single hosts without the /32.
+    """
+    if network.prefixlen == network.max_prefixlen:
+        return str(network.network_address)
+
+    return network.with_prefixlen
+
+def write_networks(path, networks):
+    """Function that atomically writes networks to the split tunneling file, one per line.
+    """
+    write_atomic(path, "".join("{0}\n".format(format_network(network)) for network in networks))
+
+def update_ovpn_template():
+    """Function that regenerates the OpenVPN template, the CLI only reads the split tunneling file into it
+    when it is generated, every connection is made from the template.
+    Returns False if the template could not be downloaded.
+    """
+    try:
+        make_ovpn_template()
+    except (SystemExit, OSError, ValueError, KeyError, requests.exceptions.RequestException) as e:
+        # call_api exits when the API can't be reached
+        gui_logger.debug("[!] Unable to update the OpenVPN template: %s", e)
+        return False
+
+    gui_logger.debug(">>> OpenVPN template updated with the split tunneling routes.")
+    return True
+
+def iter_chunks(lines, chunk_lines=SPLIT_TUNNEL_CHUNK_LINES):
+    """Generator of text chunks of chunk_lines lines each, skipping empty lines.
+    """
+    lines = (line if line.endswith("\n") else line + "\n" for line in lines if line.strip())
+    while True:
+        chunk = "".join(itertools.islice(lines, chunk_lines))
+        if not chunk:
+            return
+        yield chunk
+
+def iter_file_chunks(path, chunk_lines=SPLIT_TUNNEL_CHUNK_LINES):
+    """Generator of the split tunneling file content in chunks of chunk_lines lines.
+    """
+    with open(path) as f:
+        yield from iter_chunks(f, chunk_lines)
+
+def iter_saved_entries(split_tunnel_file, chunk_lines=SPLIT_TUNNEL_CHUNK_LINES):
+    """Generator of the entries saved from the settings, as shown in the TextView: the static networks and the domains.
+    Falls back to the split tunneling file if it was not saved by the GUI.
+    """
+    state = load_state()
+    if not state:
+        yield from iter_file_chunks(split_tunnel_file, chunk_lines)
+        return
+
+    networks, domains = state
+    yield from iter_chunks(itertools.chain((format_network(network) for network in networks), sorted(domains)), chunk_lines)
@@ -0,0 +1,180 @@
+import os
+import time
+import tempfile
+import subprocess
+
+from .gui_logger import gui_logger
+from .gui_tracer import trace_span
+
+# PyGObject import
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gio, GLib
+
+SYSTEMD_BUS_NAME = "org.freedesktop.systemd1"
+SYSTEMD_OBJECT_PATH = "/org/freedesktop/systemd1"
+SYSTEMD_MANAGER_INTERFACE = "org.freedesktop.systemd1.Manager"
+DBUS_TIMEOUT_MS = 10000
+
+class SystemdResult:
+    """Outcome of a group of systemd operations, with the duration and error of every step.
+    """
+    def __init__(self, action):
+        self.action = action
+        self.steps = []
+
+    @property
+    def success(self):
+        return all(error is None for step, duration, error in self.steps)
+
+    def run_step(self, step, func, *args):
+        """Run func(*args) as a named step, storing its duration and error (if any).
+        Returns the function result, or None if the step failed.
+        """
+        start = time.monotonic()
+        error = None
+        result = None
+        try:
+            with trace_span(step, "systemd"):
+                result = func(*args)
+        except (GLib.Error, OSError, subprocess.SubprocessError) as e:
+            error = str(e)
+
+        duration = time.monotonic() - start
+        self.steps.append((step, duration, error))
+        gui_logger.debug(
+            ">>> systemd %s: %s took %.1fms%s",
+            self.action, step, duration * 1000, "" if error is None else " [!] {0}".format(error)
+        )
+        return result
+
+def get_system_bus():
+    """Function that returns the system D-Bus connection, or False if it is not available.
+    """
+    try:
+        return Gio.bus_get_sync(Gio.BusType.SYSTEM, None)
+    except GLib.Error as e:
+        gui_logger.debug("[!] Unable to connect to the system bus: %s", e)
+        return False
+
+def call_manager(bus, method, parameters=None, reply_type=None):
+    """Function that calls a method of the systemd manager over D-Bus.
+    """
+    return bus.call_sync(
+        SYSTEMD_BUS_NAME,
+        SYSTEMD_OBJECT_PATH,
+        SYSTEMD_MANAGER_INTERFACE,
+        method,
+        parameters,
+        GLib.VariantType.new(reply_type) if reply_type else None,
+        Gio.DBusCallFlags.NONE,
+        DBUS_TIMEOUT_MS,
+        None
+    )
+
+def write_unit_file(path, content):
+    """Function that atomically writes a unit file: the content is written and fsynced to a temporary file
+    in the same directory, which then replaces the unit file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".{0}.".format(os.path.basename(path)))
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def remove_unit_file(path):
+    if os.path.isfile(path):
+        os.remove(path)
+
+def unit_exists(bus, unit_name):
+    """Function that checks if systemd knows about a unit file.
+    """
+    try:
+        call_manager(bus, "GetUnitFileState", GLib.Variant("(s)", (unit_name,)), "(s)")
+    except GLib.Error:
+        return False
+
+    return True
+
+def enable_unit(unit_name, unit_path, content):
+    """Function that installs, reloads and enables a unit.
+    Returns:
+    ----
+    - A SystemdResult.
+    """
+    result = SystemdResult("enable")
+    bus = get_system_bus()
+
+    if not bus or not os.access(os.path.dirname(unit_path), os.W_OK):
+        return batched_privileged_call(result, enable_script(unit_name, unit_path), content)
+
+    result.run_step("write unit file", write_unit_file, unit_path, content)
+    if not result.success:
+        return result
+
+    result.run_step("daemon-reload", call_manager, bus, "Reload")
+    result.run_step(
+        "enable",
+        call_manager, bus, "EnableUnitFiles", GLib.Variant("(asbb)", ([unit_name], False, True)), "(ba(sss))"
+    )
+
+    return result
+
+def disable_unit(unit_name, unit_path):
+    """Function that stops, disables and removes a unit.
+    Returns:
+    ----
+    - A SystemdResult.
+    """
+    result = SystemdResult("disable")
+    bus = get_system_bus()
+
+    if not bus or not os.access(os.path.dirname(unit_path), os.W_OK):
+        return batched_privileged_call(result, disable_script(unit_name, unit_path))
+
+    if not unit_exists(bus, unit_name) and not os.path.isfile(unit_path):
+        return result
+
+    result.run_step("stop", call_manager, bus, "StopUnit", GLib.Variant("(ss)", (unit_name, "replace")), "(o)")
+    result.run_step(
+        "disable",
+        call_manager, bus, "DisableUnitFiles", GLib.Variant("(asb)", ([unit_name], False)), "(a(sss))"
+    )
+    result.run_step("remove unit file", remove_unit_file, unit_path)
+    result.run_step("daemon-reload", call_manager, bus, "Reload")
+
+    return result
+
+def enable_script(unit_name, unit_path):
+    return "install -m 644 /dev/stdin '{path}' && systemctl daemon-reload && systemctl enable '{name}'".format(
+        path=unit_path, name=unit_name
+    )
+
+def disable_script(unit_name, unit_path):
+    return "systemctl stop '{name}'; systemctl disable '{name}'; rm -f '{path}'; systemctl daemon-reload".format(
+        path=unit_path, name=unit_name
+    )
+
+def batched_privileged_call(result, script, stdin_content=None):
+    """Fallback for when systemd can not be reached over D-Bus (or the unit directory is not writable),
+    which runs all steps in a single privileged shell call.
+    """
+    def run_script():
+        resp = subprocess.run(
+            ["sudo", "sh", "-c", script],
+            input=stdin_content.encode() if stdin_content else None,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        ) # nosec
+        if resp.returncode != 0:
+            raise subprocess.SubprocessError(resp.stderr.decode().strip())
+
+    result.run_step("batched privileged call", run_script)
+    return result
@@ -1,4 +1,3 @@
-import re
 import os
 import sys
 import time
@@ -8,12 +7,11 @@ import concurrent.futures
 import configparser
 
 from protonvpn_cli.constants import USER, CONFIG_FILE, CONFIG_DIR, PASSFILE, SPLIT_TUNNEL_FILE #noqa
-from protonvpn_cli.utils import get_config_value, is_valid_ip, set_config_value, change_file_owner, pull_server_data, make_ovpn_template #noqa
-from protonvpn_cli.country_codes import country_codes #noqa
+from protonvpn_cli.utils import get_config_value, set_config_value, change_file_owner, make_ovpn_template #noqa
 
 # Custom helper functions
 from .utils import (
-    update_labels_status,
+    refresh_labels_status,
     populate_server_list,
     prepare_initilizer,
     load_on_start,
@@ -23,11 +21,26 @@ from .utils import (
     populate_autoconnect_list,
     get_server_protocol_from_cli,
     get_gui_config,
-    set_gui_config
+    set_gui_config,
+    stream_split_tunnel_file,
+    render_snapshot,
+    set_stale_indicator,
+    pull_server_data
 )
 
+from .split_tunneling import iter_entries, parse_entries, remove_state, update_ovpn_template
+from .domain_resolver import domain_refresh_scheduler
+from .server_catalog import get_country_code
+from .snapshot import load_snapshot
+from .settings_view_model import settings_view_model
+
 # Import GUI logger
 from .gui_logger import gui_logger
+from .gui_tracer import trace_span, traced, traced_callback
+from .ui_dispatcher import ui_dispatcher
+from .metrics import record_command
+from .config_transaction import config_transaction
+from .speed_test import run_speed_test, speed_test_results, format_speed_test
 
 # Import constants
 from .constants import (
@@ -38,7 +51,8 @@ from .constants import (
     TRAY_CFG_DATA_TX, 
     TRAY_CFG_TIME_CONN, 
     TRAY_CFG_DICT, 
-    GUI_CONFIG_FILE
+    GUI_CONFIG_FILE,
+    CLI_COMMAND
 )
 
 # PyGObject import
@@ -47,12 +61,21 @@ gi.require_version('Gtk', '3.0')
 from gi.repository import GObject as gobject
 
 # Load on start
+@traced("worker")
 def load_content_on_start(objects):
     """Calls load_on_start, which returns False if there is no internet connection, otherwise populates dashboard labels and server list
     """
     gui_logger.debug(">>> Running \"load_on_start\".")
 
-    time.sleep(2)
+    # Render the last known servers right away, they are reconciled once fresh data arrives
+    snapshot = load_snapshot()
+    if snapshot:
+        render_snapshot(objects["interface"], snapshot)
+        ui_dispatcher.post(objects["messagedialog_window"], "hide")
+
+    # Keep the settings warm, so that the Settings window opens without parsing the config files
+    settings_view_model.get_settings()
+
     with concurrent.futures.ThreadPoolExecutor() as executor:
         
         params_dict = {
@@ -60,19 +83,29 @@ def load_content_on_start(objects):
             "messagedialog_label": objects["messagedialog_label"]
         }
 
-        objects["messagedialog_spinner"].hide()
+        ui_dispatcher.post(objects["messagedialog_spinner"], "hide")
 
         future = executor.submit(load_on_start, params_dict)
         return_value = future.result()
         
         if return_value:
-            objects["messagedialog_window"].hide()
+            ui_dispatcher.post(objects["messagedialog_window"], "hide")
+        elif snapshot:
+            set_stale_indicator(objects["interface"], snapshot, "Offline, showing servers from {age} ago.")
+            # The IP information could not be fetched, the labels would otherwise keep showing "Loading..."
+            refresh_labels_status({
+                "interface": objects["interface"],
+                "servers": snapshot["servers"],
+                "disconnecting": False,
+                "conn_info": ("Offline", "Offline", "")
+            })
         else:
-            objects["messagedialog_label"].set_markup("Could not load necessary resources, there might be connectivity issues.")
+            ui_dispatcher.post(objects["messagedialog_label"], "set_markup", "Could not load necessary resources, there might be connectivity issues.")
 
     gui_logger.debug(">>> Ended tasks in \"load_on_start\" thread.")    
 
 # Login handler
+@traced("worker")
 def on_login(interface, username_field, password_field, messagedialog_label, user_window, login_window, messagedialog_window):
     """Function that initializes a user profile.
     """     
@@ -84,51 +117,42 @@ def on_login(interface, username_field, password_field, messagedialog_label, use
     }
 
     user_data = prepare_initilizer(username_field, password_field, interface)
-    
-    config = configparser.ConfigParser()
-    config["USER"] = {
-        "username": "None",
-        "tier": "None",
-        "default_protocol": "None",
-        "initialized": "0",
-        "dns_leak_protection": "1",
-        "custom_dns": "None",
-        "check_update_interval": "3",
-        "killswitch": "0",
-        "split_tunnel": "0",
-        "autoconnect": "0"
-    }
-    config["metadata"] = {
-        "last_api_pull": "0",
-        "last_update_check": str(int(time.time())),
-    }
-    with open(CONFIG_FILE, "w") as f:
-        config.write(f)
-    change_file_owner(CONFIG_FILE)
-    gui_logger.debug("pvpn-cli.cfg initialized")
-
-    change_file_owner(CONFIG_DIR)
 
     ovpn_username = user_data['username']
     ovpn_password = user_data['password']
     user_tier = user_data['protonvpn_plan']
     user_protocol = user_data['openvpn_protocol']
 
-    pull_server_data(force=True)
-    make_ovpn_template()
-
     if user_tier == 4:
         user_tier = 3
     user_tier -= 1
 
-    set_config_value("USER", "username", ovpn_username)
-    set_config_value("USER", "tier", user_tier)
-    set_config_value("USER", "default_protocol", user_protocol)
-    set_config_value("USER", "dns_leak_protection", 1)
-    set_config_value("USER", "custom_dns", None)
-    set_config_value("USER", "killswitch", 0)
-    set_config_value("USER", "split_tunnel", 0)
-    set_config_value("USER", "autoconnect", "0")
+    # The profile is written at once, it is only marked as initialized after the passfile and the GUI config exist
+    with config_transaction(CONFIG_FILE, replace=True) as config:
+        config.set_group("USER", {
+            "username": ovpn_username,
+            "tier": user_tier,
+            "default_protocol": user_protocol,
+            "initialized": "0",
+            "dns_leak_protection": "1",
+            "custom_dns": "None",
+            "check_update_interval": "3",
+            "killswitch": "0",
+            "split_tunnel": "0",
+            "autoconnect": "0"
+        })
+        config.set_group("metadata", {
+            "last_api_pull": "0",
+            "last_update_check": str(int(time.time())),
+        })
+    change_file_owner(CONFIG_FILE)
+    gui_logger.debug("pvpn-cli.cfg initialized")
+
+    change_file_owner(CONFIG_DIR)
+
+    with trace_span("pull_server_data", "http"):
+        pull_server_data(force=True)
+    make_ovpn_template()
 
     with open(PASSFILE, "w") as f:
         f.write("{0}\n{1}".format(ovpn_username, ovpn_password))
@@ -138,7 +162,8 @@ def on_login(interface, username_field, password_field, messagedialog_label, use
     if not initialize_gui_config():
         sys.exit(1)
 
-    set_config_value("USER", "initialized", 1)
+    with config_transaction(CONFIG_FILE) as config:
+        config.set("USER", "initialized", 1)
 
     load_on_start({"interface":interface, "gui_enabled": True, "messagedialog_label": messagedialog_label})
 
@@ -169,35 +194,13 @@ def initialize_gui_config():
     change_file_owner(GUI_CONFIG_FILE)
 
     if not os.path.isfile(GUI_CONFIG_FILE):
-        gui_logger.debug("Unablt to initialize pvpn-gui.cfg. {}".format(Exception))
+        gui_logger.debug("Unablt to initialize pvpn-gui.cfg. %s", Exception)
         return False
     
     return True
 
-def reload_secure_core_servers(interface, messagedialog_label, messagedialog_spinner, update_to):
-    """Function that reloads server list to either secure-core or non-secure-core.
-    """  
-    # Sleep is needed because it takes a second to update the information,
-    # which makes the button "lag". Temporary solution.
-    time.sleep(1)
-    gui_logger.debug(">>> Running \"update_reload_secure_core_serverslabels_server_list\".")
-
-    set_gui_config("connections", "display_secure_core", update_to)
-    
-    # update_labels_server_list(interface)
-    populate_servers_dict = {
-        "tree_object": interface.get_object("ServerTreeStore"),
-        "servers": False
-    }
-
-    gobject.idle_add(populate_server_list, populate_servers_dict)
-
-    messagedialog_label.set_markup("Displaying <b>{}</b> servers!".format("secure-core" if update_to == "True" else "non secure-core"))
-    messagedialog_spinner.hide()
-
-    gui_logger.debug(">>> Ended tasks in \"reload_secure_core_servers\" thread.")
-
 # Dashboard hanlder
+@traced("worker")
 def connect_to_selected_server(*args):
     """Function that either connects by selected server or selected country.
     """     
@@ -207,15 +210,18 @@ def connect_to_selected_server(*args):
         
     # Check if it should connect to country or server
     if "#" in args[0]["user_selected_server"]:
-        result = subprocess.run(["protonvpn", "connect", args[0]["user_selected_server"], "-p", protocol], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
-        gui_logger.debug(">>> Log during connection to specific server: {}".format(result))
+        start = time.monotonic()
+        with trace_span("protonvpn connect", "subprocess"):
+            result = subprocess.run([CLI_COMMAND, "connect", args[0]["user_selected_server"], "-p", protocol], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
+        record_command("connect", result, start)
+        gui_logger.debug(">>> Log during connection to specific server: %s", result)
     else:
-        for k, v in country_codes.items():
-            if v == args[0]["user_selected_server"]:
-                selected_country = k
-                break
-        result = subprocess.run(["protonvpn", "connect", "--cc", selected_country, "-p", protocol], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
-        gui_logger.debug(">>> Log during connection to country: {}".format(result))
+        selected_country = get_country_code(args[0]["user_selected_server"])
+        start = time.monotonic()
+        with trace_span("protonvpn connect", "subprocess"):
+            result = subprocess.run([CLI_COMMAND, "connect", "--cc", selected_country, "-p", protocol], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
+        record_command("connect", result, start)
+        gui_logger.debug(">>> Log during connection to country: %s", result)
 
     server_protocol = get_server_protocol_from_cli(result)
 
@@ -224,8 +230,8 @@ def connect_to_selected_server(*args):
     if server_protocol:
         display_message = "You are connected to <b>{}</b> via <b>{}</b>!".format(server_protocol, protocol.upper())
 
-    args[0]["messagedialog_label"].set_markup(display_message)
-    args[0]["messagedialog_spinner"].hide()
+    ui_dispatcher.post(args[0]["messagedialog_label"], "set_markup", display_message)
+    ui_dispatcher.post(args[0]["messagedialog_spinner"], "hide")
 
     update_labels_dict = {
         "interface": args[0]["interface"],
@@ -234,10 +240,11 @@ def connect_to_selected_server(*args):
         "conn_info": False
     }
 
-    update_labels_status(update_labels_dict)
+    refresh_labels_status(update_labels_dict)
 
     gui_logger.debug(">>> Ended tasks in \"openvpn_connect\" thread.")
     
+@traced("worker")
 def custom_quick_connect(*args):
     """Make a custom quick connection 
     """
@@ -262,11 +269,14 @@ def custom_quick_connect(*args):
         command="--cc"
         country=quick_conn_pref.upper()
     
-    command_list = ["protonvpn", "connect", command, "-p" ,protocol]
+    command_list = [CLI_COMMAND, "connect", command, "-p" ,protocol]
     if country:
-        command_list = ["protonvpn", "connect", command, country, "-p" ,protocol]
+        command_list = [CLI_COMMAND, "connect", command, country, "-p" ,protocol]
     
-    result = subprocess.run(command_list, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    start = time.monotonic()
+    with trace_span("protonvpn connect", "subprocess"):
+        result = subprocess.run(command_list, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    record_command("connect", result, start)
 
     update_labels_dict = {
         "interface": args[0]["interface"],
@@ -282,15 +292,16 @@ def custom_quick_connect(*args):
     if server_protocol:
         display_message = "You are connected to <b>{}</b> via <b>{}</b>!".format(server_protocol, protocol.upper())
 
-    args[0]["messagedialog_label"].set_markup(display_message)
-    args[0]["messagedialog_spinner"].hide()
+    ui_dispatcher.post(args[0]["messagedialog_label"], "set_markup", display_message)
+    ui_dispatcher.post(args[0]["messagedialog_spinner"], "hide")
 
-    gui_logger.debug(">>> Result: \"{0}\"".format(result))
+    gui_logger.debug(">>> Result: \"%s\"", result)
     
-    update_labels_status(update_labels_dict)
+    refresh_labels_status(update_labels_dict)
 
     gui_logger.debug(">>> Ended tasks in \"custom_quick_connect\" thread.")
 
+@traced("worker")
 def quick_connect(*args):
     """Function that connects to the quickest server.
     """
@@ -299,7 +310,10 @@ def quick_connect(*args):
 
     gui_logger.debug(">>> Running \"fastest\".")
 
-    result = subprocess.run(["protonvpn", "connect", "--fastest", "-p", protocol], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
+    start = time.monotonic()
+    with trace_span("protonvpn connect", "subprocess"):
+        result = subprocess.run([CLI_COMMAND, "connect", "--fastest", "-p", protocol], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
+    record_command("connect", result, start)
 
     update_labels_dict = {
         "interface": args[0]["interface"],
@@ -314,21 +328,25 @@ def quick_connect(*args):
     if server_protocol:
         display_message = "You are connected to <b>{}</b> via <b>{}</b>!".format(server_protocol, protocol.upper())
 
-    args[0]["messagedialog_label"].set_markup(display_message)
-    args[0]["messagedialog_spinner"].hide()
+    ui_dispatcher.post(args[0]["messagedialog_label"], "set_markup", display_message)
+    ui_dispatcher.post(args[0]["messagedialog_spinner"], "hide")
 
-    gui_logger.debug(">>> Result: \"{0}\"".format(result))
+    gui_logger.debug(">>> Result: \"%s\"", result)
     
-    update_labels_status(update_labels_dict)
+    refresh_labels_status(update_labels_dict)
 
     gui_logger.debug(">>> Ended tasks in \"fastest\" thread.")
 
+@traced("worker")
 def last_connect(interface, messagedialog_label, messagedialog_spinner):
     """Function that connects to the last connected server.
     """        
     gui_logger.debug(">>> Running \"reconnect\".")
 
-    result = subprocess.run(["protonvpn", "reconnect"], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
+    start = time.monotonic()
+    with trace_span("protonvpn reconnect", "subprocess"):
+        result = subprocess.run([CLI_COMMAND, "reconnect"], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
+    record_command("reconnect", result, start)
 
     update_labels_dict = {
         "interface": interface,
@@ -344,15 +362,16 @@ def last_connect(interface, messagedialog_label, messagedialog_spinner):
     if server_protocol:
         display_message = "You are connected to <b>{}</b> via <b>{}</b>!".format(server_protocol[0], server_protocol[1].upper())
 
-    messagedialog_label.set_markup(display_message)
-    messagedialog_spinner.hide()
+    ui_dispatcher.post(messagedialog_label, "set_markup", display_message)
+    ui_dispatcher.post(messagedialog_spinner, "hide")
 
-    gui_logger.debug(">>> Result: \"{0}\"".format(result))
+    gui_logger.debug(">>> Result: \"%s\"", result)
 
-    update_labels_status(update_labels_dict)
+    refresh_labels_status(update_labels_dict)
 
     gui_logger.debug(">>> Ended tasks in \"reconnect\" thread.")
 
+@traced("worker")
 def random_connect(interface, messagedialog_label, messagedialog_spinner):
     """Function that connects to a random server.
     """
@@ -367,7 +386,10 @@ def random_connect(interface, messagedialog_label, messagedialog_spinner):
         "conn_info": False
     }
 
-    result = subprocess.run(["protonvpn", "connect", "--random", "-p", protocol], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
+    start = time.monotonic()
+    with trace_span("protonvpn connect", "subprocess"):
+        result = subprocess.run([CLI_COMMAND, "connect", "--random", "-p", protocol], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
+    record_command("connect", result, start)
     
     server_protocol = get_server_protocol_from_cli(result, return_protocol=True)
 
@@ -376,15 +398,16 @@ def random_connect(interface, messagedialog_label, messagedialog_spinner):
     if server_protocol:
         display_message = "You are connected to <b>{}</b> via <b>{}</b>!".format(server_protocol[0], server_protocol[1].upper())
 
-    messagedialog_label.set_markup(display_message)
-    messagedialog_spinner.hide()
+    ui_dispatcher.post(messagedialog_label, "set_markup", display_message)
+    ui_dispatcher.post(messagedialog_spinner, "hide")
 
-    gui_logger.debug(">>> Result: \"{0}\"".format(result))
+    gui_logger.debug(">>> Result: \"%s\"", result)
 
-    update_labels_status(update_labels_dict)
+    refresh_labels_status(update_labels_dict)
 
     gui_logger.debug(">>> Ended tasks in \"random_c\" thread.")
 
+@traced("worker")
 def disconnect(*args):
     """Function that disconnects from the VPN.
     """
@@ -397,18 +420,43 @@ def disconnect(*args):
 
     gui_logger.debug(">>> Running \"disconnect\".")
 
-    result = subprocess.run(["protonvpn", "disconnect"], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
+    start = time.monotonic()
+    with trace_span("protonvpn disconnect", "subprocess"):
+        result = subprocess.run([CLI_COMMAND, "disconnect"], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
+    record_command("disconnect", result, start)
     
-    args[0]["messagedialog_label"].set_markup(result.stdout.decode())
-    args[0]["messagedialog_spinner"].hide()
+    ui_dispatcher.post(args[0]["messagedialog_label"], "set_markup", result.stdout.decode())
+    ui_dispatcher.post(args[0]["messagedialog_spinner"], "hide")
 
-    gui_logger.debug(">>> Result: \"{0}\"".format(result))
+    gui_logger.debug(">>> Result: \"%s\"", result)
 
-    update_labels_status(update_labels_dict)
+    refresh_labels_status(update_labels_dict)
 
     gui_logger.debug(">>> Ended tasks in \"disconnect\" thread.")
 
+@traced("worker")
+def speed_test(interface, messagedialog_label, messagedialog_spinner, servername):
+    """Function that tests the speed of the current connection, and stores the result for the connected server.
+    """
+    gui_logger.debug(">>> Running \"speed_test\".")
+
+    result = run_speed_test()
+
+    if not result:
+        ui_dispatcher.post(messagedialog_label, "set_markup", "Unable to test the connection speed, the speed test server could not be reached.")
+        ui_dispatcher.post(messagedialog_spinner, "hide")
+        return
+
+    speed_test_results.record(servername, result)
+
+    ui_dispatcher.post(messagedialog_label, "set_markup", "Speed of <b>{0}</b>:\n\n{1}".format(servername, format_speed_test(result)))
+    ui_dispatcher.post(messagedialog_spinner, "hide")
+    ui_dispatcher.post(interface.get_object("speed_test_label"), "set_markup", format_speed_test(result))
+
+    gui_logger.debug(">>> Ended tasks in \"speed_test\" thread.")
+
 # Preferences/Configuration menu HANDLERS
+@traced("worker")
 def update_user_pass(interface, messagedialog_label, messagedialog_spinner):
     """Function that updates username and password.
     """
@@ -419,8 +467,8 @@ def update_user_pass(interface, messagedialog_label, messagedialog_spinner):
     password_text = password_field.get_text().strip()
 
     if len(username_text) == 0 or len(password_text) == 0:
-        messagedialog_label.set_markup("Both fields need to be filled!")
-        messagedialog_spinner.hide()
+        ui_dispatcher.post(messagedialog_label, "set_markup", "Both fields need to be filled!")
+        ui_dispatcher.post(messagedialog_spinner, "hide")
         return
 
     gui_logger.debug(">>> Running \"set_username_password\".")
@@ -432,14 +480,15 @@ def update_user_pass(interface, messagedialog_label, messagedialog_spinner):
         gui_logger.debug("Passfile updated")
         os.chmod(PASSFILE, 0o600)
 
-        messagedialog_label.set_markup("Username and password updated!")
-        password_field.set_text("")
-        messagedialog_spinner.hide()
-        messagedialog_label.set_markup("Username and password updated.")
+        ui_dispatcher.post(messagedialog_label, "set_markup", "Username and password updated!")
+        ui_dispatcher.post(password_field, "set_text", "")
+        ui_dispatcher.post(messagedialog_spinner, "hide")
+        ui_dispatcher.post(messagedialog_label, "set_markup", "Username and password updated.")
 
     gui_logger.debug(">>> Ended tasks in \"set_username_password\" thread.")
 
 
+@traced("worker")
 def update_dns(dns_value):
     """Function that updates DNS settings.
     """
@@ -447,10 +496,11 @@ def update_dns(dns_value):
     set_config_value("USER", "dns_leak_protection", dns_value)
     # set_config_value("USER", "custom_dns", custom_dns)
 
-    gui_logger.debug(">>> Result: \"{0}\"".format("DNS Management updated."))
+    gui_logger.debug(">>> Result: \"%s\"", "DNS Management updated.")
 
     gui_logger.debug(">>> Ended tasks in \"dns_leak_switch_clicked\" thread.")
 
+@traced("worker")
 def update_pvpn_plan(interface, messagedialog_label, messagedialog_spinner, tier, tier_display):
     """Function that updates ProtonVPN plan.
     """
@@ -469,22 +519,23 @@ def update_pvpn_plan(interface, messagedialog_label, messagedialog_spinner, tier
 
     set_config_value("USER", "tier", str(protonvpn_plan))
 
-    messagedialog_label.set_markup("ProtonVPN Plan has been updated to <b>{}</b>!\nServers list will be refreshed.".format(tier_display))
-    messagedialog_spinner.hide()
+    ui_dispatcher.post(messagedialog_label, "set_markup", "ProtonVPN Plan has been updated to <b>{}</b>!\nServers list will be refreshed.".format(tier_display))
+    ui_dispatcher.post(messagedialog_spinner, "hide")
 
-    gui_logger.debug(">>> Result: \"{0}\"".format("ProtonVPN Plan has been updated!"))
+    gui_logger.debug(">>> Result: \"%s\"", "ProtonVPN Plan has been updated!")
 
     time.sleep(1.5)
 
     populate_servers_dict = {
-        "tree_object": interface.get_object("ServerTreeStore"),
+        "interface": interface,
         "servers": False
     }
 
-    gobject.idle_add(populate_server_list, populate_servers_dict)
+    gobject.idle_add(traced_callback(populate_server_list), populate_servers_dict)
 
     gui_logger.debug(">>> Ended tasks in \"set_protonvpn_tier\" thread.")   
 
+@traced("worker")
 def update_def_protocol(openvpn_protocol):
     """Function that updates default protocol.
     """
@@ -494,6 +545,7 @@ def update_def_protocol(openvpn_protocol):
 
     gui_logger.debug(">>> Ended tasks in \"set_default_protocol\" thread.")   
 
+@traced("worker")
 def update_connect_preference(interface, messagedialog_label, messagedialog_spinner, user_choice, display_choice, quick_connect=False):
     """Function that updates autoconnect. 
     """
@@ -503,10 +555,9 @@ def update_connect_preference(interface, messagedialog_label, messagedialog_spin
 
     # autoconnect_alternatives = ["dis", "fast", "rand", "p2p", "sc", "tor"]
     if not quick_connect:
-        manage_autoconnect(mode="disable")
-
+        # Enabling overwrites the existing unit, so it only needs to be disabled when autoconnect is turned off
         if active_choice == "dis":
-            pass
+            manage_autoconnect(mode="disable")
         elif active_choice == "fast":
             manage_autoconnect(mode="enable", command="connect -f")
         elif active_choice == "rand":
@@ -525,11 +576,12 @@ def update_connect_preference(interface, messagedialog_label, messagedialog_spin
     else:
         set_gui_config("conn_tab", "quick_connect", active_choice)
 
-    messagedialog_label.set_markup("{} setting updated to connect to <b>{}</b>!".format("Autoconnect" if not quick_connect else "Quick connect", display_choice))
-    messagedialog_spinner.hide()
+    ui_dispatcher.post(messagedialog_label, "set_markup", "{} setting updated to connect to <b>{}</b>!".format("Autoconnect" if not quick_connect else "Quick connect", display_choice))
+    ui_dispatcher.post(messagedialog_spinner, "hide")
 
     gui_logger.debug(">>> Ended tasks in \"update_autoconnect\" thread.") 
 
+@traced("worker")
 def update_killswitch(update_to):
     """Function that updates killswitch configurations. 
     """
@@ -538,94 +590,105 @@ def update_killswitch(update_to):
     # Update killswitch label
     result = ">>> Kill Switch configuration updated to {}".format("enabled" if update_to == "1" else "disabled")
 
-    gui_logger.debug(">>> Result: \"{0}\"".format(result))
+    gui_logger.debug(">>> Result: \"%s\"", result)
 
     gui_logger.debug(">>> Ended tasks in \"update_killswitch_switch_changed\" thread.")   
 
+@traced("worker")
 def update_split_tunneling_status(update_to):
     if update_to == "1":
         result = "Split tunneling has been <b>enabled</b>!\n"
     else:
+        remove_state()
         if os.path.isfile(SPLIT_TUNNEL_FILE):
             os.remove(SPLIT_TUNNEL_FILE)
         result = "Split tunneling has been <b>disabled</b>!\n"
 
-    if int(get_config_value("USER", "killswitch")):
-        set_config_value("USER", "killswitch", 0)
+    with config_transaction(CONFIG_FILE) as config:
+        if int(config.get("USER", "killswitch")):
+            config.set("USER", "killswitch", 0)
 
-        result = result + "Split Tunneling <b>can't</b> be used with Kill Switch, Kill Switch has been <b>disabled</b>!\n\n"
-        time.sleep(1)
+            result = result + "Split Tunneling <b>can't</b> be used with Kill Switch, Kill Switch has been <b>disabled</b>!\n\n"
 
-    set_config_value("USER", "split_tunnel", update_to)
+        config.set("USER", "split_tunnel", update_to)
 
-    gui_logger.debug(">>> Result: \"{0}\"".format(result))
+    gui_logger.debug(">>> Result: \"%s\"", result)
 
     gui_logger.debug(">>> Ended tasks in \"set_split_tunnel\" thread.") 
 
+@traced("worker")
 def update_split_tunneling(interface, messagedialog_label, messagedialog_spinner):
     """Function that updates split tunneling configurations.
     """
     result = "Split tunneling configurations <b>updated</b>!\n"
     split_tunneling_buffer = interface.get_object("split_tunneling_textview").get_buffer()
 
-    def clean_input(buffer):
-        # Get text takes a start_iter, end_iter and the buffer itself as last param
-        split_tunneling_content = buffer.get_text(buffer.get_start_iter(), buffer.get_end_iter(), buffer)
-        # Split IP/CIDR by either ";" and/or "\n"
-        split_tunneling_content = re.split('[;\n]', split_tunneling_content)
-        # Remove empty spaces
-        split_tunneling_content = [content.strip() for content in split_tunneling_content]
-        # Remove empty list elements
-        return list(filter(None, split_tunneling_content))
-
-    split_tunneling_content = clean_input(split_tunneling_buffer)
-
-    for ip in split_tunneling_content:
-        if not is_valid_ip(ip):
-            messagedialog_spinner.hide()
-            messagedialog_label.set_markup("<b>{0}</b> is not valid!\nNone of the IP's were added, please try again with a different IP.".format(ip))
-            gui_logger.debug("[!] Invalid IP \"{0}\".".format(ip))
-            return
+    # Get text takes a start_iter, end_iter and the buffer itself as last param
+    split_tunneling_content = split_tunneling_buffer.get_text(
+        split_tunneling_buffer.get_start_iter(), split_tunneling_buffer.get_end_iter(), split_tunneling_buffer
+    )
+    with trace_span("parse split tunneling entries", "worker"):
+        parsed = parse_entries(iter_entries(split_tunneling_content))
+
+    if parsed.invalid:
+        ui_dispatcher.post(messagedialog_spinner, "hide")
+        ui_dispatcher.post(messagedialog_label, "set_markup", "<b>{0}</b> is not valid!\nNone of the IP's were added, please try again with a different IP.".format(parsed.invalid))
+        gui_logger.debug("[!] Invalid IP \"%s\".", parsed.invalid)
+        return
+
+    if parsed.covers_all:
+        ui_dispatcher.post(messagedialog_spinner, "hide")
+        ui_dispatcher.post(messagedialog_label, "set_markup", "The entries together cover <b>all</b> IP's, which would exclude all traffic from the VPN!\nNone of the IP's were added, please try again with fewer IP's.")
+        gui_logger.debug("[!] Split tunneling entries cover 0.0.0.0/0.")
+        return
 
     gui_logger.debug(">>> Running \"set_split_tunnel\".")
 
-    if len(split_tunneling_content) == 0:
-        set_config_value("USER", "split_tunnel", 0)
+    if len(parsed.networks) == 0 and len(parsed.domains) == 0:
+        remove_state()
         if os.path.isfile(SPLIT_TUNNEL_FILE):
             os.remove(SPLIT_TUNNEL_FILE)
             result = "Split tunneling <b>disabled</b>!\n\n"
 
-    if int(get_config_value("USER", "killswitch")):
-        set_config_value("USER", "killswitch", 0)
+    routes, unresolved = domain_refresh_scheduler.update(parsed.networks, parsed.domains)
 
-        result = result + "Split Tunneling <b>can't</b> be used with Kill Switch.\nKill Switch has been <b>disabled</b>!\n\n"
-        time.sleep(1)
+    # Kill switch and split tunneling are updated with a single write, once the split tunneling file is known to exist
+    with config_transaction(CONFIG_FILE) as config:
+        if int(config.get("USER", "killswitch")):
+            config.set("USER", "killswitch", 0)
 
-    set_config_value("USER", "split_tunnel", 1)
+            result = result + "Split Tunneling <b>can't</b> be used with Kill Switch.\nKill Switch has been <b>disabled</b>!\n\n"
 
-    with open(SPLIT_TUNNEL_FILE, "w") as f:
-        for ip in split_tunneling_content:
-            f.write("\n{0}".format(ip))
+        config.set("USER", "split_tunnel", 1 if os.path.isfile(SPLIT_TUNNEL_FILE) else 0)
 
-    if os.path.isfile(SPLIT_TUNNEL_FILE):
-        change_file_owner(SPLIT_TUNNEL_FILE)
+    # The CLI only reads the split tunneling file when the OpenVPN template is generated
+    with trace_span("update OpenVPN template", "http"):
+        if not update_ovpn_template():
+            result = result + "<b>Unable</b> to update the OpenVPN configuration, please try again later.\n\n"
 
-        if len(split_tunneling_content) > 0:
-            result = result + "The following servers were added:\n\n{}".format([ip for ip in split_tunneling_content])
+    if os.path.isfile(SPLIT_TUNNEL_FILE):
+        if parsed.entries > 0:
+            result = result + "<b>{0}</b> route(s) saved from {1} entries ({2} domain(s), {3} duplicate or overlapping merged).".format(
+                len(routes), parsed.entries, len(parsed.domains), parsed.merged
+            )
+            if unresolved:
+                result = result + "\n\nUnable to resolve <b>{0}</b>, will retry in the background.".format(", ".join(unresolved))
+            # Show the collapsed entries, as they were saved
+            ui_dispatcher.post_call("split_tunnel_file", stream_split_tunnel_file, split_tunneling_buffer)
     else:
         # If no no config file exists,
         # split tunneling should be disabled again
         gui_logger.debug("No split tunneling file existing.")
-        set_config_value("USER", "split_tunnel", 0)
         result = "No split tunneling file was found, split tunneling will be <b>disabled</b>!\n\n"
 
-    messagedialog_label.set_markup(result)
-    messagedialog_spinner.hide()
+    ui_dispatcher.post(messagedialog_label, "set_markup", result)
+    ui_dispatcher.post(messagedialog_spinner, "hide")
 
-    gui_logger.debug(">>> Result: \"{0}\"".format(result))
+    gui_logger.debug(">>> Result: \"%s\"", result)
 
     gui_logger.debug(">>> Ended tasks in \"set_split_tunnel\" thread.")   
 
+@traced("worker")
 def tray_configurations(setting_value, setting_display):
     """Function to update what the tray should display.
     """    
@@ -644,10 +707,11 @@ def tray_configurations(setting_value, setting_display):
 
     result = "Tray {0} is <b>{1}</b>!".format(msg, "displayed" if setting_value == 1 else "hidden")
 
-    gui_logger.debug(">>> Result: \"{0}\"".format(result))
+    gui_logger.debug(">>> Result: \"%s\"", result)
 
     gui_logger.debug(">>> Ended tasks in \"tray_configurations\" thread.")   
     
+@traced("worker")
 def purge_configurations(interface, messagedialog_label, messagedialog_spinner):
     """Function to purge all current configurations.
     """
@@ -658,10 +722,10 @@ def purge_configurations(interface, messagedialog_label, messagedialog_spinner):
 
     if os.path.isdir(CONFIG_DIR):
         shutil.rmtree(CONFIG_DIR)
-        gui_logger.debug(">>> Result: \"{0}\"".format("Configurations purged."))
+        gui_logger.debug(">>> Result: \"%s\"", "Configurations purged.")
 
-    messagedialog_label.set_markup("Configurations purged!")
-    messagedialog_spinner.hide()
+    ui_dispatcher.post(messagedialog_label, "set_markup", "Configurations purged!")
+    ui_dispatcher.post(messagedialog_spinner, "hide")
 
 
     gui_logger.debug(">>> Ended tasks in \"set_split_tunnel\" thread.")   
@@ -676,7 +740,7 @@ def kill_duplicate_gui_process():
     
     process = get_gui_processes()
     if len(process) > 1:
-        gui_logger.debug("[!] Found following processes: {0}. Will attempt to end \"{1}\"".format(process, process[0]))
+        gui_logger.debug("[!] Found following processes: %s. Will attempt to end \"%s\"", process, process[0])
 
         # select first(longest living) process from list
         process_to_kill = process[0]
@@ -685,17 +749,19 @@ def kill_duplicate_gui_process():
 
         while len(get_gui_processes()) > 1:
             if time.time() - timer_start <= 10:
-                subprocess.run(["kill", process_to_kill]) # nosec
+                with trace_span("kill", "subprocess"):
+                    subprocess.run(["kill", process_to_kill]) # nosec
                 time.sleep(0.2)
             else:
-                subprocess.run(["kill", "-9", process_to_kill]) # nosec
-                gui_logger.debug("[!] Unable to pkill process \"{0}\". Will attempt a SIGKILL.".format(process[0]))
+                with trace_span("kill -9", "subprocess"):
+                    subprocess.run(["kill", "-9", process_to_kill]) # nosec
+                gui_logger.debug("[!] Unable to pkill process \"%s\". Will attempt a SIGKILL.", process[0])
                 break
 
         if len(get_gui_processes()) == 1:
             return_message['message'] = "Previous process ended, resuming actual session."        
             return_message['success'] = True
-            gui_logger.debug("[!] Process \"{0}\" was ended.".format(process[0]))
+            gui_logger.debug("[!] Process \"%s\" was ended.", process[0])
 
     elif len(process) == 1:
         return_message['message'] = "Only one process, normal startup."        
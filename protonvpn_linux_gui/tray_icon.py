@@ -1,21 +1,38 @@
 import os
 import time
 import datetime
-import subprocess
+from threading import Thread
 
 from protonvpn_cli.utils import (
     get_country_name,
     get_config_value,
     is_connected,
     get_transferred_data,
-    pull_server_data,
-    get_servers,
     get_server_value
 )
 
-from .utils import get_gui_config, set_gui_config
-from .constants import TRAY_CFG_SERVERLOAD, TRAY_CFG_SERVENAME, TRAY_CFG_DATA_TX, TRAY_CFG_TIME_CONN
+from .utils import get_gui_config, set_gui_config, pull_server_data
+from .server_records import get_servers
+from .constants import (
+    TRAY_CFG_SERVERLOAD,
+    TRAY_CFG_SERVENAME,
+    TRAY_CFG_DATA_TX,
+    TRAY_CFG_TIME_CONN,
+    TRAY_TICK_FAST,
+    TRAY_TICK_CONNECTED,
+    TRAY_TICK_IDLE,
+    TRAY_CONNECTING_TIMEOUT,
+    TRAY_ACTION_TIMEOUT,
+    GUI_CONFIG_FILE,
+    LOG_RATE_LIMIT,
+    CLI_COMMAND
+)
 from .gui_logger import gui_logger
+from .domain_resolver import domain_refresh_scheduler
+from .gui_tracer import trace_span, traced_callback
+from .main_loop_watchdog import start_watchdog
+from .process_supervisor import process_supervisor
+from .speed_test import run_speed_test, speed_test_results, format_speed_test
 
 import gi
 gi.require_version('Gtk', '3.0')
@@ -25,12 +42,29 @@ from gi.repository import AppIndicator3 as appindicator
 
 CURRDIR = os.path.dirname(os.path.abspath(__file__))
 
+# Tick and widget write counters, to measure the tray's background work
+tray_stats = {
+    "ticks": 0,
+    "writes": 0,
+    "skipped_writes": 0,
+    "interval": 0,
+    "started": time.monotonic(),
+}
+
 class ProtonVPNIndicator:
     def __init__(self):
         self.gtk = Gtk
         self.gobject = GObject
         self.display_serverload = False
         self.serverload_msg = "Load: -"
+        self.is_vpn_connected = False
+        self.connecting_until = 0
+        self.menu_open = False
+        self.tick_source = None
+        self.tick_interval = None
+        self.settings_cache = {}
+        # Last value written to every widget, so that unchanged values are not written again
+        self.rendered = {}
         self.menu = self.menu()
         self.ind = appindicator.Indicator.new(
             "ProtonVPN GUI Indicator", 
@@ -43,16 +77,20 @@ class ProtonVPNIndicator:
 
         # Get first server load
         self.update_serverload(None)
-        # Call main loop
+        # Call main loop, which schedules the following ticks
         self.main_loop(None)
-        
-        self.gobject.timeout_add_seconds(5, self.main_loop, None)
-        self.gobject.timeout_add_seconds(910, self.update_serverload, None)
 
+        self.gobject.timeout_add_seconds(910, traced_callback(self.update_serverload, "timeout"), None)
+
+        start_watchdog("TRAY")
+        # The tray outlives the GUI, so split tunneling domains keep being re-resolved once it is closed
+        domain_refresh_scheduler.start()
         self.gtk.main()
 
     def menu(self):
         self.menu = self.gtk.Menu()
+        self.menu.connect("show", self.on_menu_visibility, True)
+        self.menu.connect("hide", self.on_menu_visibility, False)
         
         self.server_load = self.gtk.MenuItem(label='')
         self.menu.append(self.server_load)
@@ -69,6 +107,10 @@ class ProtonVPNIndicator:
         self.ip = self.gtk.MenuItem(label='')
         self.menu.append(self.ip)
 
+        self.speed_result = self.gtk.MenuItem(label='')
+        self.menu.append(self.speed_result)
+        self.speed_result.hide()
+
         self.separator_0 = self.gtk.SeparatorMenuItem()
         self.menu.append(self.separator_0)
         self.separator_0.show()
@@ -83,6 +125,12 @@ class ProtonVPNIndicator:
         self.menu.append(self.disconn)
         self.disconn.show()
 
+        self.speed_test_item = self.gtk.MenuItem(label='Test speed')
+        self.speed_test_item.connect('activate', self.speed_test)
+        self.menu.append(self.speed_test_item)
+        # Only offered while connected, see display_speed_test
+        self.speed_test_item.hide()
+
         self.separator_1 = self.gtk.SeparatorMenuItem()
         self.menu.append(self.separator_1)
         self.separator_1.show()
@@ -103,16 +151,84 @@ class ProtonVPNIndicator:
 
         return self.menu
 
+    def on_menu_visibility(self, menu, is_open):
+        self.menu_open = is_open
+        if is_open:
+            # Refresh right away, the menu should not show values from the last slow tick
+            self.main_loop(None)
+
+    def get_tick_interval(self):
+        """Function that returns how often the tray should refresh in its current state.
+        """
+        if self.menu_open or time.monotonic() < self.connecting_until:
+            return TRAY_TICK_FAST
+
+        if self.is_vpn_connected:
+            return TRAY_TICK_CONNECTED
+
+        return TRAY_TICK_IDLE
+
+    def schedule_ticks(self):
+        """Function that (re)arms the refresh timer if the interval changed.
+        Returns:
+        ----
+        - True if the current timer should keep running.
+        """
+        interval = self.get_tick_interval()
+        if interval == self.tick_interval:
+            return True
+
+        if self.tick_source is not None:
+            self.gobject.source_remove(self.tick_source)
+
+        self.tick_interval = interval
+        tray_stats["interval"] = interval
+        self.tick_source = self.gobject.timeout_add_seconds(interval, traced_callback(self.main_loop, "timeout"), None)
+        gui_logger.debug("TRAY >>> Refreshing every %ss.", interval)
+
+        return False
+
+    def set_widget(self, key, setter, value):
+        """Function that calls setter(*value) only if value differs from the last value written for key.
+        """
+        if self.rendered.get(key) == value:
+            tray_stats["skipped_writes"] += 1
+            return
+
+        self.rendered[key] = value
+        tray_stats["writes"] += 1
+        setter(*value)
+
+    def set_item(self, key, item, text=None, visible=True):
+        if text is not None:
+            self.set_widget(key + "_text", item.get_child().set_text, (text,))
+
+        # Keyed on the state, so that every change between shown and hidden is written
+        self.set_widget(key + "_visible", item.set_visible, (visible,))
+
     def main_loop(self, _):
         """Main loop that updates all labels.
         """
+        tray_stats["ticks"] += 1
+        gui_logger.debug(
+            "TRAY >>> %s ticks, %s widget writes, %s skipped writes in %.0fs.",
+            tray_stats["ticks"], tray_stats["writes"], tray_stats["skipped_writes"],
+            time.monotonic() - tray_stats["started"],
+            extra={"rate_limit": LOG_RATE_LIMIT * 10}
+        )
+
         icon_path = "/resources/img/logo/protonvpn_logo_alt.png"
         self.display_serverload = False
         display_data_rec = False
         display_server = False
         display_time_conn = False
 
-        if is_connected():
+        was_connected = self.is_vpn_connected
+        self.is_vpn_connected = is_connected()
+        if self.is_vpn_connected:
+            self.connecting_until = 0
+            if not was_connected and self.tick_interval is not None:
+                self.update_serverload(None)
             icon_path = "/resources/img/logo/protonvpn_logo.png"
             settings = self.get_tray_settings()
 
@@ -126,14 +242,18 @@ class ProtonVPNIndicator:
                                 display_data_rec=display_data_rec,
                                 display_server=display_server, 
                                 display_time_conn=display_time_conn)
+        self.display_speed_test()
 
-        self.ind.set_icon_full(CURRDIR + icon_path, 'protonvpn')
+        self.set_widget("icon", self.ind.set_icon_full, (CURRDIR + icon_path, 'protonvpn'))
 
-        return True
+        return self.schedule_ticks()
     
     def update_serverload(self, _):
         """Updates server load.
         """
+        if not self.is_vpn_connected and self.tick_interval is not None:
+            return True
+
         gui_logger.debug("TRAY >>> Updating server load in update_serverload.")
 
         connected_server = False
@@ -147,7 +267,8 @@ class ProtonVPNIndicator:
 
         # force_pull servers
         try:
-            pull_server_data(force=True)
+            with trace_span("pull_server_data", "http"):
+                pull_server_data(force=True)
         except KeyError:
             gui_logger.debug("[!] Could not pull from servers, possible due to unstable connection.")
             return True
@@ -166,32 +287,118 @@ class ProtonVPNIndicator:
         
         return True
 
+    def run_action(self, name, argv, item, progress_label, done_label):
+        """Runs a CLI action through the process supervisor, without blocking the menu.
+        The menu item shows the progress and is disabled until the action completes.
+        """
+        def action_output(process, line):
+            gui_logger.debug("TRAY >>> %s: %s", name, line)
+
+        def action_exited(process):
+            if process.returncode == 0:
+                label = done_label
+            elif process.timed_out:
+                label = "{0} (timed out)".format(done_label)
+            else:
+                label = "{0} (failed)".format(done_label)
+
+            item.set_label(label)
+            item.set_sensitive(True)
+            self.connecting_until = 0
+            # Refresh right away instead of waiting for the next tick
+            self.main_loop(None)
+
+        if not process_supervisor.run(name, argv, TRAY_ACTION_TIMEOUT, action_output, action_exited):
+            return False
+
+        item.set_label(progress_label)
+        item.set_sensitive(False)
+        return True
+
     def quick_connect(self, _):
         """Makes a quick connection by making a cli call to protonvpn-cli-ng"""
         gui_logger.debug("TRAY >>> Starting quick connect.")
-        proces = subprocess.Popen(["sudo", "protonvpn", "connect", "--fastest"], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
-        resp = proces.communicate()
-        self.update_serverload(None)
-        gui_logger.debug("TRAY >>> Successfully started quick connect: {}".format(resp))
+        if self.run_action("quick connect", ["sudo", CLI_COMMAND, "connect", "--fastest"], self.q_connect, "Connecting...", "Quick Connect"):
+            self.connecting_until = time.monotonic() + TRAY_CONNECTING_TIMEOUT
+            self.main_loop(None)
 
     def show_gui(self, _):
         """Displays the GUI."""
         gui_logger.debug("TRAY >>> Starting to display GUI.")
-        subprocess.Popen(["sudo", "protonvpn-gui"], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
+        # The GUI keeps running, it is only supervised to drain its output and reap it once closed
+        process_supervisor.run("show gui", ["sudo", "protonvpn-gui"])
         gui_logger.debug("TRAY >>> GUI display called, GUI should be visible.")
 
     def disconnect(self, _):
         """Disconnects from a current vpn connection."""
         gui_logger.debug("TRAY >>> Starting disconnect.")
-        subprocess.Popen(["sudo", "protonvpn", "disconnect"], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
-        gui_logger.debug("TRAY >>> Successfully disconnected user.")
+        if self.run_action("disconnect", ["sudo", CLI_COMMAND, "disconnect"], self.disconn, "Disconnecting...", "Disconnect"):
+            self.connecting_until = time.monotonic() + TRAY_CONNECTING_TIMEOUT
+            self.main_loop(None)
+
+    def speed_test(self, _):
+        """Tests the speed of the current connection in a thread, without blocking the menu."""
+        try:
+            servername = get_config_value("metadata", "connected_server")
+        except KeyError:
+            return
+
+        gui_logger.debug("TRAY >>> Starting speed test.")
+        self.speed_test_item.set_label("Testing speed...")
+        self.speed_test_item.set_sensitive(False)
+
+        thread = Thread(target=self.run_speed_test, args=[servername])
+        thread.daemon = True
+        thread.start()
+
+    def run_speed_test(self, servername):
+        result = run_speed_test()
+        if result:
+            speed_test_results.record(servername, result)
+
+        self.gobject.idle_add(self.speed_test_done, result)
+
+    def speed_test_done(self, result):
+        self.speed_test_item.set_label("Test speed" if result else "Test speed (failed)")
+        self.speed_test_item.set_sensitive(True)
+        # Refresh right away instead of waiting for the next tick
+        self.main_loop(None)
+
+        return False
+
+    def display_speed_test(self):
+        """Displays the last speed test of the connected server, and the speed test action while connected.
+        """
+        speed_test = False
+        if self.is_vpn_connected:
+            try:
+                speed_test = speed_test_results.get_latest(get_config_value("metadata", "connected_server"))
+            except KeyError:
+                pass
+
+        if speed_test:
+            self.set_item("speed_result", self.speed_result, format_speed_test(speed_test))
+        else:
+            self.set_item("speed_result", self.speed_result, visible=False)
+
+        self.set_item("speed_test", self.speed_test_item, visible=self.is_vpn_connected)
 
     def get_tray_settings(self):
-        """Gets and returns tray settings from config file.
+        """Gets and returns tray settings from config file, which is only read again when it changed.
         Returns: dict
             - Dictionary with boolean values for each display configuration.
         """
+        try:
+            config_mtime = os.stat(GUI_CONFIG_FILE).st_mtime
+        except OSError:
+            config_mtime = None
+
+        if self.settings_cache.get("mtime") != config_mtime or "settings" not in self.settings_cache:
+            self.settings_cache = {"mtime": config_mtime, "settings": self.read_tray_settings()}
+
+        return self.settings_cache["settings"]
 
+    def read_tray_settings(self):
         resp_dict = {
             "display_serverload": False,
             "display_data_tx": False,
@@ -202,22 +409,22 @@ class ProtonVPNIndicator:
         try: 
             resp_dict["display_serverload"] = int(get_gui_config("tray_tab", TRAY_CFG_SERVERLOAD))
         except (KeyError, IndexError):
-            gui_logger.debug("[!] Could not find display_serverload in config file.")
+            gui_logger.debug("[!] Could not find display_serverload in config file.", extra={"rate_limit": LOG_RATE_LIMIT})
         
         try: 
             resp_dict["display_server"] = int(get_gui_config("tray_tab", TRAY_CFG_SERVENAME))
         except (KeyError, IndexError):
-            gui_logger.debug("[!] Could not find display_server in config file.")
+            gui_logger.debug("[!] Could not find display_server in config file.", extra={"rate_limit": LOG_RATE_LIMIT})
 
         try: 
             resp_dict["display_data_tx"] = int(get_gui_config("tray_tab", TRAY_CFG_DATA_TX))
         except (KeyError, IndexError):
-            gui_logger.debug("[!] Could not find display_data_tx in config file.")
+            gui_logger.debug("[!] Could not find display_data_tx in config file.", extra={"rate_limit": LOG_RATE_LIMIT})
         
         try: 
             resp_dict["display_time_conn"] = int(get_gui_config("tray_tab", TRAY_CFG_TIME_CONN))
         except (KeyError, IndexError):
-            gui_logger.debug("[!] Could not find display_time_conn in config file.")
+            gui_logger.debug("[!] Could not find display_time_conn in config file.", extra={"rate_limit": LOG_RATE_LIMIT})
 
         return resp_dict
 
@@ -226,41 +433,31 @@ class ProtonVPNIndicator:
         """
 
         if kwrgs["display_serverload"]: 
-            self.server_load.get_child().set_text(self.serverload_msg)
-            self.server_load.show()
+            self.set_item("server_load", self.server_load, self.serverload_msg)
         else:
-            self.server_load.get_child().set_text("Load: -")
-            self.server_load.hide()
+            self.set_item("server_load", self.server_load, "Load: -", visible=False)
 
         if kwrgs["display_server"]: 
             server = get_config_value("metadata", "connected_server")
-            self.ind.set_label(server, "")
+            self.set_widget("indicator_label", self.ind.set_label, (server, ""))
         else:
-            self.ind.set_label("", "")
+            self.set_widget("indicator_label", self.ind.set_label, ("", ""))
 
         if kwrgs["display_data_rec"]:
             received, sent = self.data_sent_received()
 
-            display_data_rec = "Received: {}".format(received)
-            display_data_sent = "Sent: {}".format(sent)
-
-            self.data_rec.get_child().set_text(display_data_rec)
-            self.data_sent.get_child().set_text(display_data_sent)
-
-            self.data_rec.show()
-            self.data_sent.show()
+            self.set_item("data_rec", self.data_rec, "Received: {}".format(received))
+            self.set_item("data_sent", self.data_sent, "Sent: {}".format(sent))
         else: 
-            self.data_rec.hide()
-            self.data_sent.hide()
+            self.set_item("data_rec", self.data_rec, visible=False)
+            self.set_item("data_sent", self.data_sent, visible=False)
 
         if kwrgs["display_time_conn"]:
             display_time_conn = self.time_connected()
 
-            self.time_conn.get_child().set_text("Connection time: {}".format(display_time_conn))
-
-            self.time_conn.show()
+            self.set_item("time_conn", self.time_conn, "Connection time: {}".format(display_time_conn))
         else: 
-            self.time_conn.hide()
+            self.set_item("time_conn", self.time_conn, visible=False)
 
     def data_sent_received(self):
         """Get and returns ammount of sent and received data.
@@ -0,0 +1,68 @@
+import threading
+import collections
+
+from .gui_logger import gui_logger
+
+# PyGObject import
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import GObject as gobject
+
+# Methods that overwrite the same widget state, only the last one posted is applied
+WIDGET_STATE_GROUPS = {
+    "show": "visibility",
+    "hide": "visibility",
+}
+
+class UIDispatcher:
+    """Dispatcher that marshals widget updates from worker threads onto the GTK main loop.
+
+    Updates are queued and applied by a single idle callback. Pending updates for the same
+    widget state are collapsed, so only the latest value is applied per main loop iteration.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = collections.OrderedDict()
+        self.idle_scheduled = False
+
+    def post(self, widget, method, *args):
+        """Queue widget.method(*args) to be called on the main loop.
+        """
+        key = (id(widget), WIDGET_STATE_GROUPS.get(method, method))
+        self._queue(key, getattr(widget, method), args)
+
+    def post_call(self, key, func, *args):
+        """Queue func(*args) to be called on the main loop. Pending calls with the same key are deduplicated,
+        only the arguments of the latest call are used.
+        """
+        self._queue(("call", key), func, args)
+
+    def _queue(self, key, func, args):
+        with self.lock:
+            # Re-inserting moves the update to the end, to keep the order in which they were last posted
+            self.pending.pop(key, None)
+            self.pending[key] = (func, args)
+
+            if self.idle_scheduled:
+                return
+            self.idle_scheduled = True
+
+        gobject.idle_add(self.flush)
+
+    def flush(self):
+        """Apply all pending updates, runs in the main loop.
+        """
+        with self.lock:
+            pending = self.pending
+            self.pending = collections.OrderedDict()
+            self.idle_scheduled = False
+
+        for func, args in pending.values():
+            try:
+                func(*args)
+            except Exception:
+                gui_logger.exception("[!] Unable to apply UI update %s.", func)
+
+        return False
+
+ui_dispatcher = UIDispatcher()
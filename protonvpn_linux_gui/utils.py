@@ -1,18 +1,18 @@
 import re
+import os
+import json
 import sys
+import shutil
 import time
 import requests
 import datetime
 import subprocess
-import collections
 import configparser
 import concurrent.futures
 from threading import Thread
 
 from protonvpn_cli.utils import (
-    pull_server_data,
-    get_servers,
-    get_country_name,
+    pull_server_data as cli_pull_server_data,
     get_server_value,
     set_config_value,
     get_config_value,
@@ -21,8 +21,7 @@ from protonvpn_cli.utils import (
     change_file_owner,
     make_ovpn_template
 )
-from protonvpn_cli.country_codes import country_codes
-from protonvpn_cli.constants import SPLIT_TUNNEL_FILE, USER, CONFIG_FILE, PASSFILE
+from protonvpn_cli.constants import SPLIT_TUNNEL_FILE, USER, CONFIG_FILE, PASSFILE, SERVER_INFO_FILE
 
 from .constants import (
     PATH_AUTOCONNECT_SERVICE, 
@@ -33,19 +32,44 @@ from .constants import (
     TRAY_CFG_SERVENAME, 
     TRAY_CFG_DATA_TX, 
     TRAY_CFG_TIME_CONN, 
-    TRAY_CFG_DICT,
     GUI_CONFIG_FILE,
     LARGE_FLAGS_BASE_PATH,
-    SMALL_FLAGS_BASE_PATH,
-    FEATURES_BASE_PATH
+    SPLIT_TUNNEL_STATE_FILE,
+    API_URL,
+    DEFAULT_API_URL,
+    CLI_COMMAND
 )
 
 from .gui_logger import gui_logger
+from .gui_tracer import trace_span, traced, traced_callback, get_process_uptime
+from .ui_dispatcher import ui_dispatcher
+from .systemd_manager import enable_unit, disable_unit
+from .view_model import build_server_list_variants
+from .server_catalog import server_catalog, get_country_name
+from .server_tree import get_server_tree
+from .load_history import load_history
+from .snapshot import save_snapshot, get_snapshot_age
+from .split_tunneling import iter_saved_entries
+from .server_records import get_servers
+from .config_transaction import config_transaction
+from .speed_test import speed_test_results, format_speed_test
+from .settings_view_model import settings_view_model, get_mtime
+from .metrics import observe, inc_counter, set_gauge
 
 # PyGObject import
 import gi
 gi.require_version('Gtk', '3.0')
-from gi.repository import GObject as gobject, Gtk, GdkPixbuf
+from gi.repository import GObject as gobject, Gtk
+
+# Per second label timers, shared between label refreshes
+labels_timers = {}
+# Pending idle source that loads the split tunneling file into the settings,
+# and the modification times of the split tunneling files that were last loaded
+split_tunnel_stream = {}
+# Server catalog version the AutoconnectListStore was built from
+autoconnect_list_version = {}
+# Source and time (since process start) of the first server list paint
+first_paint = {}
 
 def tab_style_manager(tab_to_show: str, tab_dict):
     for k, v in tab_dict.items():
@@ -71,13 +95,12 @@ def set_gui_config(group, key, value):
     config.read(GUI_CONFIG_FILE)
     config[group][key] = str(value)
 
-    gui_logger.debug(
-        "Writing {0} to [{1}] in config file".format(key, group)
-    )
+    gui_logger.debug("Writing %s to [%s] in config file", key, group)
 
     with open(GUI_CONFIG_FILE, "w+") as f:
         config.write(f)
 
+@traced("worker")
 def get_server_protocol_from_cli(raw_result, return_protocol=False):
     """Function that collects servername and protocol from CLI print statement after establishing connection.
     """
@@ -94,6 +117,7 @@ def get_server_protocol_from_cli(raw_result, return_protocol=False):
 
     return False
 
+@traced("worker")
 def message_dialog(interface, action, label_object, spinner_object, sub_label_object=False):
     """Multipurpose message dialog function.
     """
@@ -102,8 +126,8 @@ def message_dialog(interface, action, label_object, spinner_object, sub_label_ob
             future = executor.submit(check_for_updates)
             return_value = future.result()
             
-            label_object.set_markup("<span>{0}</span>".format(return_value))
-            spinner_object.hide()
+            ui_dispatcher.post(label_object, "set_markup", "<span>{0}</span>".format(return_value))
+            ui_dispatcher.post(spinner_object, "hide")
     elif action == "diagnose":
         reccomendation = '' 
 
@@ -207,11 +231,11 @@ def message_dialog(interface, action, label_object, spinner_object, sub_label_ob
 
         gui_logger.debug(result)
 
-        label_object.set_markup(result)
-        label_object.show()
-        sub_label_object.set_markup("<b><u>Reccomendation:</u></b>\n<span>{recc}</span>".format(recc=reccomendation))
-        sub_label_object.show()
-        spinner_object.hide()
+        ui_dispatcher.post(label_object, "set_markup", result)
+        ui_dispatcher.post(label_object, "show")
+        ui_dispatcher.post(sub_label_object, "set_markup", "<b><u>Reccomendation:</u></b>\n<span>{recc}</span>".format(recc=reccomendation))
+        ui_dispatcher.post(sub_label_object, "show")
+        ui_dispatcher.post(spinner_object, "hide")
 
 def check_internet_conn(request_bool=False):
     """Function that checks for internet connection.
@@ -223,7 +247,7 @@ def check_internet_conn(request_bool=False):
 def custom_call_api(endpoint=False, request_bool=False):
     """Function that is a custom call_api with a timeout of 6 seconds. This is mostly used to check for API access and also for internet access.
     """
-    api_domain = "https://api.protonvpn.ch"
+    api_domain = API_URL
     if not endpoint:
         endpoint = "/vpn/location"
 
@@ -235,20 +259,26 @@ def custom_call_api(endpoint=False, request_bool=False):
         "Accept": "application/vnd.protonmail.v1+json"
     }
 
-    gui_logger.debug("Initiating custom API Call: {0}".format(url))
+    gui_logger.debug("Initiating custom API Call: %s", url)
 
+    start = time.monotonic()
     try:
-        response = requests.get(url, headers=headers, timeout=6)
+        with trace_span("GET " + endpoint, "http"):
+            response = requests.get(url, headers=headers, timeout=6)
     except (requests.exceptions.ConnectionError,
             requests.exceptions.ConnectTimeout,
             requests.exceptions.ReadTimeout):
         gui_logger.debug("Error connecting to ProtonVPN API. Connection either timed out or were unable to connect.")
+        inc_counter("pvpn_gui_api_errors_total", endpoint=endpoint, kind="connection")
         return False
+    finally:
+        observe("pvpn_gui_api_request_duration_seconds", time.monotonic() - start, endpoint=endpoint)
 
     try:
         response.raise_for_status()
     except requests.exceptions.HTTPError:
-        gui_logger.debug("Bad Return Code: {0}".format(response.status_code))
+        gui_logger.debug("Bad Return Code: %s", response.status_code)
+        inc_counter("pvpn_gui_api_errors_total", endpoint=endpoint, kind="http")
         return False
 
     if request_bool:
@@ -256,13 +286,45 @@ def custom_call_api(endpoint=False, request_bool=False):
 
     return response.json()
 
+def pull_server_data(force=False):
+    """Function that pulls the server list into the server info file.
+    protonvpn-cli always calls the production API, so when the API is pointed elsewhere (PVPN_GUI_API_URL)
+    the list is pulled with custom_call_api instead, and stored the same way.
+    """
+    if API_URL == DEFAULT_API_URL:
+        cli_pull_server_data(force=force)
+        return
+
+    if not force:
+        try:
+            # Same 15 minutes interval as the CLI
+            if int(time.time()) - int(get_config_value("metadata", "last_api_pull")) <= 900:
+                return
+        except (KeyError, ValueError):
+            pass
+
+    data = custom_call_api("/vpn/logicals")
+    if not data:
+        gui_logger.debug("[!] Unable to pull server data from %s.", API_URL)
+        return
+
+    tmp_path = "{0}.tmp".format(SERVER_INFO_FILE)
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, SERVER_INFO_FILE)
+    change_file_owner(SERVER_INFO_FILE)
+
+    with config_transaction(CONFIG_FILE) as config:
+        config.set("metadata", "last_api_pull", int(time.time()))
+
 def check_for_updates():
     """Function that searches for existing updates by checking the latest releases on github.
     """
     latest_release = ''
     pip3_installed = False
 
-    is_pip3_installed = subprocess.run(["pip3", "show", "protonvpn-linux-gui-calexandru2018"],stdout=subprocess.PIPE) # nosec
+    with trace_span("pip3 show", "subprocess"):
+        is_pip3_installed = subprocess.run(["pip3", "show", "protonvpn-linux-gui-calexandru2018"],stdout=subprocess.PIPE) # nosec
     if is_pip3_installed.returncode == 0:
         is_pip3_installed = is_pip3_installed.stdout.decode().split("\n")
         for el in is_pip3_installed:
@@ -274,7 +336,8 @@ def check_for_updates():
                     break           
 
     try:
-        check_version = requests.get(GITHUB_URL_RELEASE, timeout=2)
+        with trace_span("GET " + GITHUB_URL_RELEASE, "http"):
+            check_version = requests.get(GITHUB_URL_RELEASE, timeout=2)
         latest_release =  check_version.url.split("/")[-1][1:]
     except (requests.exceptions.ConnectionError,
             requests.exceptions.ConnectTimeout):
@@ -328,40 +391,42 @@ def prepare_initilizer(username_field, password_field, interface):
 def load_on_start(params_dict):
     """Function that checks if there is an internet connection, if not then return False, else calls update_labels_server_list.
     """
-    gui_logger.debug(">>> Running \"load_on_start\". Params: {0}.".format(params_dict))
+    gui_logger.debug(">>> Running \"load_on_start\".")
 
     conn = custom_get_ip_info()
     if conn and not conn is None:
-        params_dict["messagedialog_label"].set_markup("Populating dashboard...")
+        ui_dispatcher.post(params_dict["messagedialog_label"], "set_markup", "Populating dashboard...")
         
         display_secure_core = get_gui_config("connections", "display_secure_core")
         secure_core_switch = params_dict["interface"].get_object("secure_core_switch")
         secure_core_label_style = params_dict["interface"].get_object("secure_core_label").get_style_context() 
 
         if display_secure_core == "True":
-            secure_core_switch.set_state(True)
-            secure_core_label_style.remove_class("disabled_label")
+            ui_dispatcher.post(secure_core_switch, "set_state", True)
+            ui_dispatcher.post(secure_core_label_style, "remove_class", "disabled_label")
         else:
-            secure_core_switch.set_state(False)
+            ui_dispatcher.post(secure_core_switch, "set_state", False)
 
         update_labels_server_list(params_dict["interface"], conn_info=conn)
         return True
  
     return False
 
-def update_labels_server_list(interface, server_tree_list_object=False, conn_info=False):
+def update_labels_server_list(interface, conn_info=False):
     """Function that updates dashboard labels and server list.
     """
-    if not server_tree_list_object:
-        server_tree_list_obj = interface.get_object("ServerTreeStore")
-    else:
-        server_tree_list_obj = server_tree_list_object
-
     gui_logger.debug(">>> Running \"update_labels_server_list\" getting servers.")
 
+    # Pulled here, in the worker thread, so that populate_server_list does not block the main loop
+    with trace_span("pull_server_data", "http"):
+        pull_server_data(force=True)
+
     servers = get_servers()
     if not servers:
         servers = False
+
+    if servers and conn_info:
+        save_snapshot(servers, conn_info)
         
     update_labels_dict = {
         "interface": interface,
@@ -371,19 +436,73 @@ def update_labels_server_list(interface, server_tree_list_object=False, conn_inf
     }
 
     populate_servers_dict = {
-        "tree_object": server_tree_list_obj,
-        "servers": servers
+        "interface": interface,
+        "servers": servers,
+        "source": "api"
     }
 
     # Update labels
-    gobject.idle_add(update_labels_status, update_labels_dict)
+    refresh_labels_status(update_labels_dict)
 
     # Populate server list
-    gobject.idle_add(populate_server_list, populate_servers_dict)
+    gobject.idle_add(traced_callback(populate_server_list), populate_servers_dict)
+    ui_dispatcher.post(interface.get_object("stale_data_label"), "hide")
+
+def render_snapshot(interface, snapshot):
+    """Function that renders the server list from the last snapshot, with a stale data indicator until fresh data arrives.
+    The connection labels show the live connection state, the IP information of the snapshot belongs to the previous
+    session and is not displayed.
+    """
+    update_labels_dict = {
+        "interface": interface,
+        "servers": snapshot["servers"],
+        "disconnecting": False,
+        "conn_info": ("Loading...", "Loading...", "")
+    }
+
+    populate_servers_dict = {
+        "interface": interface,
+        "servers": snapshot["servers"],
+        "source": "snapshot"
+    }
+
+    refresh_labels_status(update_labels_dict)
+
+    gobject.idle_add(traced_callback(populate_server_list), populate_servers_dict)
+    set_stale_indicator(interface, snapshot, "Showing servers from {age} ago, refreshing...")
+
+def set_stale_indicator(interface, snapshot, message):
+    stale_data_label = interface.get_object("stale_data_label")
+    ui_dispatcher.post(stale_data_label, "set_markup", message.format(age=get_snapshot_age(snapshot)))
+    ui_dispatcher.post(stale_data_label, "show")
+
+def report_first_paint(source):
+    """Function that logs the time from process start to the first server list paint, once.
+    """
+    if first_paint:
+        return
+
+    first_paint["source"] = source
+    first_paint["seconds"] = get_process_uptime()
+    set_gauge("pvpn_gui_first_paint_seconds", first_paint["seconds"], source=source)
+    gui_logger.debug(">>> Time to first meaningful paint: %.0fms (from %s).", first_paint["seconds"] * 1000, source)
 
 def update_labels_status(update_labels_dict):
     """Function prepares data to update labels.
     """
+    paint_labels_status(update_labels_dict["interface"], get_labels_status(update_labels_dict))
+
+def refresh_labels_status(update_labels_dict):
+    """Function that gathers labels data on the calling (worker) thread, and posts the label updates to the main loop.
+    Pending refreshes are deduplicated, so that a burst of refreshes results in a single redraw.
+    """
+    labels_status = get_labels_status(update_labels_dict)
+    ui_dispatcher.post_call("labels_status", paint_labels_status, update_labels_dict["interface"], labels_status)
+
+@traced("worker")
+def get_labels_status(update_labels_dict):
+    """Function that collects the data displayed in the dashboard labels, without touching any widgets.
+    """
     gui_logger.debug(">>> Running \"update_labels_status\" getting servers, is_connected and connected_server.")
 
     if not update_labels_dict["servers"]:
@@ -391,40 +510,27 @@ def update_labels_status(update_labels_dict):
     else:
         servers = update_labels_dict["servers"]
 
-    interface =  update_labels_dict["interface"]
     disconnecting = update_labels_dict["disconnecting"]
     conn_info = update_labels_dict["conn_info"]
     is_vpn_connected = True if is_connected() else False
     country_cc = False
     load = False
-
-    time_connected_label =  interface.get_object("time_connected_label")
-    protocol_label =        interface.get_object("protocol_label")
-    conn_disc_button_label = interface.get_object("main_conn_disc_button_label")
-    ip_label =              interface.get_object("ip_label")
-    server_load_label =     interface.get_object("server_load_label")
-    country_label =         interface.get_object("country_label")
-    isp_label    =          interface.get_object("isp_label")
-    data_received_label =   interface.get_object("data_received_label")
-    data_sent_label =       interface.get_object("data_sent_label") 
-    background_large_flag = interface.get_object("background_large_flag")
-    protonvpn_sign_green =  interface.get_object("protonvpn_sign_green")
+    flag_path = False
 
     try:
         connected_server = get_config_value("metadata", "connected_server")
     except (KeyError, IndexError):
         connected_server = False
 
-    # Get and set server load label
+    # Get server load
     try:
         load = get_server_value(connected_server, "Load", servers)
     except (KeyError, IndexError):
         gui_logger.debug("[!] Could not find server load information.")
         
     load = "{0}% Load".format(load) if load and is_vpn_connected else ""
-    server_load_label.set_markup('<span>{0}</span>'.format(load))
 
-    # Get and set IP labels. Get also country and ISP
+    # Get IP, country and ISP
     if not conn_info:
         result = custom_get_ip_info()
         if result:
@@ -436,15 +542,11 @@ def update_labels_status(update_labels_dict):
     else:
         ip, isp, country = conn_info
         
-    for k,v in country_codes.items():
-        if k == country:
-            if is_vpn_connected:
-                flag_path = LARGE_FLAGS_BASE_PATH+"{}.jpg".format(k.lower())
-                background_large_flag.set_from_file(flag_path)
-            country_cc = v
+    country_cc = get_country_name(country)
+    if country_cc and is_vpn_connected:
+        flag_path = LARGE_FLAGS_BASE_PATH+"{}.jpg".format(country.lower())
 
-    protonvpn_sign_green.hide()
-    country_server = country_cc
+    country_server = country_cc if country_cc else ""
 
     if is_vpn_connected:
         try:
@@ -452,18 +554,7 @@ def update_labels_status(update_labels_dict):
         except TypeError: 
             country_server = country_server + " >> "
 
-        protonvpn_sign_green.show()
-    ip_label.set_markup(ip)
-    isp_label.set_markup(isp)
-
-    # Get and set server name
-    connected_server = connected_server if connected_server and is_vpn_connected else ""
-    country_label.set_markup(country_server if country_server else "")
-
-    # Update sent and received data
-    gobject.timeout_add_seconds(1, update_sent_received_data, {"is_vpn_connected": is_vpn_connected, "received_label": data_received_label, "sent_label": data_sent_label})
-    
-    # Check and set VPN status label. Get also protocol status if vpn is connected
+    # Get VPN status and protocol if vpn is connected
     protocol = "No VPN Connection"
     conn_disc_button = "Quick Connect"
     if is_vpn_connected and not disconnecting:
@@ -473,16 +564,61 @@ def update_labels_status(update_labels_dict):
         except (KeyError, IndexError):
             pass
         conn_disc_button = "Disconnect"
-    conn_disc_button_label.set_markup(conn_disc_button)
 
-    # Check and set DNS status label
-    dns_enabled = get_config_value("USER", "dns_leak_protection")
+    # Last speed test of the connected server
+    speed_test = speed_test_results.get_latest(connected_server) if is_vpn_connected else False
+
+    return {
+        "is_vpn_connected": is_vpn_connected,
+        "load": load,
+        "ip": ip,
+        "isp": isp,
+        "flag_path": flag_path,
+        "country_server": country_server if country_server else "",
+        "protocol": protocol,
+        "conn_disc_button": conn_disc_button,
+        "speed_test": format_speed_test(speed_test) if speed_test else "",
+    }
+
+@traced("gtk")
+def paint_labels_status(interface, labels_status):
+    """Function that sets the dashboard labels, it must run in the main loop.
+    """
+    is_vpn_connected = labels_status["is_vpn_connected"]
+
+    interface.get_object("server_load_label").set_markup('<span>{0}</span>'.format(labels_status["load"]))
+
+    if labels_status["flag_path"]:
+        interface.get_object("background_large_flag").set_from_file(labels_status["flag_path"])
 
-    # Update time connected label
-    gobject.timeout_add_seconds(1, update_connection_time, {"is_vpn_connected":is_vpn_connected, "label":time_connected_label})
+    protonvpn_sign_green = interface.get_object("protonvpn_sign_green")
+    if is_vpn_connected:
+        protonvpn_sign_green.show()
+    else:
+        protonvpn_sign_green.hide()
+
+    interface.get_object("ip_label").set_markup(labels_status["ip"])
+    interface.get_object("isp_label").set_markup(labels_status["isp"])
+    interface.get_object("country_label").set_markup(labels_status["country_server"])
+    interface.get_object("main_conn_disc_button_label").set_markup(labels_status["conn_disc_button"])
+    interface.get_object("protocol_label").set_markup(labels_status["protocol"])
+    interface.get_object("speed_test_label").set_markup(labels_status.get("speed_test", ""))
+
+    # Update sent/received data and time connected labels every second.
+    # The timers are only created once, later refreshes update the connection state they display.
+    if "data" not in labels_timers:
+        labels_timers["data"] = {
+            "received_label": interface.get_object("data_received_label"),
+            "sent_label": interface.get_object("data_sent_label")
+        }
+        labels_timers["time"] = {"label": interface.get_object("time_connected_label")}
+        gobject.timeout_add_seconds(1, traced_callback(update_sent_received_data, "timeout"), labels_timers["data"])
+        gobject.timeout_add_seconds(1, traced_callback(update_connection_time, "timeout"), labels_timers["time"])
 
-    # Check and set protocol label
-    protocol_label.set_markup(protocol)
+    labels_timers["data"]["is_vpn_connected"] = is_vpn_connected
+    labels_timers["time"]["is_vpn_connected"] = is_vpn_connected
+
+    return False
 
 def update_sent_received_data(dict_labels):
     tx_amount, rx_amount = get_transferred_data()
@@ -515,85 +651,68 @@ def update_connection_time(dict_data):
 
 def load_configurations(interface):
     """Function that sets and populates user configurations before showing the configurations window.
+    The values come from the cached settings view-model, and only the widgets that differ from it are updated,
+    so that opening the window neither parses the config files again nor triggers the change handlers.
     """
     # pref_dialog = interface.get_object("ConfigurationsWindow")
     pref_dialog = interface.get_object("SettingsWindow")
 
-    load_general_settings(interface)
-    load_tray_settings(interface)
-    load_connection_settings(interface)
-    load_advanced_settings(interface)
+    with trace_span("load settings", "gtk"):
+        settings = settings_view_model.get_settings()
+
+        load_general_settings(interface, settings)
+        load_tray_settings(interface, settings)
+        load_connection_settings(interface, settings)
+        load_advanced_settings(interface, settings)
    
     pref_dialog.show()
 
-def load_general_settings(interface):
+def set_combobox_active(combobox, index):
+    if combobox.get_active() != index:
+        combobox.set_active(index)
+
+def set_switch_state(switch, state):
+    if switch.get_state() != state:
+        switch.set_state(state)
+
+def disable_widget(widget):
+    if widget.get_sensitive():
+        widget.set_property('sensitive', False)
+
+def load_general_settings(interface, settings):
     username_field = interface.get_object("update_username_input")
     pvpn_plan_combobox = interface.get_object("update_tier_combobox")
 
-    username = get_config_value("USER", "username")
-    tier = int(get_config_value("USER", "tier"))
-
     # Populate username
-    username_field.set_text(username)   
+    if username_field.get_text() != settings["username"]:
+        username_field.set_text(settings["username"])
     # Set tier
-    pvpn_plan_combobox.set_active(tier)
+    set_combobox_active(pvpn_plan_combobox, settings["tier"])
 
 
-def load_tray_settings(interface):
+def load_tray_settings(interface, settings):
     # Load tray configurations
-    for k,v in TRAY_CFG_DICT.items(): 
-        setter = 0
-        try: 
-            setter = int(get_gui_config("tray_tab", v))
-        except KeyError:
-            gui_logger.debug("[!] Unable to find {} key.".format(v))
-
-        combobox = interface.get_object(k)
-        combobox.set_active(setter)
+    for k, setter in settings["tray"].items():
+        set_combobox_active(interface.get_object(k), setter)
 
-def load_connection_settings(interface):
+def load_connection_settings(interface, settings):
     # Set Autoconnect on boot combobox 
-    server_list = populate_autoconnect_list(interface, return_list=True)
+    server_list = list(populate_autoconnect_list(interface, return_list=True).keys())
 
     # Get objects
     update_autoconnect_combobox = interface.get_object("update_autoconnect_combobox")
     update_quick_connect_combobox = interface.get_object("update_quick_connect_combobox")
     update_protocol_combobox = interface.get_object("update_protocol_combobox")
 
-    #Get values
-    try:
-        autoconnect_setting = get_gui_config("conn_tab", "autoconnect")
-    except (KeyError, IndexError):
-        autoconnect_setting = 0
-    try:
-        quick_connect_setting = get_gui_config("conn_tab", "quick_connect")
-    except (KeyError, IndexError):
-        quick_connect = 0 
-    default_protocol = get_config_value("USER", "default_protocol")
-
-    # Get indexes
-    autoconnect_index = list(server_list.keys()).index(autoconnect_setting)
-    quick_connect_index = list(server_list.keys()).index(quick_connect_setting)
+    # Set values, unknown commands (e.g. a country without servers) fall back to "Disabled"
+    for combobox, setting in ((update_autoconnect_combobox, "autoconnect"), (update_quick_connect_combobox, "quick_connect")):
+        set_combobox_active(combobox, server_list.index(settings[setting]) if settings[setting] in server_list else 0)
 
-    # Set values
-    update_autoconnect_combobox.set_active(autoconnect_index)
-    update_quick_connect_combobox.set_active(quick_connect_index)
-
-    if default_protocol == "tcp":
-        update_protocol_combobox.set_active(0)
-    else:
-        update_protocol_combobox.set_active(1)
+    set_combobox_active(update_protocol_combobox, 0 if settings["default_protocol"] == "tcp" else 1)
 
-def load_advanced_settings(interface):
+def load_advanced_settings(interface, settings):
     # User values
-    dns_leak_protection = get_config_value("USER", "dns_leak_protection")
-    custom_dns = get_config_value("USER", "custom_dns")
-    killswitch = get_config_value("USER", "killswitch")
-
-    try:
-        split_tunnel = get_config_value("USER", "split_tunnel")
-    except (KeyError, IndexError):
-        split_tunnel = '0'
+    killswitch = settings["killswitch"]
 
     # Object
     dns_leak_switch = interface.get_object("update_dns_leak_switch")
@@ -602,264 +721,138 @@ def load_advanced_settings(interface):
     split_tunneling_list = interface.get_object("split_tunneling_textview")
 
     # Set DNS Protection
-    if dns_leak_protection == '1':
-    # if dns_leak_protection == '1' or (dns_leak_protection != '1' and custom_dns.lower() != "none"):
-        dns_leak_switch.set_state(True)
-    else:
-        dns_leak_switch.set_state(False)
+    set_switch_state(dns_leak_switch, settings["dns_leak_protection"])
 
     # Populate Split Tunelling
     # Check if killswtich is != 0, if it is then disable split tunneling Function
-    if killswitch != '0':
-        killswitch_switch.set_state(True)
-        split_tunneling_switch.set_property('sensitive', False)
-    else:
-        killswitch_switch.set_state(False)
-
-    if split_tunnel != '0':
-        split_tunneling_switch.set_state(True)
-        killswitch_switch.set_property('sensitive', False)
-        if killswitch != '0':
-            split_tunneling_list.set_property('sensitive', False)
-            interface.get_object("update_split_tunneling_button").set_property('sensitive', False)
-            
+    set_switch_state(killswitch_switch, killswitch)
+    if killswitch:
+        disable_widget(split_tunneling_switch)
+
+    set_switch_state(split_tunneling_switch, settings["split_tunnel"])
+    if settings["split_tunnel"]:
+        disable_widget(killswitch_switch)
+        if killswitch:
+            disable_widget(split_tunneling_list)
+            disable_widget(interface.get_object("update_split_tunneling_button"))
+
+        # The entries are only loaded again when they changed on disk or were edited without being saved
         split_tunneling_buffer = split_tunneling_list.get_buffer()
-        content = ""
-        try:
-            with open(SPLIT_TUNNEL_FILE) as f:
-                lines = f.readlines()
-
-                for line in lines:
-                    content = content + line
+        if split_tunnel_stream.get("loaded") != get_split_tunnel_signature() or split_tunneling_buffer.get_modified():
+            stream_split_tunnel_file(split_tunneling_buffer)
 
-                split_tunneling_buffer.set_text(content)
-        except FileNotFoundError:
-            split_tunneling_buffer.set_text(content)
-    else:
-        split_tunneling_switch.set_state(False)  
+def get_split_tunnel_signature():
+    return (get_mtime(SPLIT_TUNNEL_FILE), get_mtime(SPLIT_TUNNEL_STATE_FILE))
 
-def populate_server_list(populate_servers_dict):
-    """Function that updates server list.
+def stream_split_tunnel_file(split_tunneling_buffer):
+    """Function that loads the saved split tunneling entries into the TextView buffer, one chunk per main loop iteration,
+    so that large lists do not block the UI.
     """
-    pull_server_data(force=True)
+    if split_tunnel_stream.get("source_id"):
+        gobject.source_remove(split_tunnel_stream.pop("source_id"))
 
-    only_secure_core = True if get_gui_config("connections", "display_secure_core") == "True" else False
-    if not populate_servers_dict["servers"]:
-        servers = get_servers()
-    else:
-        servers = populate_servers_dict["servers"]
-
-    if servers:
-        populate_servers_dict["tree_object"].clear()
-
-        country_servers = get_country_servers(servers)
-        images_dict = create_features_img()
-
-        for country in country_servers:
-            # Get average load and highest feature
-            avrg_load, country_feature = get_country_avrg_features(country, country_servers, servers, only_secure_core)
+    split_tunneling_buffer.set_text("")
+    split_tunnel_stream.pop("loaded", None)
+    signature = get_split_tunnel_signature()
+    chunks = iter_saved_entries(SPLIT_TUNNEL_FILE)
 
-            flag = GdkPixbuf.Pixbuf.new_from_file_at_size(get_flag_path(country), 15,15)
-            
-            # Check plus servers
-            if country_feature == "normal" or country_feature == "p2p":
-                plus_feature = images_dict["empty_pix"]
-            else:
-                plus_feature = images_dict["plus_pix"]
-
-            # Check correct feature
-            if country_feature == "normal" or country_feature == "secure-core":
-                feature = images_dict["empty_pix"]
-            elif country_feature == "p2p":
-                feature = images_dict["p2p_pix"]
-            elif country_feature == "tor":
-                feature = images_dict["tor_pix"]
+    def insert_next_chunk():
+        try:
+            chunk = next(chunks)
+        except (StopIteration, FileNotFoundError):
+            split_tunnel_stream.pop("source_id", None)
+            # Edits made after this point mark the buffer as modified
+            split_tunneling_buffer.set_modified(False)
+            split_tunnel_stream["loaded"] = signature
+            return False
 
-            if country_feature == "secure-core" and only_secure_core:
-                country_row = populate_servers_dict["tree_object"].append(None, [flag, country, plus_feature, feature, avrg_load])
-            elif not only_secure_core:
-                country_row = populate_servers_dict["tree_object"].append(None, [flag, country, plus_feature, feature, avrg_load])
+        split_tunneling_buffer.insert(split_tunneling_buffer.get_end_iter(), chunk)
+        return True
 
-            for servername in country_servers[country]:
-                servername, plus_feature, feature, load, secure_core  = set_individual_server(servername, images_dict, servers, feature)
+    if insert_next_chunk():
+        split_tunnel_stream["source_id"] = gobject.idle_add(insert_next_chunk)
 
-                if secure_core and only_secure_core:
-                    populate_servers_dict["tree_object"].append(country_row, [images_dict["empty_pix"], servername, plus_feature, feature, load])
-                elif not secure_core and not only_secure_core:
-                    populate_servers_dict["tree_object"].append(country_row, [images_dict["empty_pix"], servername, plus_feature, feature, load])
+def get_server_tree_stores(interface):
+    """Function that returns the TreeStores of the standard (False) and secure-core (True) server lists.
+    """
+    return {
+        False: interface.get_object("ServerTreeStore"),
+        True: interface.get_object("SecureCoreServerTreeStore"),
+    }
 
-def set_individual_server(servername, images_dict, servers, feature):
-    server_tiers = {0: "Free", 1: "Basic", 2: "Plus/Visionary"}
-    features = {0: "Normal", 1: "Secure-Core", 2: "Tor", 4: "P2P"}
+def get_displayed_server_tree_store(interface):
+    """Function that returns the TreeStore displayed by the server list, directly or through a filter.
+    """
+    model = interface.get_object("TreeViewServerList").get_model()
+    if isinstance(model, Gtk.TreeModelFilter):
+        model = model.get_model()
 
-    secure_core = False
+    return model
 
-    load = str(get_server_value(servername, "Load", servers)).rjust(3, " ")
-    load = load + "%"               
+def show_server_tree_store(interface, only_secure_core):
+    """Function that swaps the server list to the standard or secure-core TreeStore, both are kept populated.
+    Returns:
+    ----
+    - True if the model was swapped, False if it was already displayed.
+    """
+    tree_store = get_server_tree_stores(interface)[only_secure_core]
+    if get_displayed_server_tree_store(interface) is tree_store:
+        return False
 
-    tier = server_tiers[get_server_value(servername, "Tier", servers)]
-    
-    if not "Plus/Visionary".lower() == tier.lower():
-        plus_feature = images_dict["empty_pix"]
-    else:
-        plus_feature = images_dict["plus_pix"]
+    interface.get_object("TreeViewServerList").set_model(tree_store)
+    return True
 
-    server_feature = features[get_server_value(servername, 'Features', servers)].lower()
-    
-    if server_feature == "Normal".lower():
-        feature = images_dict["empty_pix"]
-    elif server_feature == "P2P".lower():
-        feature = images_dict["p2p_pix"]
-    elif server_feature == "Tor".lower():
-        feature = images_dict["tor_pix"]
+def populate_server_list(populate_servers_dict):
+    """Function that updates both server lists (standard and secure-core), and displays the one selected in the settings.
+    """
+    interface = populate_servers_dict["interface"]
+    only_secure_core = True if get_gui_config("connections", "display_secure_core") == "True" else False
+    if not populate_servers_dict["servers"]:
+        with trace_span("pull_server_data", "http"):
+            pull_server_data(force=True)
+        servers = get_servers()
     else:
-        # Should be secure core
-        secure_core = True
+        servers = populate_servers_dict["servers"]
 
-    return (servername, plus_feature, feature, load, secure_core)
+    if servers:
+        server_catalog.update(servers)
+        record_load_history(servers)
+        tree_stores = get_server_tree_stores(interface)
+        for secure_core, rows in build_server_list_variants(servers).items():
+            get_server_tree(tree_stores[secure_core]).reconcile(rows)
+        show_server_tree_store(interface, only_secure_core)
+        report_first_paint(populate_servers_dict.get("source", "api"))
+
+def record_load_history(servers):
+    """Function that appends the server loads of the last API pull to the load history, in a background thread.
+    """
+    try:
+        last_api_pull = int(get_config_value("metadata", "last_api_pull"))
+    except (KeyError, ValueError):
+        return
 
-def get_flag_path(country):
-    for k,v in country_codes.items():
-        if country == v:
-            flag_path = SMALL_FLAGS_BASE_PATH+"{}.png".format(v)
-            break
-        else:
-            flag_path = SMALL_FLAGS_BASE_PATH+"Unknown.png"
-
-    return flag_path
-
-def get_country_servers(servers):
-    countries = {}
-    for server in servers:
-        country = get_country_name(server["ExitCountry"])
-        if country not in countries.keys():
-            countries[country] = []
-        countries[country].append(server["Name"])
-
-    country_servers = {} 
-    # Order server list by country alphabetically
-    countries = collections.OrderedDict(sorted(countries.items()))
-
-    for country in countries:
-        country_servers[country] = sorted(countries[country], key=lambda s: get_server_value(s, "Load", servers))
-
-    return country_servers
-
-def create_features_img():
-    # Create empty image
-    empty_path = FEATURES_BASE_PATH+"normal.png"
-    empty_pix = GdkPixbuf.Pixbuf.new_from_file_at_size(empty_path, 15,15)
-    # Create P2P image
-    p2p_path = FEATURES_BASE_PATH+"p2p-arrows.png"
-    p2p_pix = GdkPixbuf.Pixbuf.new_from_file_at_size(p2p_path, 15,15)
-    # Create TOR image
-    tor_path = FEATURES_BASE_PATH+"tor-onion.png"
-    tor_pix = GdkPixbuf.Pixbuf.new_from_file_at_size(tor_path, 15,15)
-    # Create Plus image
-    plus_server_path = FEATURES_BASE_PATH+"plus-server.png"
-    plus_pix = GdkPixbuf.Pixbuf.new_from_file_at_size(plus_server_path, 15,15)
-
-    images_dict = {
-        "empty_pix": empty_pix,
-        "p2p_pix": p2p_pix,
-        "tor_pix": tor_pix,
-        "plus_pix": plus_pix,
-    }
-    return images_dict
+    thread = Thread(target=load_history.record, args=[servers, last_api_pull])
+    thread.daemon = True
+    thread.start()
 
-def get_country_avrg_features(country, country_servers, servers, only_secure_core):
-    """Function that returns average load and features of a specific country.
+def populate_autoconnect_list(interface, return_list=False):
+    """Function that populates autoconnect dropdown list, which is shared by the autoconnect and quick connect comboboxes.
+    The list is only rebuilt when the server catalog changed.
     """
-    features = {0: "Normal", 1: "Secure-Core", 2: "Tor", 4: "P2P"}
-    # Variables for average per country
-    count = 0
-    load_sum = 0
-    # Variable for feature per country
-    features_per_country = set()
-
-    order_dict = {
-        "normal": 0,
-        "p2p": 1,
-        "tor": 2,
-        "secure-core": 3,
-    }
-    top_choice = 0
+    if not server_catalog.is_loaded:
+        server_catalog.update(get_servers() or [])
 
-    for servername in country_servers[country]:
-        # Get average per country
-        load_sum = load_sum + int(str(get_server_value(servername, "Load", servers)).rjust(3, " "))
-        count += 1
-        
-        # Get features per country
-        feature = features[get_server_value(servername, 'Features', servers)]
-        features_per_country.add(feature)
-    
-    # Convert set to list
-    country_feature_list = list(features_per_country)
-    
-    for feature in country_feature_list:
-        for k,v in order_dict.items():
-            if feature.lower() == k.lower():
-                # if top_choice < v and (not only_secure_core and not v > 2):
-                if top_choice < v:
-                    top_choice = v
-
-    if top_choice == 0:
-        top_choice = "normal"
-    elif top_choice == 1:
-        top_choice = "p2p"
-    elif top_choice == 2:
-        top_choice = "tor"
-    else:
-        top_choice = "secure-core"
+    if autoconnect_list_version.get("version") != server_catalog.version:
+        autoconnect_liststore = interface.get_object("AutoconnectListStore")
+        autoconnect_liststore.clear()
 
-    # print(country,top_choice)
+        for command, display in server_catalog.autoconnect_options.items():
+            autoconnect_liststore.append([command, display, command])
 
-    return  (str(int(round(load_sum/count)))+"%", top_choice)    
+        autoconnect_list_version["version"] = server_catalog.version
 
-def populate_autoconnect_list(interface, return_list=False):
-    """Function that populates autoconnect dropdown list.
-    """
-    autoconnect_liststore = interface.get_object("AutoconnectListStore")
-    countries = {}
-    servers = get_servers()
-    other_choice_dict = {
-        "dis": "Disabled",
-        "fast": "Fastest",
-        "rand": "Random", 
-        "p2p": "Peer2Peer", 
-        "sc": "Secure Core (Plus/Visionary)",
-        "tor": "Tor (Plus/Visionary)"
-    }
-    autoconnect_alternatives = ["dis", "fast", "rand", "p2p", "sc", "tor"]
-    # return_values = collections.OrderedDict()
-    return_values = collections.OrderedDict()
-
-    for server in servers:
-        country = get_country_name(server["ExitCountry"])
-        if country not in countries.keys():
-            countries[country] = []
-        countries[country].append(server["Name"])
-    
-    for country in sorted(countries):
-        autoconnect_alternatives.append(country)
-
-    for alt in autoconnect_alternatives:
-        if alt in other_choice_dict:
-            # if return_list:
-            return_values[alt] = other_choice_dict[alt]
-            # else:
-            autoconnect_liststore.append([alt, other_choice_dict[alt], alt])
-        else:
-            for k,v in country_codes.items():
-                if alt.lower() == v.lower():
-                    # if return_list:
-                    return_values[k] = v
-                    # else:
-                    autoconnect_liststore.append([k, v, k])
-    
     if return_list:
-        return return_values
+        return server_catalog.autoconnect_options
 
 def manage_autoconnect(mode, command=False):
     """Function that manages autoconnect functionality. It takes a mode (enabled/disabled) and a command that is to be passed to the CLI.
@@ -892,115 +885,30 @@ def enable_autoconnect(command):
     if not protonvpn_path:
         return False
 
-    # Injects CLIs start and stop path and username
-    with_cli_path = TEMPLATE.replace("PATH", (protonvpn_path + " " + command))
+    # Injects boot connect command, CLIs stop path and username
+    boot_connect_path = "{0} -m protonvpn_linux_gui.boot_connect".format(sys.executable)
+    with_cli_path = TEMPLATE.replace("PATH", (boot_connect_path + " " + command))
     template = with_cli_path.replace("STOP", protonvpn_path + " disconnect")
     template = template.replace("=user", "="+USER)
-    
-    if not generate_template(template):
-        return False
 
-    return enable_daemon() 
+    gui_logger.debug(">>> Template:\n%s", template)
+
+    return enable_unit(SERVICE_NAME + ".service", PATH_AUTOCONNECT_SERVICE, template).success
 
 def disable_autoconnect():
     """Function that disables autoconnect.
     """
-    if not stop_and_disable_daemon():
-        return False
-
-    if not remove_template():
-        return False
-
-    return True
+    return disable_unit(SERVICE_NAME + ".service", PATH_AUTOCONNECT_SERVICE).success
 
 def find_cli():
     """Function that searches for the CLI. Returns CLIs path if it is found, otherwise it returns False.
     """
-    protonvpn_path = subprocess.run(['sudo', 'which', 'protonvpn'], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
-    if protonvpn_path.returncode == 1:
-        gui_logger.debug("[!] Unable to run \"find protonvpn-cli-ng\" subprocess.")
-        protonvpn_path = False
-
-    return protonvpn_path.stdout.decode()[:-1] if (protonvpn_path and protonvpn_path.returncode == 0) else False
-        
-def generate_template(template):
-    """Function that generates the service file for autoconnect.
-    """
-    generate_service_command = "cat > {0} <<EOF {1}\nEOF".format(PATH_AUTOCONNECT_SERVICE, template)
-    gui_logger.debug(">>> Template:\n{}".format(generate_service_command))
-
-    resp = subprocess.run(["sudo", "bash", "-c", generate_service_command], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
-    if resp.returncode == 1:
-        gui_logger.debug("[!] Unable to generate template.\n{}".format(resp))
-        return False
-
-    return True
-
-def remove_template():
-    """Function that removes the service file from /etc/systemd/system/.
-    """
-    resp = subprocess.run(["sudo", "rm", PATH_AUTOCONNECT_SERVICE], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
-    # If return code 1: File does not exist in path
-    # This is fired when a user wants to remove template a that does not exist
-    if resp.returncode == 1:
-        gui_logger.debug("[!] Could not remove .serivce file.\n{}".format(resp))
-
-    reload_daemon()
-    return True
-
-def enable_daemon():
-    """Function that enables the autoconnect daemon service.
-    """
-    reload_daemon()
-
-    resp = subprocess.run(['sudo', 'systemctl', 'enable' , SERVICE_NAME], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
-    if resp.returncode == 1:
-        gui_logger.debug("[!] Unable to enable deamon.\n{}".format(resp))
-        return False
-
-    return True
-    
-def stop_and_disable_daemon():
-    """Function that stops and disables the autoconnect daemon service.
-    """
-    if not daemon_exists():
-        return True
-
-    resp_stop = subprocess.run(['sudo', 'systemctl', 'stop' , SERVICE_NAME], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
-    if resp_stop.returncode == 1:
-        gui_logger.debug("[!] Unable to stop deamon.\n{}".format(resp_stop))
-        return False
-
-    resp_disable = subprocess.run(['sudo', 'systemctl', 'disable' ,SERVICE_NAME], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
-    if resp_disable.returncode == 1:
-        gui_logger.debug("[!] Unable not disable daemon.\n{}".format(resp_disable))
-        return False
-
-    return True
-
-def reload_daemon():
-    """Function that reloads the autoconnect daemon service.
-    """
-    resp = subprocess.run(['sudo', 'systeasdasdsmctl', 'daemoasdasdn-reloadasdasdasd'], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
-    if resp.returncode == 1:
-        gui_logger.debug("[!] Unable to reload daemon.\n{}".format(resp))
+    protonvpn_path = shutil.which(CLI_COMMAND)
+    if not protonvpn_path:
+        gui_logger.debug("[!] Unable to find protonvpn-cli-ng.")
         return False
 
-    return True
-
-
-def daemon_exists():
-    """Function that checks if autoconnect daemon service exists.
-    """
-    # Return code 3: service exists
-    # Return code 4: service could not be found
-    resp_stop = subprocess.run(['systemctl', 'status' , SERVICE_NAME], stdout=subprocess.PIPE, stderr=subprocess.PIPE) # nosec
-    return_val = True
-
-    if resp_stop.returncode == 4:
-        return_val = False
-
-    return return_val
+    return protonvpn_path
 
 def custom_get_ip_info():
     """Custom get_ip_info that also returns the country.
@@ -1022,11 +930,12 @@ def get_gui_processes():
     """
     gui_logger.debug(">>> Running \"get_gui_processes\".")
 
-    processes = subprocess.run(["pgrep", "protonvpn-gui"],stdout=subprocess.PIPE) # nosec
+    with trace_span("pgrep protonvpn-gui", "subprocess"):
+        processes = subprocess.run(["pgrep", "protonvpn-gui"],stdout=subprocess.PIPE) # nosec
     
     processes = list(filter(None, processes.stdout.decode().split("\n"))) 
 
-    gui_logger.debug(">>> Existing process running: {0}".format(processes))
+    gui_logger.debug(">>> Existing process running: %s", processes)
 
     return processes
     
\ No newline at end of file
@@ -0,0 +1,130 @@
+import collections
+
+from protonvpn_cli.country_codes import country_codes
+
+# The view-model works only on the servers returned by get_servers() (dicts or ServerRecords),
+# and outputs plain tuples. Images are referenced by key ("empty", "plus", "p2p", "tor"),
+# so that the GUI can map them to pixbufs and the rest can be run without a display.
+SERVER_TIERS = {0: "Free", 1: "Basic", 2: "Plus/Visionary"}
+SERVER_FEATURES = {0: "normal", 1: "secure-core", 2: "tor", 4: "p2p"}
+FEATURE_ORDER = {"normal": 0, "p2p": 1, "tor": 2, "secure-core": 3}
+
+AUTOCONNECT_ALTERNATIVES = collections.OrderedDict([
+    ("dis", "Disabled"),
+    ("fast", "Fastest"),
+    ("rand", "Random"),
+    ("p2p", "Peer2Peer"),
+    ("sc", "Secure Core (Plus/Visionary)"),
+    ("tor", "Tor (Plus/Visionary)"),
+])
+
+def get_server_feature(server):
+    """Function that returns the feature name of a server.
+    """
+    return SERVER_FEATURES.get(server["Features"], "normal")
+
+def get_country_servers(servers):
+    """Function that groups servers by country name.
+    Returns:
+    ----
+    - An OrderedDict with country names (alphabetically) as keys and lists of server dicts (sorted by load) as values.
+    """
+    countries = {}
+    for server in servers:
+        country = country_codes.get(server["ExitCountry"], server["ExitCountry"])
+        countries.setdefault(country, []).append(server)
+
+    country_servers = collections.OrderedDict()
+    for country in sorted(countries):
+        country_servers[country] = sorted(countries[country], key=lambda server: server["Load"])
+
+    return country_servers
+
+def get_country_avrg_features(country_server_list):
+    """Function that returns average load and top feature of the servers from a specific country.
+    """
+    load_sum = 0
+    top_choice = "normal"
+
+    for server in country_server_list:
+        load_sum += int(server["Load"])
+
+        feature = get_server_feature(server)
+        if FEATURE_ORDER[feature] > FEATURE_ORDER[top_choice]:
+            top_choice = feature
+
+    return (str(int(round(load_sum/len(country_server_list))))+"%", top_choice)
+
+def get_country_row(country, country_server_list):
+    """Function that builds the row of a country.
+    Returns:
+    ----
+    - A tuple (country, plus_feature, feature, avrg_load, top_feature).
+    """
+    avrg_load, country_feature = get_country_avrg_features(country_server_list)
+
+    plus_feature = "empty" if country_feature in ("normal", "p2p") else "plus"
+    feature = country_feature if country_feature in ("p2p", "tor") else "empty"
+
+    return (country, plus_feature, feature, avrg_load, country_feature)
+
+def get_server_row(server):
+    """Function that builds the row of an individual server.
+    Returns:
+    ----
+    - A tuple (servername, plus_feature, feature, load, secure_core).
+    """
+    load = str(server["Load"]).rjust(3, " ") + "%"
+    tier = SERVER_TIERS.get(server["Tier"], "Free")
+    plus_feature = "plus" if tier == "Plus/Visionary" else "empty"
+
+    server_feature = get_server_feature(server)
+    feature = server_feature if server_feature in ("p2p", "tor") else "empty"
+
+    return (server["Name"], plus_feature, feature, load, server_feature == "secure-core")
+
+def build_server_rows(servers, only_secure_core=False):
+    """Function that builds all server list rows.
+    Returns:
+    ----
+    - A list of (country_row, server_rows) tuples, where country_row is (country, plus_feature, feature, avrg_load)
+    and server_rows is a list of (servername, plus_feature, feature, load).
+    Countries and servers that should not be displayed, based on only_secure_core, are left out.
+    """
+    return build_server_list_variants(servers)[only_secure_core]
+
+def build_server_list_variants(servers):
+    """Function that builds the rows of both server lists in a single pass over the servers.
+    Returns:
+    ----
+    - A dict with the rows of the standard (False) and secure-core (True) server lists, as returned by build_server_rows.
+    """
+    variants = {False: [], True: []}
+
+    for country, country_server_list in get_country_servers(servers).items():
+        country, plus_feature, feature, avrg_load, country_feature = get_country_row(country, country_server_list)
+        country_row = (country, plus_feature, feature, avrg_load)
+
+        server_rows = {False: [], True: []}
+        for server in country_server_list:
+            servername, server_plus, server_feature, load, secure_core = get_server_row(server)
+            server_rows[secure_core].append((servername, server_plus, server_feature, load))
+
+        variants[False].append((country_row, server_rows[False]))
+        if country_feature == "secure-core":
+            variants[True].append((country_row, server_rows[True]))
+
+    return variants
+
+def build_autoconnect_rows(servers):
+    """Function that builds the autoconnect/quick connect rows.
+    Returns:
+    ----
+    - A list of (command, display) tuples, the default alternatives first followed by countries sorted by name.
+    """
+    rows = list(AUTOCONNECT_ALTERNATIVES.items())
+
+    country_cc = set(server["ExitCountry"] for server in servers if server["ExitCountry"] in country_codes)
+    rows.extend(sorted(((cc, country_codes[cc]) for cc in country_cc), key=lambda row: row[1]))
+
+    return rows
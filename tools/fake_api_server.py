@@ -0,0 +1,312 @@
+"""Local stand-in for the ProtonVPN API, for offline and reproducible performance testing.
+
+Serves synthetic /vpn/logicals, /vpn/loads and /vpn/location responses, of configurable size, latency and
+failure rate, and redirects /releases/latest like the github release page. Loads change on every /vpn/loads
+request (random walk), so that refreshes have something to update. It also serves the speed test endpoints
+(GET /__down?bytes=N and POST /__up), optionally limited to --bandwidth Mbit/s per connection.
+
+Real responses can be recorded once (--record, proxied to --upstream) and replayed later (--replay).
+
+Usage:
+    python3 tools/fake_api_server.py --logicals 5000 --latency 0.2 --failure-rate 0.05
+    python3 tools/fake_api_server.py --record recorded/ --upstream https://api.protonvpn.ch
+    python3 tools/fake_api_server.py --replay recorded/
+
+    PVPN_GUI_API_URL=http://127.0.0.1:8800 PVPN_GUI_RELEASE_URL=http://127.0.0.1:8800/releases/latest \\
+    PVPN_GUI_SPEED_TEST_URL=http://127.0.0.1:8800 PVPN_GUI_CLI=tools/fake_protonvpn sudo -E protonvpn-gui
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from protonvpn_cli.country_codes import country_codes # noqa
+
+API_ENDPOINTS = ["/vpn/logicals", "/vpn/loads", "/vpn/location", "/__down", "/__up"]
+SPEED_TEST_CHUNK = b"\0" * (64 * 1024)
+
+def synthetic_logicals(amount, seed=0):
+    """Function that generates a /vpn/logicals response with the given amount of logical servers.
+    Also used by the benchmarks, IDs have the size of real ones so that memory measurements are representative.
+    """
+    rand = random.Random(seed)
+    country_list = sorted(country_codes)
+    servers = []
+
+    for index in range(amount):
+        exit_country = rand.choice(country_list)
+        features = rand.choice([0, 0, 0, 1, 2, 4])
+        # Secure-core servers enter through one of the secure-core countries
+        entry_country = rand.choice(["CH", "IS", "SE"]) if features & 1 else exit_country
+        domain = "{0}-{1}.protonvpn.com".format(exit_country.lower(), index)
+
+        servers.append({
+            "Name": "{0}#{1}".format(exit_country, index),
+            "EntryCountry": entry_country,
+            "ExitCountry": exit_country,
+            "Domain": domain,
+            "Tier": rand.choice([0, 1, 2]),
+            "Features": features,
+            "Region": None,
+            "City": "City {0}".format(rand.randint(0, 50)),
+            "ID": "{0:064x}".format(rand.getrandbits(256)),
+            "Location": {"Lat": rand.uniform(-90, 90), "Long": rand.uniform(-180, 180)},
+            "Status": 1 if rand.random() > 0.02 else 0,
+            "Servers": [
+                {
+                    "EntryIP": "10.{0}.{1}.{2}".format(rand.randint(0, 255), rand.randint(0, 255), rand.randint(0, 255)),
+                    "ExitIP": "10.{0}.{1}.{2}".format(rand.randint(0, 255), rand.randint(0, 255), rand.randint(0, 255)),
+                    "Domain": domain,
+                    "ID": "{0:064x}".format(rand.getrandbits(256)),
+                    "Status": 1,
+                }
+                for physical in range(rand.randint(1, 3))
+            ],
+            "Load": rand.randint(0, 100),
+            "Score": rand.random(),
+        })
+
+    return {"Code": 1000, "LogicalServers": servers}
+
+class SyntheticAPI:
+    """Responses generated from a seed. Loads and scores drift on every /vpn/loads request.
+    """
+    def __init__(self, amount, seed):
+        self.rand = random.Random(seed)
+        self.lock = threading.Lock()
+        self.logicals = synthetic_logicals(amount, seed)
+
+    def loads(self):
+        with self.lock:
+            for server in self.logicals["LogicalServers"]:
+                server["Load"] = min(100, max(0, server["Load"] + self.rand.randint(-5, 5)))
+                server["Score"] = max(0.0, server["Score"] + self.rand.uniform(-0.05, 0.05))
+
+            return {
+                "Code": 1000,
+                "LogicalServers": [
+                    {"ID": server["ID"], "Load": server["Load"], "Score": server["Score"]}
+                    for server in self.logicals["LogicalServers"]
+                ]
+            }
+
+    def get(self, path):
+        if path == "/vpn/logicals":
+            with self.lock:
+                return 200, json.dumps(self.logicals).encode()
+        if path == "/vpn/loads":
+            return 200, json.dumps(self.loads()).encode()
+        if path == "/vpn/location":
+            return 200, json.dumps({
+                "Code": 1000, "IP": "127.0.0.1", "Lat": 0.0, "Long": 0.0, "Country": "CH", "ISP": "Stand-in API"
+            }).encode()
+
+        return None
+
+class RecordedAPI:
+    """Responses read from a directory of recordings, one file per endpoint.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def get(self, path):
+        try:
+            with open(recording_path(self.directory, path), "rb") as f:
+                return 200, f.read()
+        except FileNotFoundError:
+            return None
+
+class RecordingAPI:
+    """Responses proxied to the real API, and saved for a later --replay.
+    """
+    def __init__(self, directory, upstream):
+        self.directory = directory
+        self.upstream = upstream.rstrip("/")
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, path):
+        request = urllib.request.Request(self.upstream + path, headers={
+            "x-pm-appversion": "Other",
+            "x-pm-apiversion": "3",
+            "Accept": "application/vnd.protonmail.v1+json"
+        })
+
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response: # nosec
+                status, body = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+        if status == 200:
+            with open(recording_path(self.directory, path), "wb") as f:
+                f.write(body)
+
+        return status, body
+
+def recording_path(directory, path):
+    return os.path.join(directory, path.strip("/").replace("/", "_") + ".json")
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+def make_handler(api, latency, failure_rate, release_version, bandwidth):
+    class StandInHandler(BaseHTTPRequestHandler):
+        # Keep-alive connections, the speed test measures its RTT on a single connection
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            path, _, query = self.path.partition("?")
+
+            # Same as the github page, the version is read from the redirect url
+            if path == "/releases/latest":
+                self.send_response(302)
+                self.send_header("Location", "/releases/tag/v{0}".format(release_version))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if path.startswith("/releases/tag/"):
+                self.send_body(200, b"", "text/html")
+                return
+
+            if latency:
+                time.sleep(latency)
+
+            if random.random() < failure_rate:
+                self.send_body(503, json.dumps({"Code": 503, "Error": "Stand-in failure"}).encode())
+                return
+
+            if path == "/__down":
+                self.send_download(int(urllib.parse.parse_qs(query).get("bytes", ["0"])[0]))
+                return
+
+            response = api.get(path)
+            if response is None:
+                self.send_body(404, json.dumps({"Code": 404, "Error": "Unknown endpoint"}).encode())
+                return
+
+            self.send_body(*response)
+
+        def do_POST(self):
+            if self.path.split("?")[0] != "/__up":
+                self.read_body()
+                self.send_body(404, json.dumps({"Code": 404, "Error": "Unknown endpoint"}).encode())
+                return
+
+            received = self.read_body()
+            self.send_body(200, json.dumps({"Received": received}).encode())
+
+        def read_body(self):
+            """Read and discard the request body, sent with a Content-Length or chunked.
+            Returns:
+            ----
+            - The amount of bytes received.
+            """
+            received = 0
+            start = time.monotonic()
+
+            if self.headers.get("Transfer-Encoding", "").lower() != "chunked":
+                remaining = int(self.headers.get("Content-Length", 0))
+                while remaining:
+                    data = self.rfile.read(min(remaining, len(SPEED_TEST_CHUNK)))
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    received += len(data)
+                    self.throttle(received, start)
+                return received
+
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if not size:
+                    self.rfile.readline()
+                    return received
+                received += len(self.rfile.read(size))
+                self.rfile.readline()
+                self.throttle(received, start)
+
+        def send_download(self, amount):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(amount))
+            self.end_headers()
+
+            sent = 0
+            start = time.monotonic()
+            try:
+                while sent < amount:
+                    chunk = SPEED_TEST_CHUNK[:amount - sent]
+                    self.wfile.write(chunk)
+                    sent += len(chunk)
+                    self.throttle(sent, start)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stops reading at the end of the measurement
+                self.close_connection = True
+
+        def throttle(self, transferred, start):
+            if not bandwidth:
+                return
+
+            ahead = transferred * 8 / (bandwidth * 1000000) - (time.monotonic() - start)
+            if ahead > 0:
+                time.sleep(ahead)
+
+        def send_body(self, status, body, content_type="application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            sys.stderr.write("{0} {1}\n".format(self.address_string(), format % args))
+
+    return StandInHandler
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the ProtonVPN API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--logicals", type=int, default=1000, help="amount of synthetic logical servers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every API response")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of API requests answered with a 503")
+    parser.add_argument("--bandwidth", type=float, default=0, help="speed test limit per connection, in Mbit/s (0: unlimited)")
+    parser.add_argument("--release-version", default="9.9.9", help="version returned by /releases/latest")
+    parser.add_argument("--record", metavar="DIR", help="proxy to --upstream and save the responses in DIR")
+    parser.add_argument("--upstream", default="https://api.protonvpn.ch")
+    parser.add_argument("--replay", metavar="DIR", help="serve the responses saved with --record")
+    args = parser.parse_args()
+
+    if args.record and args.replay:
+        parser.error("--record and --replay are mutually exclusive")
+
+    if args.record:
+        api = RecordingAPI(args.record, args.upstream)
+    elif args.replay:
+        api = RecordedAPI(args.replay)
+    else:
+        api = SyntheticAPI(args.logicals, args.seed)
+
+    server = ThreadingHTTPServer(
+        (args.host, args.port),
+        make_handler(api, args.latency, args.failure_rate, args.release_version, args.bandwidth)
+    )
+    print("Serving {0} on http://{1}:{2}".format(", ".join(API_ENDPOINTS), args.host, args.port))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()